@@ -0,0 +1,47 @@
+"""Add quote cache columns to jobs and pricing revision
+
+Revision ID: fix016
+Revises: fix015
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = 'fix016'
+down_revision = 'fix015'
+branch_labels = None
+depends_on = None
+
+
+def column_exists(conn, table, column):
+    result = conn.execute(text(f"""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name='{table}' AND column_name='{column}'
+    """))
+    return result.fetchone() is not None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if not column_exists(conn, 'jobs', 'inventory_revision'):
+        op.add_column('jobs', sa.Column('inventory_revision', sa.Integer(), nullable=False, server_default='0'))
+    if not column_exists(conn, 'jobs', 'quote_cache_key'):
+        op.add_column('jobs', sa.Column('quote_cache_key', sa.String(64)))
+    if not column_exists(conn, 'jobs', 'quote_cache'):
+        op.add_column('jobs', sa.Column('quote_cache', JSONB))
+    if not column_exists(conn, 'pricing_configs', 'revision'):
+        op.add_column('pricing_configs', sa.Column('revision', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table, column in [
+        ('jobs', 'inventory_revision'),
+        ('jobs', 'quote_cache_key'),
+        ('jobs', 'quote_cache'),
+        ('pricing_configs', 'revision'),
+    ]:
+        if column_exists(conn, table, column):
+            op.drop_column(table, column)
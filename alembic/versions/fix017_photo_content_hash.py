@@ -0,0 +1,36 @@
+"""Add content hash to photos for content-addressed storage
+
+Revision ID: fix017
+Revises: fix016
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+revision = 'fix017'
+down_revision = 'fix016'
+branch_labels = None
+depends_on = None
+
+
+def column_exists(conn, table, column):
+    result = conn.execute(text(f"""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name='{table}' AND column_name='{column}'
+    """))
+    return result.fetchone() is not None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if not column_exists(conn, 'photos', 'content_hash'):
+        op.add_column('photos', sa.Column('content_hash', sa.String(64)))
+        op.create_index('ix_photos_content_hash', 'photos', ['content_hash'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    if column_exists(conn, 'photos', 'content_hash'):
+        op.drop_index('ix_photos_content_hash', table_name='photos')
+        op.drop_column('photos', 'content_hash')
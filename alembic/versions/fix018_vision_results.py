@@ -0,0 +1,35 @@
+"""Add vision_results table for caching AI vision analyses
+
+Revision ID: fix018
+Revises: fix017
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'fix018'
+down_revision = 'fix017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'vision_results',
+        sa.Column('cache_key', sa.String(64), primary_key=True),
+        sa.Column('model', sa.String(100), nullable=False),
+        sa.Column('prompt_version', sa.Integer, nullable=False),
+        sa.Column('result', postgresql.JSONB, nullable=False),
+        sa.Column('hit_count', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index('ix_vision_results_created_at', 'vision_results', ['created_at'])
+    op.create_index('ix_vision_results_last_used_at', 'vision_results', ['last_used_at'])
+
+
+def downgrade():
+    op.drop_index('ix_vision_results_last_used_at', table_name='vision_results')
+    op.drop_index('ix_vision_results_created_at', table_name='vision_results')
+    op.drop_table('vision_results')
@@ -0,0 +1,44 @@
+"""Add photo_analyses queue table
+
+Revision ID: fix019
+Revises: fix018
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'fix019'
+down_revision = 'fix018'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'photo_analyses',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('company_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('companies.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('job_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('room_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('rooms.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('photo_ids', postgresql.JSONB, nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('started_at', sa.DateTime(timezone=True)),
+        sa.Column('finished_at', sa.DateTime(timezone=True)),
+        sa.Column('items_detected', sa.Integer),
+        sa.Column('error', sa.Text),
+    )
+    op.create_index('ix_photo_analyses_company_id', 'photo_analyses', ['company_id'])
+    op.create_index('ix_photo_analyses_job_id', 'photo_analyses', ['job_id'])
+    op.create_index('ix_photo_analyses_room_id', 'photo_analyses', ['room_id'])
+    op.create_index('idx_photo_analyses_status_created', 'photo_analyses', ['status', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('idx_photo_analyses_status_created', table_name='photo_analyses')
+    op.drop_index('ix_photo_analyses_room_id', table_name='photo_analyses')
+    op.drop_index('ix_photo_analyses_job_id', table_name='photo_analyses')
+    op.drop_index('ix_photo_analyses_company_id', table_name='photo_analyses')
+    op.drop_table('photo_analyses')
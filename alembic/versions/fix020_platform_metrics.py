@@ -0,0 +1,45 @@
+"""Add platform metrics rollup tables and dashboard date indexes
+
+Revision ID: fix020
+Revises: fix019
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'fix020'
+down_revision = 'fix019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'platform_metrics_daily',
+        sa.Column('day', sa.Date, primary_key=True),
+        sa.Column('signups', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('jobs_created', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('jobs_submitted', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('jobs_approved', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('photos_uploaded', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_table(
+        'platform_metrics',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('metrics', postgresql.JSONB, nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    # Refreshes recount recent days by date range
+    op.create_index('ix_jobs_created_at', 'jobs', ['created_at'])
+    op.create_index('ix_jobs_approved_at', 'jobs', ['approved_at'])
+    op.create_index('ix_photos_created_at', 'photos', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_photos_created_at', table_name='photos')
+    op.drop_index('ix_jobs_approved_at', table_name='jobs')
+    op.drop_index('ix_jobs_created_at', table_name='jobs')
+    op.drop_table('platform_metrics')
+    op.drop_table('platform_metrics_daily')
@@ -0,0 +1,20 @@
+"""Index companies for keyset pagination
+
+Revision ID: fix021
+Revises: fix020
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = 'fix021'
+down_revision = 'fix020'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_companies_created_id', 'companies', ['created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_companies_created_id', table_name='companies')
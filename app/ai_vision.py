@@ -1,15 +1,23 @@
+import asyncio
 import base64
 import json
+import logging
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.config import settings
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4o-mini")
+PROMPT_VERSION = 2  # Bump whenever the prompt, output schema or image preprocessing changes (invalidates cached results)
 
 # Initialize OpenAI client - will raise error if API key not set
 try:
@@ -19,6 +27,10 @@ except Exception as e:
     warnings.warn(f"OpenAI client initialization failed: {e}. Set OPENAI_API_KEY in .env file.")
     client = None
 
+# Shared async client for request handlers (created on first use, see get_async_client)
+_async_client: Optional[AsyncOpenAI] = None
+_call_slots: Optional[asyncio.Semaphore] = None
+
 
 def _img_to_data_url(path: str) -> str:
     ext = (os.path.splitext(path)[1] or "").lower()
@@ -35,40 +47,19 @@ def _img_to_data_url(path: str) -> str:
     return f"data:{mime};base64,{b64}"
 
 
-def extract_removal_inventory(image_paths: List[str], learned_guidance: str = None) -> Dict[str, Any]:
-    """
-    Extract removal inventory from images using OpenAI Vision API.
-
-    The AI prompt can be enhanced with learned patterns from user corrections,
-    making the system smarter over time.
-
-    Args:
-        image_paths: List of paths to image files
-        learned_guidance: Optional string of learned naming conventions from user feedback
-
-    Returns:
-        Dict containing 'items' list and 'summary' string
-
-    Raises:
-        ValueError: If image paths are invalid
-        Exception: If API call fails or OpenAI client not initialized
-    """
-    if client is None:
-        raise Exception("OpenAI client not initialized. Please set OPENAI_API_KEY in .env file.")
-
-    if not image_paths:
-        return {"items": [], "summary": ""}
-
+def _validate_paths(image_paths: List[str]) -> List[str]:
+    """Check the photos for one call exist (at most VISION_BATCH_SIZE of them)"""
     # Validate image paths exist
     valid_paths = []
-    for p in image_paths[:6]:  # Limit to 6 images
+    for p in image_paths[:settings.VISION_BATCH_SIZE]:  # Limit per call; see extract_removal_inventory_batched
         if not os.path.exists(p):
             raise ValueError(f"Image file not found: {p}")
         valid_paths.append(p)
+    return valid_paths
 
-    if not valid_paths:
-        return {"items": [], "summary": ""}
 
+def _build_content(valid_paths: List[str], learned_guidance: str = None) -> List[Dict[str, Any]]:
+    """Build the chat message content: the survey prompt followed by the encoded images"""
     # Build learned guidance section if we have patterns
     learned_section = ""
     if learned_guidance:
@@ -166,16 +157,12 @@ def extract_removal_inventory(image_paths: List[str], learned_guidance: str = No
     except Exception as e:
         raise ValueError(f"Error encoding images: {e}")
 
-    try:
-        resp = client.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[{"role": "user", "content": content}],
-            max_tokens=2000,
-        )
-    except Exception as e:
-        raise Exception(f"OpenAI API error: {e}")
+    return content
 
-    text = (resp.choices[0].message.content or "").strip()
+
+def _parse_inventory(text: Optional[str]) -> Dict[str, Any]:
+    """Parse the model's reply into an inventory dict, tolerating stray markdown"""
+    text = (text or "").strip()
     if not text:
         return {"items": [], "summary": ""}
 
@@ -191,3 +178,199 @@ def extract_removal_inventory(image_paths: List[str], learned_guidance: str = No
             except json.JSONDecodeError:
                 pass
         return {"items": [], "summary": ""}
+
+
+def extract_removal_inventory(image_paths: List[str], learned_guidance: str = None,
+                              timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Extract removal inventory from images using OpenAI Vision API.
+
+    The AI prompt can be enhanced with learned patterns from user corrections,
+    making the system smarter over time.
+
+    Args:
+        image_paths: List of paths to image files
+        learned_guidance: Optional string of learned naming conventions from user feedback
+        timeout: Optional API request timeout in seconds
+
+    Returns:
+        Dict containing 'items' list and 'summary' string
+
+    Raises:
+        ValueError: If image paths are invalid
+        Exception: If API call fails or OpenAI client not initialized
+    """
+    if client is None:
+        raise Exception("OpenAI client not initialized. Please set OPENAI_API_KEY in .env file.")
+
+    if not image_paths:
+        return {"items": [], "summary": ""}
+
+    valid_paths = _validate_paths(image_paths)
+    if not valid_paths:
+        return {"items": [], "summary": ""}
+
+    content = _build_content(valid_paths, learned_guidance)
+
+    try:
+        resp = client.chat.completions.create(
+            model=VISION_MODEL,
+            messages=[{"role": "user", "content": content}],
+            max_tokens=2000,
+            timeout=timeout,
+        )
+    except Exception as e:
+        raise Exception(f"OpenAI API error: {e}")
+
+    return _parse_inventory(resp.choices[0].message.content)
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Shared AsyncOpenAI client with a pooled, keep-alive HTTP connection pool
+
+    One client per worker process means TLS connections to the API are reused
+    across surveys instead of being set up for every call.
+    """
+    global _async_client
+    if _async_client is None:
+        limits = httpx.Limits(
+            max_connections=settings.VISION_MAX_IN_FLIGHT,
+            max_keepalive_connections=settings.VISION_MAX_IN_FLIGHT,
+            keepalive_expiry=settings.VISION_KEEPALIVE_SECONDS,
+        )
+        http_client = httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(settings.VISION_TIMEOUT_SECONDS, connect=10.0),
+        )
+        try:
+            _async_client = AsyncOpenAI(http_client=http_client)
+        except Exception as e:
+            raise Exception(f"OpenAI client not initialized: {e}. Please set OPENAI_API_KEY in .env file.")
+    return _async_client
+
+
+def _get_call_slots() -> asyncio.Semaphore:
+    global _call_slots
+    if _call_slots is None:
+        _call_slots = asyncio.Semaphore(max(1, settings.VISION_MAX_IN_FLIGHT))
+    return _call_slots
+
+
+async def close_async_client():
+    """Close the shared async client's connections (called on app shutdown)"""
+    global _async_client, _call_slots
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    _call_slots = None
+
+
+async def extract_removal_inventory_async(image_paths: List[str], learned_guidance: str = None,
+                                          timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Async version of extract_removal_inventory on the shared AsyncOpenAI client
+
+    The API call awaits on the event loop instead of holding a thread for its
+    whole duration; only image encoding runs in a thread. At most
+    VISION_MAX_IN_FLIGHT calls are in flight per worker; the rest wait.
+
+    Args/Returns/Raises: as extract_removal_inventory
+    """
+    if not image_paths:
+        return {"items": [], "summary": ""}
+
+    valid_paths = _validate_paths(image_paths)
+    if not valid_paths:
+        return {"items": [], "summary": ""}
+
+    content = await asyncio.to_thread(_build_content, valid_paths, learned_guidance)
+
+    async with _get_call_slots():
+        try:
+            resp = await get_async_client().chat.completions.create(
+                model=VISION_MODEL,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=2000,
+                timeout=timeout,
+            )
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {e}")
+
+    return _parse_inventory(resp.choices[0].message.content)
+
+
+def merge_inventories(results: List[Dict[str, Any]], add_quantities: bool = False) -> Dict[str, Any]:
+    """
+    Merge and deduplicate inventories from several batches of photos
+
+    Items with the same name (case and whitespace insensitive) are merged.
+    By default they are treated as the same object seen in different batches
+    (several photos of one room's sofa) and keep the highest quantity. With
+    add_quantities (photos spanning a whole property, where a bed in each
+    bedroom is a different bed) their quantities are added up. Distinct
+    summaries are joined.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    summaries = []
+    for result in results:
+        for item in result.get("items") or []:
+            key = " ".join(str(item.get("name", "")).lower().split())
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(item)
+            elif add_quantities:
+                existing["qty"] = (existing.get("qty") or 1) + (item.get("qty") or 1)
+            elif (item.get("qty") or 1) > (existing.get("qty") or 1):
+                existing["qty"] = item.get("qty")
+
+        summary = (result.get("summary") or "").strip()
+        if summary and summary not in summaries:
+            summaries.append(summary)
+
+    return {"items": list(merged.values()), "summary": " ".join(summaries)}
+
+
+async def extract_removal_inventory_batched(image_paths: List[str], learned_guidance: str = None,
+                                            analyze=None, add_quantities: bool = False) -> Dict[str, Any]:
+    """
+    Analyse any number of photos by fanning batches out concurrently
+
+    Photos are split into batches of VISION_BATCH_SIZE, at most
+    VISION_MAX_CONCURRENCY calls run at once and each API call is bounded by
+    VISION_TIMEOUT_SECONDS (time spent waiting for a slot doesn't count).
+    Results are merged with merge_inventories(), which adds up quantities
+    across batches only with add_quantities (whole-property uploads).
+    `analyze` runs one batch (a vision backend's analyze(); defaults to the
+    OpenAI call).
+
+    If some batches fail, the rest are still returned with
+    "incomplete_batches" set to the number that failed (such results are
+    not cached). If every batch fails, the first error is raised.
+    """
+    if not image_paths:
+        return {"items": [], "summary": ""}
+
+    analyze = analyze or extract_removal_inventory_async
+    size = max(1, settings.VISION_BATCH_SIZE)
+    batches = [image_paths[i:i + size] for i in range(0, len(image_paths), size)]
+    timeout = settings.VISION_TIMEOUT_SECONDS
+    slots = asyncio.Semaphore(max(1, settings.VISION_MAX_CONCURRENCY))
+
+    async def run(batch: List[str]) -> Dict[str, Any]:
+        async with slots:
+            return await analyze(batch, learned_guidance=learned_guidance, timeout=timeout)
+
+    results = await asyncio.gather(*(run(batch) for batch in batches), return_exceptions=True)
+    succeeded = [r for r in results if not isinstance(r, BaseException)]
+    failed = [r for r in results if isinstance(r, BaseException)]
+    for error in failed:
+        logger.warning(f"Vision batch failed: {error!r}")
+    if not succeeded:
+        raise failed[0]
+
+    inventory = succeeded[0] if len(batches) == 1 else merge_inventories(succeeded, add_quantities)
+    if failed:
+        inventory["incomplete_batches"] = len(failed)
+    logger.info(f"Analysed {len(image_paths)} photos in {len(batches)} batches ({len(failed)} failed)")
+    return inventory
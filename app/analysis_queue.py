@@ -0,0 +1,441 @@
+"""
+Photo analysis queue for PrimeHaul OS
+Room photo uploads enqueue a PhotoAnalysis row and return straight away; AI
+vision and item creation happen here, either in a separate worker process
+(python -m app.analysis_worker) or, when ANALYSIS_INLINE is on, in the web
+process after the response is sent (on the async engine, so the event loop
+is never blocked). Rows are claimed atomically, so inline runs and any number
+of workers never process the same analysis twice.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import ml_learning, photo_store, vision_backends, vision_cache
+from app.ai_vision import PROMPT_VERSION, extract_removal_inventory_batched
+from app.config import settings
+from app.inventory import mark_inventory_changed
+from app.models import Item, Job, Photo, PhotoAnalysis, Room, TrainingDataset, UsageAnalytics
+
+logger = logging.getLogger(__name__)
+
+AI_COST_PER_PHOTO_USD = 0.003  # Approximate vision cost per image
+
+
+async def _in_session(db: Union[Session, AsyncSession], fn: Callable, *args):
+    """
+    Call a sync fn(*args, db) without blocking the event loop: via run_sync on
+    an AsyncSession, in a worker thread on a sync Session
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda session: fn(*args, session))
+    return await asyncio.to_thread(fn, *args, db)
+
+
+async def analyze_photos(stored: List[photo_store.StoredPhoto], learned_guidance: Optional[str],
+                         db: Union[Session, AsyncSession], add_quantities: bool = False) -> dict:
+    """
+    Run the configured vision backend over stored photos, reusing a cached
+    result for the same photos, backend model, prompt and merge (unless the
+    backend is not cacheable)
+
+    Photos of one room keep each item's highest quantity across batches; pass
+    add_quantities for photos of a whole property (see merge_inventories).
+
+    Returns:
+        Raw inventory dict ({"items": [...], "summary": "..."}) from the model
+    """
+    backend = vision_backends.get_backend()
+    image_paths = [str(photo.vision_input) for photo in stored]
+    if not backend.cacheable:
+        return await extract_removal_inventory_batched(
+            image_paths, learned_guidance=learned_guidance, analyze=backend.analyze, add_quantities=add_quantities
+        )
+
+    model = backend.cache_model
+    key = vision_cache.cache_key([photo.sha256 for photo in stored], model, PROMPT_VERSION, learned_guidance,
+                                 add_quantities)
+    cached = await _in_session(db, vision_cache.get_cached_result, key)
+    if cached is not None:
+        logger.info(f"Vision cache hit for {len(stored)} photos")
+        return cached
+
+    inventory = await extract_removal_inventory_batched(
+        image_paths, learned_guidance=learned_guidance, analyze=backend.analyze, add_quantities=add_quantities
+    )
+    await _in_session(db, vision_cache.store_result, key, inventory, model, PROMPT_VERSION)
+    return inventory
+
+
+def enqueue_analysis(company_id, job_id, room_id, photos: List[Photo], db: Session) -> PhotoAnalysis:
+    """
+    Queue AI analysis of a room's newly uploaded photos (caller commits)
+
+    Args:
+        company_id: Company UUID
+        job_id: Job UUID
+        room_id: Room UUID
+        photos: Photo rows to analyse together (flushed so they have ids)
+        db: Database session
+
+    Returns:
+        The queued PhotoAnalysis
+    """
+    db.flush()
+    analysis = PhotoAnalysis(
+        id=uuid.uuid4(),
+        company_id=company_id,
+        job_id=job_id,
+        room_id=room_id,
+        photo_ids=[str(photo.id) for photo in photos],
+        status='queued',
+        attempts=0,
+    )
+    db.add(analysis)
+    return analysis
+
+
+def claim(analysis_id, db: Session) -> bool:
+    """
+    Atomically move one queued analysis to running
+
+    Returns:
+        True if this caller claimed it, False if someone else did or it is finished
+    """
+    claimed = db.query(PhotoAnalysis).filter(
+        PhotoAnalysis.id == analysis_id,
+        PhotoAnalysis.status == 'queued'
+    ).update({
+        PhotoAnalysis.status: 'running',
+        PhotoAnalysis.started_at: datetime.utcnow(),
+        PhotoAnalysis.attempts: PhotoAnalysis.attempts + 1,
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def claim_next(db: Session) -> Optional[uuid.UUID]:
+    """
+    Claim the oldest waiting analysis for a worker
+
+    Runs that have been "running" for longer than ANALYSIS_STALE_MINUTES
+    (e.g. their worker died) are picked up again until they run out of
+    attempts, at which point they are marked failed. Uses
+    FOR UPDATE SKIP LOCKED so concurrent workers never block on or share a row.
+
+    Returns:
+        The claimed analysis id, or None if the queue is empty
+    """
+    stale_cutoff = datetime.utcnow() - timedelta(minutes=settings.ANALYSIS_STALE_MINUTES)
+    stale = and_(PhotoAnalysis.status == 'running', PhotoAnalysis.started_at < stale_cutoff)
+
+    db.query(PhotoAnalysis).filter(
+        stale, PhotoAnalysis.attempts >= settings.ANALYSIS_MAX_ATTEMPTS
+    ).update({
+        PhotoAnalysis.status: 'failed',
+        PhotoAnalysis.finished_at: datetime.utcnow(),
+        PhotoAnalysis.error: 'Timed out',
+    }, synchronize_session=False)
+
+    analysis = db.query(PhotoAnalysis).filter(
+        or_(PhotoAnalysis.status == 'queued', stale)
+    ).order_by(PhotoAnalysis.created_at).with_for_update(skip_locked=True).first()
+
+    if analysis is None:
+        db.commit()
+        return None
+
+    analysis.status = 'running'
+    analysis.started_at = datetime.utcnow()
+    analysis.attempts = (analysis.attempts or 0) + 1
+    db.commit()
+    return analysis.id
+
+
+def _stored_photos(company_id, photos: List[Photo]) -> List[photo_store.StoredPhoto]:
+    """Rebuild StoredPhoto handles (with vision derivatives where made) from Photo rows"""
+    stored = []
+    for photo in photos:
+        vision_path = None
+        if photo.content_hash:
+            derivative = photo_store.vision_path(company_id, photo.content_hash)
+            if derivative.exists():
+                vision_path = derivative
+        stored.append(photo_store.StoredPhoto(
+            path=Path(photo.storage_path),
+            sha256=photo.content_hash or "",
+            size=photo.file_size_bytes or 0,
+            original_filename=photo.original_filename or "",
+            content_type=photo.mime_type or "",
+            vision_path=vision_path,
+        ))
+    return stored
+
+
+def detected_item_rows(room_id, inventory: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Item column values for each detected item, with ids assigned up front so other rows can reference them"""
+    rows = []
+    for item_data in inventory.get("items") or []:
+        weight_kg = item_data.get("weight_kg")
+        rows.append({
+            "id": uuid.uuid4(),
+            "room_id": room_id,
+            "name": item_data.get("name", "Unknown item"),
+            "qty": item_data.get("qty", 1),
+            "notes": item_data.get("notes", ""),
+            "length_cm": item_data.get("length_cm"),
+            "width_cm": item_data.get("width_cm"),
+            "height_cm": item_data.get("height_cm"),
+            "weight_kg": weight_kg,
+            "cbm": item_data.get("cbm"),
+            "bulky": (float(weight_kg) > 50) if weight_kg else False,
+            "fragile": item_data.get("fragile", False),
+            "item_category": item_data.get("item_category", "furniture"),
+            "packing_requirement": item_data.get("packing_requirement", "none"),
+        })
+    return rows
+
+
+def _training_rows(item_rows: List[Dict[str, Any]], stored: List[photo_store.StoredPhoto]) -> List[Dict[str, Any]]:
+    """TrainingDataset values for detected items that have dimensions (good training data)"""
+    image_url = str(stored[0].path) if stored else None
+    image_hash = stored[0].sha256 if stored else None
+    return [
+        {
+            "id": uuid.uuid4(),
+            "image_url": image_url,
+            "image_hash": image_hash,
+            "item_name": row["name"],
+            "item_category": row["item_category"] or "furniture",
+            "length_cm": row["length_cm"],
+            "width_cm": row["width_cm"],
+            "height_cm": row["height_cm"],
+            "cbm": row["cbm"],
+            "weight_kg": row["weight_kg"],
+            "is_bulky": row["bulky"],
+            "is_fragile": row["fragile"],
+            "packing_requirement": row["packing_requirement"],
+            "source_type": 'openai_live',  # Live detection
+            "source_id": row["id"],
+            "confidence_score": 0.85,  # OpenAI is reliable
+            "verified": False,  # Not yet verified by admin
+            "used_in_training": False,
+        }
+        for row in item_rows
+        if row["length_cm"] and row["width_cm"] and row["height_cm"]
+    ]
+
+
+def insert_detected_items(room: Room, job: Job, inventory: Dict[str, Any], db: Session) -> List[Dict[str, Any]]:
+    """
+    Add a vision result's items to a room with one set-based INSERT (caller commits)
+
+    Also updates the room summary and bumps the job's inventory revision.
+
+    Returns:
+        The inserted item rows
+    """
+    item_rows = detected_item_rows(room.id, inventory)
+    if item_rows:
+        db.execute(insert(Item), item_rows)
+
+    if inventory.get("summary"):
+        room.summary = inventory.get("summary", "")
+
+    mark_inventory_changed(job)
+    return item_rows
+
+
+def persist_detected_items(room: Room, job: Job, inventory: Dict[str, Any], stored: List[photo_store.StoredPhoto],
+                           company_id, db: Session, record_training: bool = True, ai_cost_usd: float = 0) -> int:
+    """
+    Write a room's detected items, their training rows and the photo_analyzed
+    event as set-based inserts in the caller's transaction (caller commits)
+
+    Returns:
+        Number of items created
+    """
+    item_rows = insert_detected_items(room, job, inventory, db)
+
+    # 🎓 AUTO-LEARN: Save OpenAI detections as training data
+    if record_training:
+        training_rows = _training_rows(item_rows, stored)
+        if training_rows:
+            db.execute(insert(TrainingDataset), training_rows)
+            logger.info(f"💡 Saved {len(training_rows)} OpenAI detections to training dataset")
+
+    # Track analytics event
+    db.add(UsageAnalytics(
+        company_id=company_id,
+        event_type='photo_analyzed',
+        event_metadata={
+            'job_token': job.token,
+            'room_id': str(room.id),
+            'photo_count': len(stored),
+            'items_detected': len(item_rows)
+        },
+        ai_cost_usd=ai_cost_usd,
+        recorded_at=datetime.utcnow()
+    ))
+
+    logger.info(f"AI detected {len(item_rows)} items")
+    return len(item_rows)
+
+
+def _load_work(analysis_id, db: Session) -> Optional[Dict[str, Any]]:
+    """A claimed analysis's room, job, stored photos and learned guidance (None if the row is gone)"""
+    analysis = db.query(PhotoAnalysis).filter(PhotoAnalysis.id == analysis_id).first()
+    if analysis is None:
+        return None
+
+    room = db.query(Room).filter(Room.id == analysis.room_id).first()
+    job = db.query(Job).filter(Job.id == analysis.job_id).first()
+    photo_ids = [uuid.UUID(photo_id) for photo_id in analysis.photo_ids or []]
+    photos = db.query(Photo).filter(Photo.id.in_(photo_ids)).all() if photo_ids else []
+    stored = _stored_photos(analysis.company_id, photos)
+
+    # 🧠 SELF-LEARNING: Get learned patterns to enhance AI prompt
+    learned_guidance = None
+    if room is not None and job is not None and stored:
+        try:
+            learned_guidance = ml_learning.get_learned_patterns_for_prompt(db)
+            if learned_guidance:
+                logger.info("Injecting learned patterns into AI prompt")
+        except Exception as e:
+            logger.warning(f"Could not get learned patterns: {e}")
+
+    return {"analysis": analysis, "room": room, "job": job, "stored": stored, "learned_guidance": learned_guidance}
+
+
+def _incomplete_error(inventory: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Why an inventory is partial (some photo batches failed), or None if it is complete"""
+    failed = (inventory or {}).get("incomplete_batches")
+    return f"{failed} photo batch(es) could not be analysed" if failed else None
+
+
+def _finish(work: Dict[str, Any], inventory: Optional[Dict[str, Any]], db: Session):
+    """
+    Apply learned corrections, write the detected items and mark the analysis done in one commit
+
+    A partial inventory (only reached on the last attempt) is saved with the
+    gap recorded in analysis.error.
+    """
+    analysis = work["analysis"]
+    items_detected = 0
+    if inventory is not None:
+        # 🧠 SELF-LEARNING: Apply learned corrections to AI detections (backup)
+        if inventory.get("items"):
+            try:
+                inventory["items"], corrections = ml_learning.apply_learned_corrections(inventory["items"], db)
+                if corrections:
+                    logger.info(f"Auto-applied {len(corrections)} learned corrections")
+            except Exception as e:
+                logger.warning(f"Could not apply learned corrections: {e}")
+
+        if inventory.get("items"):
+            # Only real OpenAI detections are training data (not stub/local estimates)
+            is_openai = vision_backends.get_backend().name == vision_backends.OpenAIBackend.name
+            items_detected = persist_detected_items(
+                work["room"], work["job"], inventory, work["stored"], analysis.company_id, db,
+                record_training=is_openai,
+                ai_cost_usd=len(work["stored"]) * AI_COST_PER_PHOTO_USD if is_openai else 0
+            )
+        else:
+            logger.warning("AI returned no items")
+
+    analysis.status = 'done'
+    analysis.items_detected = items_detected
+    analysis.error = _incomplete_error(inventory)
+    analysis.finished_at = datetime.utcnow()
+    db.commit()
+
+
+def _fail(analysis_id, error: str, db: Session):
+    """Requeue a failed analysis, or mark it failed once it has used ANALYSIS_MAX_ATTEMPTS"""
+    db.rollback()
+    analysis = db.query(PhotoAnalysis).filter(PhotoAnalysis.id == analysis_id).first()
+    if analysis is None:
+        return
+    analysis.error = error[:1000]
+    if (analysis.attempts or 0) >= settings.ANALYSIS_MAX_ATTEMPTS:
+        analysis.status = 'failed'
+        analysis.finished_at = datetime.utcnow()
+    else:
+        analysis.status = 'queued'
+    db.commit()
+
+
+async def process_analysis(analysis_id, db: Union[Session, AsyncSession]):
+    """
+    Run a claimed analysis: AI vision, learned corrections, items and analytics
+
+    Items, training rows, the analytics event and the finished status are
+    committed together in one transaction. Database work runs off the event
+    loop (run_sync on an AsyncSession, a worker thread on a sync Session).
+    On failure the analysis goes back to the queue until it has used
+    ANALYSIS_MAX_ATTEMPTS attempts, then it is marked failed. An inventory
+    missing some photo batches counts as a failure too, except on the last
+    attempt, when what was found is saved and the gap recorded.
+    """
+    try:
+        work = await _in_session(db, _load_work, analysis_id)
+        if work is None:
+            return
+
+        inventory = None
+        if work["room"] is not None and work["job"] is not None and work["stored"]:
+            logger.info(f"Analyzing {len(work['stored'])} photos with AI vision...")
+            inventory = await analyze_photos(work["stored"], work["learned_guidance"], db)
+
+        incomplete = _incomplete_error(inventory)
+        if incomplete and (work["analysis"].attempts or 0) < settings.ANALYSIS_MAX_ATTEMPTS:
+            raise RuntimeError(incomplete)
+
+        await _in_session(db, _finish, work, inventory)
+
+    except Exception as e:
+        logger.error(f"AI vision error for analysis {analysis_id}: {e}")
+        await _in_session(db, _fail, analysis_id, str(e))
+
+
+async def run_inline(analysis_id):
+    """Process one analysis in the web process (ANALYSIS_INLINE), retrying until it finishes"""
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        while await _in_session(db, claim, analysis_id):
+            await process_analysis(analysis_id, db)
+
+
+async def drain():
+    """Process every claimable analysis once (used at startup to recover inline work lost in a restart)"""
+    from app.database import AsyncSessionLocal
+
+    try:
+        async with AsyncSessionLocal() as db:
+            while True:
+                analysis_id = await _in_session(db, claim_next)
+                if analysis_id is None:
+                    break
+                await process_analysis(analysis_id, db)
+    except Exception as e:
+        logger.error(f"Could not drain photo analysis queue: {e}")
+
+
+def analysis_status(analysis: PhotoAnalysis) -> Dict[str, Any]:
+    """Progress summary for status polling"""
+    return {
+        "analysis_id": str(analysis.id),
+        "status": analysis.status,
+        "attempts": analysis.attempts or 0,
+        "items_detected": analysis.items_detected,
+        "error": analysis.error if analysis.status in ('done', 'failed') else None,  # On done: photos missed
+    }
@@ -0,0 +1,56 @@
+"""
+Photo analysis worker for PrimeHaul OS
+
+Usage:
+    python -m app.analysis_worker
+
+Runs ANALYSIS_WORKER_CONCURRENCY loops that claim queued photo analyses
+(see app.analysis_queue) and process them. Scale by running more worker
+processes; they coordinate through the database.
+"""
+
+import asyncio
+import logging
+import os
+
+# Worker-sized connection pool and statement timeout (see app.database); set before app imports
+os.environ.setdefault("DB_PROCESS_TYPE", "worker")
+
+from app import analysis_queue
+from app.config import settings
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def worker_loop(index: int):
+    """Claim and process analyses until cancelled, sleeping when the queue is empty"""
+    while True:
+        db = SessionLocal()
+        try:
+            analysis_id = await asyncio.to_thread(analysis_queue.claim_next, db)
+            if analysis_id is not None:
+                logger.info(f"Worker {index} processing analysis {analysis_id}")
+                await analysis_queue.process_analysis(analysis_id, db)
+                continue
+        except Exception as e:
+            logger.error(f"Worker {index} error: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(settings.ANALYSIS_POLL_SECONDS)
+
+
+async def main():
+    concurrency = max(1, settings.ANALYSIS_WORKER_CONCURRENCY)
+    logger.info(f"Photo analysis worker started with {concurrency} loops")
+    try:
+        await asyncio.gather(*(worker_loop(i) for i in range(concurrency)))
+    finally:
+        from app import ai_vision, image_processing
+        await ai_vision.close_async_client()
+        image_processing.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())
@@ -12,6 +12,7 @@ from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 
 from app.models import Company, Job, StripeEvent
+from app import company_cache
 
 load_dotenv()
 
@@ -189,6 +190,7 @@ def use_survey_credit(company: Company, job_token: str, db: Session) -> dict:
     if getattr(company, 'is_partner', False):
         company.surveys_used = (company.surveys_used or 0) + 1
         db.commit()
+        company_cache.invalidate(company.slug)
         partner_name = getattr(company, 'partner_name', None)
         logger.info(f"Partner survey (unlimited) by {company.slug} ({partner_name})")
         return {
@@ -213,6 +215,7 @@ def use_survey_credit(company: Company, job_token: str, db: Session) -> dict:
     company.credits = credits - 1
     company.surveys_used = (company.surveys_used or 0) + 1
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Credit used by {company.slug}. {company.credits} remaining.")
     return {
@@ -313,6 +316,7 @@ def add_credits_to_company(company: Company, credits: int, db: Session) -> dict:
     old_balance = getattr(company, 'credits', 0) or 0
     company.credits = old_balance + credits
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Added {credits} credits to {company.slug}. New balance: {company.credits}")
 
@@ -503,6 +507,7 @@ def handle_subscription_created(event_data: dict, db: Session):
     company.stripe_subscription_id = subscription["id"]
     company.trial_ends_at = None  # Clear trial date
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Subscription created for company {company.slug}: {subscription['id']}")
 
@@ -539,6 +544,7 @@ def handle_subscription_updated(event_data: dict, db: Session):
 
     company.subscription_status = status_mapping.get(stripe_status, "inactive")
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Subscription updated for company {company.slug}: {stripe_status}")
 
@@ -565,6 +571,7 @@ def handle_subscription_deleted(event_data: dict, db: Session):
     company.subscription_status = "canceled"
     company.subscription_canceled_at = datetime.utcnow()
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Subscription canceled for company {company.slug}")
 
@@ -592,6 +599,7 @@ def handle_invoice_paid(event_data: dict, db: Session):
     if company.subscription_status in ["past_due", "unpaid"]:
         company.subscription_status = "active"
         db.commit()
+        company_cache.invalidate(company.slug)
 
     logger.info(f"Invoice paid for company {company.slug}: {invoice['id']}")
 
@@ -617,6 +625,7 @@ def handle_invoice_payment_failed(event_data: dict, db: Session):
 
     company.subscription_status = "past_due"
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.warning(f"Payment failed for company {company.slug}: {invoice['id']}")
     # TODO: Send email notification about payment failure
@@ -0,0 +1,77 @@
+"""
+Company resolution cache for PrimeHaul OS
+Customer survey URLs (/s/{company_slug}/...) resolve their company on every
+request. This keeps a per-process snapshot of each company's columns keyed by
+slug for COMPANY_CACHE_TTL_SECONDS, so the middleware only queries on a miss.
+
+Branding, company detail and billing changes call invalidate() so this process
+sees them straight away; other worker processes pick them up within the TTL.
+"""
+
+import threading
+import time
+from copy import deepcopy
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.config import settings
+from app.models import Company
+
+_entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_lock = threading.Lock()
+
+
+def _snapshot(company: Company) -> Dict[str, Any]:
+    """Column values of a loaded company"""
+    return {attr.key: getattr(company, attr.key) for attr in inspect(Company).column_attrs}
+
+
+def get(slug: str) -> Optional[Company]:
+    """
+    Return a cached company for a slug, or None if missing or expired
+
+    Each call returns its own detached Company, so requests never share an
+    instance. Relationships are not loaded; query them through a session.
+    """
+    with _lock:
+        entry = _entries.get(slug)
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if expires_at < time.monotonic():
+            del _entries[slug]
+            return None
+
+    company = Company(**deepcopy(values))
+    make_transient_to_detached(company)
+    return company
+
+
+def put(company: Company):
+    """Cache a company loaded from the database"""
+    if settings.COMPANY_CACHE_TTL_SECONDS <= 0:
+        return
+    values = _snapshot(company)
+    with _lock:
+        _entries[company.slug] = (time.monotonic() + settings.COMPANY_CACHE_TTL_SECONDS, values)
+
+
+def invalidate(slug: str = None):
+    """Drop one company (or, with no slug, every company) from the cache"""
+    with _lock:
+        if slug is None:
+            _entries.clear()
+        else:
+            _entries.pop(slug, None)
+
+
+def branding(company: Company) -> Dict[str, Any]:
+    """Branding values injected into customer templates"""
+    return {
+        "company_name": company.company_name,
+        "logo_url": company.logo_url or "/static/placeholder-photo.jpg",
+        "primary_color": company.primary_color,
+        "secondary_color": company.secondary_color
+    }
@@ -60,6 +60,47 @@ class Settings:
 
         # OpenAI
         self.OPENAI_VISION_MODEL: str = os.getenv("OPENAI_VISION_MODEL", "gpt-4o-mini")
+        # Vision backend: openai, local (offline estimator) or stub (deterministic, for load tests)
+        self.VISION_BACKEND: str = os.getenv("VISION_BACKEND", "openai")
+        self.VISION_STUB_LATENCY_MS: int = int(os.getenv("VISION_STUB_LATENCY_MS", "0"))
+        self.VISION_LOCAL_MODEL_PATH: str = os.getenv(
+            "VISION_LOCAL_MODEL_PATH", "models/furniture-detector-v1/furniture_model_v1.json"
+        )
+        self.VISION_CACHE_TTL_HOURS: int = int(os.getenv("VISION_CACHE_TTL_HOURS", "720"))
+        self.VISION_CACHE_MAX_ENTRIES: int = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "10000"))
+        self.VISION_BATCH_SIZE: int = int(os.getenv("VISION_BATCH_SIZE", "6"))  # Photos per API call
+        self.VISION_MAX_CONCURRENCY: int = int(os.getenv("VISION_MAX_CONCURRENCY", "5"))
+        self.VISION_TIMEOUT_SECONDS: float = float(os.getenv("VISION_TIMEOUT_SECONDS", "60"))
+        self.VISION_MAX_IN_FLIGHT: int = int(os.getenv("VISION_MAX_IN_FLIGHT", "20"))  # Per worker process
+        self.VISION_KEEPALIVE_SECONDS: float = float(os.getenv("VISION_KEEPALIVE_SECONDS", "30"))
+
+        # Image processing (0 = one worker per CPU core; queue limit 0 = 2x workers)
+        self.IMAGE_WORKERS: int = int(os.getenv("IMAGE_WORKERS", "0"))
+        self.IMAGE_QUEUE_LIMIT: int = int(os.getenv("IMAGE_QUEUE_LIMIT", "0"))
+
+        # Photo analysis queue (inline = web process analyses its own uploads after responding;
+        # set false when running `python -m app.analysis_worker` processes)
+        self.ANALYSIS_INLINE: bool = os.getenv("ANALYSIS_INLINE", "true").lower() == "true"
+        self.ANALYSIS_WORKER_CONCURRENCY: int = int(os.getenv("ANALYSIS_WORKER_CONCURRENCY", "4"))
+        self.ANALYSIS_POLL_SECONDS: float = float(os.getenv("ANALYSIS_POLL_SECONDS", "1"))
+        self.ANALYSIS_MAX_ATTEMPTS: int = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "3"))
+        self.ANALYSIS_STALE_MINUTES: int = int(os.getenv("ANALYSIS_STALE_MINUTES", "10"))
+
+        # Company resolution cache for customer survey URLs (0 = disabled)
+        self.COMPANY_CACHE_TTL_SECONDS: int = int(os.getenv("COMPANY_CACHE_TTL_SECONDS", "30"))
+
+        # Admin authentication: cache token → user, write last_login_at at most every N minutes
+        self.AUTH_USER_CACHE_SECONDS: int = int(os.getenv("AUTH_USER_CACHE_SECONDS", "30"))
+        self.LAST_SEEN_UPDATE_MINUTES: int = int(os.getenv("LAST_SEEN_UPDATE_MINUTES", "5"))
+
+        # Developer dashboard metrics rollup (refresh 0 = never rebuild in the background)
+        self.METRICS_REFRESH_SECONDS: int = int(os.getenv("METRICS_REFRESH_SECONDS", "60"))
+        self.METRICS_CACHE_SECONDS: int = int(os.getenv("METRICS_CACHE_SECONDS", "30"))
+
+        # /api/track buffering: rows held in memory per process, flushed every N ms or M rows
+        self.TRACKING_BUFFER_SIZE: int = int(os.getenv("TRACKING_BUFFER_SIZE", "10000"))
+        self.TRACKING_FLUSH_MS: int = int(os.getenv("TRACKING_FLUSH_MS", "1000"))
+        self.TRACKING_FLUSH_EVENTS: int = int(os.getenv("TRACKING_FLUSH_EVENTS", "500"))
 
         # Sales
         self.SALES_AUTOMATION: bool = os.getenv("SALES_AUTOMATION", "false").lower() == "true"
@@ -0,0 +1,179 @@
+"""
+Live admin dashboard events for PrimeHaul OS
+The admin dashboard keeps an EventSource open on
+/{company_slug}/admin/dashboard/events instead of re-rendering the whole page
+to read the awaiting-approval count. Handlers that move a job into or out of
+awaiting_approval call awaiting_changed(db, ...) before committing; the change
+is delivered once the transaction commits:
+
+- on PostgreSQL it is sent with NOTIFY in the same transaction, and every web
+  process's LISTEN bridge (listen_forever) relays it to its own subscribers
+- otherwise (or while this process's bridge is down) it goes straight to this
+  process's subscribers
+
+Subscribers get {"awaiting_delta": +1/-1, "token": ...}. A slow subscriber whose
+queue is full misses events until it reconnects and is sent a fresh count.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app import database
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "dashboard_events"
+PENDING_KEY = "dashboard_events"
+QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 20
+RECONNECT_SECONDS = 5
+
+
+class Broadcaster:
+    """Per-company fan-out to this process's open dashboard streams (thread-safe publish)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loops: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+
+    def subscribe(self, company_id) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[str(company_id)].add(queue)
+            self._loops[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, company_id, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(str(company_id))
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[str(company_id)]
+            self._loops.pop(queue, None)
+
+    def subscriber_count(self, company_id=None) -> int:
+        with self._lock:
+            if company_id is not None:
+                return len(self._subscribers.get(str(company_id), ()))
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, company_id, message: Dict[str, Any]):
+        """Hand a message to every subscriber of a company (callable from any thread)"""
+        with self._lock:
+            targets = [(queue, self._loops[queue]) for queue in self._subscribers.get(str(company_id), ())]
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                pass  # Subscriber's loop already closed
+
+
+def _offer(queue: asyncio.Queue, message: Dict[str, Any]):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+broadcaster = Broadcaster()
+_bridge_connected = False
+
+
+def awaiting_changed(db: Session, company_id, delta: int, token: str = None):
+    """Record that a company's awaiting-approval count changes by delta when db commits"""
+    db.info.setdefault(PENDING_KEY, []).append({
+        "company_id": str(company_id),
+        "awaiting_delta": delta,
+        "token": token,
+    })
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_on_commit(session):
+    """Send pending events with NOTIFY, so other processes see them only if the commit succeeds"""
+    pending = session.info.get(PENDING_KEY)
+    if not pending or session.get_bind().dialect.name != "postgresql":
+        return
+    for message in pending:
+        session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                        {"channel": CHANNEL, "payload": json.dumps(message)})
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_locally(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending or (_bridge_connected and session.get_bind().dialect.name == "postgresql"):
+        return  # The LISTEN bridge delivers them
+    for message in pending:
+        broadcaster.publish(message["company_id"], message)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def _on_notify(connection, pid, channel, payload):
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        logger.warning(f"Ignoring malformed dashboard event: {payload[:100]}")
+        return
+    broadcaster.publish(message["company_id"], message)
+
+
+def _listen_dsn() -> Optional[tuple]:
+    """asyncpg DSN and connect args for DATABASE_URL (None if not PostgreSQL)"""
+    url, connect_args = database._async_database_url(database.DATABASE_URL)
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql":
+        return None
+    return parsed.set(drivername="postgresql").render_as_string(hide_password=False), connect_args
+
+
+async def listen_forever():
+    """Relay NOTIFYs from every process to this process's subscribers, reconnecting on failure"""
+    global _bridge_connected
+    import asyncpg
+
+    dsn, connect_args = _listen_dsn()
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn, **connect_args)
+            await connection.add_listener(CHANNEL, _on_notify)
+            _bridge_connected = True
+            logger.info("Dashboard events: listening for NOTIFY")
+            while True:
+                await asyncio.sleep(KEEPALIVE_SECONDS)
+                await connection.execute("SELECT 1")  # Notice a dropped connection
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Dashboard events LISTEN connection lost, delivering locally: {e}")
+        finally:
+            _bridge_connected = False
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(RECONNECT_SECONDS)
+
+
+def bridge_available() -> bool:
+    """Whether DATABASE_URL supports the LISTEN/NOTIFY bridge"""
+    return _listen_dsn() is not None
+
+
+def format_sse(data: Dict[str, Any], event_name: str = None) -> str:
+    """One server-sent event"""
+    prefix = f"event: {event_name}\n" if event_name else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
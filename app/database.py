@@ -1,44 +1,473 @@
 """
 Database connection and session management for PrimeHaul OS
+
+Pool sizes and the default statement_timeout depend on the process type
+(DB_PROCESS_TYPE: web, worker or script), each overridable with DB_* env vars.
+DB_POOL_SIZE and DB_MAX_OVERFLOW are one process's budget per database: the
+sync and async engines on it split the budget between them, so a process
+never holds more than DB_POOL_SIZE + DB_MAX_OVERFLOW primary connections.
+
+Dashboards and exports read through get_read_db / get_async_read_db. With
+DATABASE_READ_URL set those use the read replica, unless its replication lag
+is over DB_REPLICA_MAX_LAG_SECONDS or it is unreachable, in which case they
+fall back to the primary. For local testing DATABASE_READ_URL can point at the
+primary database.
 """
 
+import logging
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Tuple
+from fastapi import Request
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Get database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
+# Per process type: (pool size, max overflow, statement timeout ms; 0 = none)
+PROCESS_DEFAULTS = {
+    "web": (10, 20, 15000),
+    "worker": (4, 4, 120000),
+    "script": (2, 0, 0),
+}
+
+DB_PROCESS_TYPE = os.getenv("DB_PROCESS_TYPE", "web").lower()
+if DB_PROCESS_TYPE not in PROCESS_DEFAULTS:
+    raise ValueError(f"DB_PROCESS_TYPE must be one of: {', '.join(PROCESS_DEFAULTS)}")
+_pool_size, _max_overflow, _statement_timeout_ms = PROCESS_DEFAULTS[DB_PROCESS_TYPE]
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", _pool_size))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", _max_overflow))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Replace connections before proxies drop them
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", _statement_timeout_ms))
+
+
+def _split(total: int) -> Tuple[int, int]:
+    """Divide a per-database connection allowance between the sync and async engines"""
+    return total - total // 2, total // 2
+
+
+# (sync, async) engine shares of the budget; every engine keeps at least one pooled connection
+ENGINE_POOL_SIZES = tuple(max(1, share) for share in _split(DB_POOL_SIZE))
+ENGINE_MAX_OVERFLOWS = _split(max(DB_MAX_OVERFLOW, 0))
+
+# Optional read replica
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "30"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "10"))  # How often lag is re-measured
+
+# statement_timeout per route class; sessions opt in through session.info (see get_read_db)
+STATEMENT_TIMEOUT_KEY = "statement_timeout_ms"
+READ_ONLY_KEY = "read_only"
+ROUTE_STATEMENT_TIMEOUTS = {
+    "default": DB_STATEMENT_TIMEOUT_MS,
+    "report": int(os.getenv("DB_REPORT_STATEMENT_TIMEOUT_MS", "60000")),  # Dashboards and exports
+}
+
+
+class PoolStats:
+    """Checkout wait times for one pool (per process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+            }
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each checkout waited (including opening an overflow connection)"""
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+
+class MeteredQueuePool(_TimedCheckout, QueuePool):
+    stats = PoolStats()
+
+
+class MeteredAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+class MeteredReadQueuePool(MeteredQueuePool):
+    stats = PoolStats()
+
+
+class MeteredAsyncReadQueuePool(MeteredAsyncQueuePool):
+    stats = PoolStats()
+
+
+def _pool_args(url: str, poolclass, share: int) -> Dict[str, Any]:
+    """Pool configuration for an engine's share of the budget (SQLite keeps SQLAlchemy's own pool choice)"""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": ENGINE_POOL_SIZES[share],
+        "max_overflow": ENGINE_MAX_OVERFLOWS[share],
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _timeout_connect_args(url: str) -> Dict[str, Any]:
+    """Default statement_timeout for every new Postgres connection"""
+    if not DB_STATEMENT_TIMEOUT_MS or not url.startswith("postgresql"):
+        return {}
+    if url.startswith("postgresql+asyncpg"):
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+
 # Create SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,  # Verify connections before using them
-    pool_size=10,  # Connection pool size
-    max_overflow=20,  # Max overflow connections
+    connect_args=_timeout_connect_args(DATABASE_URL),
     echo=False,  # Set to True to log all SQL queries (useful for debugging)
+    **_pool_args(DATABASE_URL, MeteredQueuePool, 0),
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def get_db() -> Session:
+def _async_database_url(url: str) -> Tuple[str, dict]:
+    """
+    Async driver URL (asyncpg / aiosqlite) and connect args for DATABASE_URL
+
+    asyncpg does not understand libpq's sslmode query parameter, so it is
+    passed through as the ssl connect argument instead.
+    """
+    parsed = make_url(url)
+    connect_args = {}
+    if parsed.get_backend_name() == "postgresql":
+        sslmode = parsed.query.get("sslmode")
+        if sslmode:
+            connect_args["ssl"] = sslmode
+        parsed = parsed.difference_update_query(["sslmode"]).set(drivername="postgresql+asyncpg")
+    elif parsed.get_backend_name() == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False), connect_args
+
+
+# Async engine for async def handlers, so queries don't block the event loop
+ASYNC_DATABASE_URL, _async_connect_args = _async_database_url(DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    connect_args={**_async_connect_args, **_timeout_connect_args(ASYNC_DATABASE_URL)},
+    echo=False,
+    **_pool_args(ASYNC_DATABASE_URL, MeteredAsyncQueuePool, 1),
+)
+
+# Objects stay usable after commit (async sessions can't lazily refresh them)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Read replica engines (None without DATABASE_READ_URL)
+read_engine = None
+async_read_engine = None
+ReadSessionLocal = None
+AsyncReadSessionLocal = None
+if DATABASE_READ_URL:
+    read_engine = create_engine(
+        DATABASE_READ_URL,
+        pool_pre_ping=True,
+        connect_args=_timeout_connect_args(DATABASE_READ_URL),
+        **_pool_args(DATABASE_READ_URL, MeteredReadQueuePool, 0),
+    )
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+    ASYNC_DATABASE_READ_URL, _async_read_connect_args = _async_database_url(DATABASE_READ_URL)
+    async_read_engine = create_async_engine(
+        ASYNC_DATABASE_READ_URL,
+        pool_pre_ping=True,
+        connect_args={**_async_read_connect_args, **_timeout_connect_args(ASYNC_DATABASE_READ_URL)},
+        **_pool_args(ASYNC_DATABASE_READ_URL, MeteredAsyncReadQueuePool, 1),
+    )
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_session_settings(session, transaction, connection):
+    """Apply a session's read-only flag and route class statement_timeout to each new transaction"""
+    if connection.dialect.name != "postgresql":
+        return
+    if session.info.get(READ_ONLY_KEY):
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+    timeout_ms = session.info.get(STATEMENT_TIMEOUT_KEY)
+    if timeout_ms is not None:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+# Replication lag in seconds (0 when caught up, or when this is not a standby)
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class ReplicaMonitor:
+    """
+    Whether reads may go to the replica, re-measured every DB_REPLICA_CHECK_SECONDS
+
+    The replica is used while its lag is at most DB_REPLICA_MAX_LAG_SECONDS.
+    A failed check marks it unusable until the next check.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_at = None
+        self.lag_seconds = None
+        self.healthy = False
+        self.error = None
+
+    def due(self) -> bool:
+        with self._lock:
+            return self.checked_at is None or time.monotonic() - self.checked_at >= DB_REPLICA_CHECK_SECONDS
+
+    def record(self, lag_seconds: float = None, error: Exception = None):
+        with self._lock:
+            self.checked_at = time.monotonic()
+            self.lag_seconds = lag_seconds
+            self.error = str(error) if error else None
+            self.healthy = error is None and lag_seconds is not None and lag_seconds <= DB_REPLICA_MAX_LAG_SECONDS
+        if error:
+            logger.warning(f"Read replica check failed, reading from primary: {error}")
+        elif not self.healthy:
+            logger.warning(f"Read replica {lag_seconds:.1f}s behind, reading from primary")
+
+    def check(self) -> bool:
+        """Measure lag on the sync replica engine if due; True if reads may use the replica"""
+        if self.due():
+            try:
+                with read_engine.connect() as connection:
+                    self.record(_lag_seconds(connection))
+            except Exception as e:
+                self.record(error=e)
+        return self.healthy
+
+    async def check_async(self) -> bool:
+        """Measure lag on the async replica engine if due; True if reads may use the replica"""
+        if self.due():
+            try:
+                async with async_read_engine.connect() as connection:
+                    self.record(await connection.run_sync(_lag_seconds))
+            except Exception as e:
+                self.record(error=e)
+        return self.healthy
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "configured": read_engine is not None,
+                "healthy": self.healthy,
+                "lag_seconds": self.lag_seconds,
+                "max_lag_seconds": DB_REPLICA_MAX_LAG_SECONDS,
+                "error": self.error,
+            }
+
+
+def _lag_seconds(connection) -> float:
+    if connection.dialect.name != "postgresql":
+        return 0.0
+    return float(connection.exec_driver_sql(REPLICA_LAG_SQL).scalar() or 0)
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def _engine_stats(target) -> Dict[str, Any]:
+    pool = target.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    stats = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    if isinstance(pool, _TimedCheckout):
+        stats.update(pool.stats.snapshot())
+    return stats
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool state, checkout wait times and replica status for this process"""
+    engines = {
+        "sync": _engine_stats(engine),
+        "async": _engine_stats(async_engine.sync_engine),
+    }
+    databases = {"primary": ("sync", "async")}
+    if read_engine is not None:
+        engines["read"] = _engine_stats(read_engine)
+        engines["async_read"] = _engine_stats(async_read_engine.sync_engine)
+        databases["replica"] = ("read", "async_read")
+
+    totals = {}
+    for database, names in databases.items():
+        pools = [engines[name] for name in names if "size" in engines[name]]
+        totals[database] = {
+            "checked_out": sum(pool["checked_out"] for pool in pools),
+            "max_connections": sum(pool["size"] + pool["max_overflow"] for pool in pools),
+        }
+    return {
+        "process_type": DB_PROCESS_TYPE,
+        "pid": os.getpid(),
+        "statement_timeout_ms": ROUTE_STATEMENT_TIMEOUTS,
+        "pool_budget": {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW},
+        "totals": totals,
+        "engines": engines,
+        "replica": replica_monitor.snapshot(),
+    }
+
+
+# Planner row estimates for the visible tables named (-1 = never analysed)
+ROW_ESTIMATE_SQL = text("""
+    SELECT relname, reltuples::bigint FROM pg_class
+    WHERE relkind = 'r' AND relname = ANY(:tables) AND pg_table_is_visible(oid)
+""")
+
+
+def estimated_row_counts(db: Session, tables) -> Dict[str, int]:
+    """
+    Approximate row counts without scanning the tables
+
+    On PostgreSQL these are pg_class.reltuples, kept current by autovacuum's
+    ANALYZE. Tables never analysed (and other databases) get an exact COUNT(*).
+    """
+    counts = {}
+    if db.get_bind().dialect.name == "postgresql":
+        counts = {
+            name: int(estimate)
+            for name, estimate in db.execute(ROW_ESTIMATE_SQL, {"tables": list(tables)})
+            if estimate >= 0
+        }
+    quote = db.get_bind().dialect.identifier_preparer.quote
+    for table in tables:
+        if table not in counts:
+            counts[table] = db.execute(text(f"SELECT COUNT(*) FROM {quote(table)}")).scalar()
+    return counts
+
+
+def get_db(request: Request = None) -> Session:
     """
     FastAPI dependency to get database session
+    Reuses the session opened by the company middleware for the same request
+    (it closes that one itself), so a request checks out one connection.
+
     Usage:
         @app.get("/endpoint")
         def handler(db: Session = Depends(get_db)):
             # Use db session here
             pass
     """
+    shared = getattr(request.state, "db", None) if request is not None else None
+    if shared is not None:
+        yield shared
+        return
+
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI dependency to get an async database session
+    For async def handlers. Reuse sync helpers with
+    `await db.run_sync(lambda session: helper(..., session))`; their queries
+    then run on the async driver too.
+
+    Usage:
+        @app.post("/endpoint")
+        async def handler(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(Job).where(Job.token == token))
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _reporting_session(db):
+    """Mark a session for dashboard/export reads: read-only, "report" statement_timeout"""
+    db.info[READ_ONLY_KEY] = True
+    db.info[STATEMENT_TIMEOUT_KEY] = ROUTE_STATEMENT_TIMEOUTS["report"]
+    return db
+
+
+def get_read_db() -> Session:
+    """
+    FastAPI dependency for read-only dashboards and exports
+    Reads from the replica when it is configured and within the lag limit,
+    otherwise from the primary. Transactions are read-only and use the
+    "report" route class statement_timeout.
+
+    Usage:
+        @app.get("/superadmin/dashboard")
+        def handler(db: Session = Depends(get_read_db)):
+            pass
+    """
+    factory = ReadSessionLocal if read_engine is not None and replica_monitor.check() else SessionLocal
+    db = _reporting_session(factory())
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of get_read_db"""
+    use_replica = async_read_engine is not None and await replica_monitor.check_async()
+    factory = AsyncReadSessionLocal if use_replica else AsyncSessionLocal
+    async with factory() as db:
+        _reporting_session(db.sync_session)
+        yield db
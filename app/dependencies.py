@@ -3,14 +3,17 @@ FastAPI dependencies for PrimeHaul OS
 Provides reusable dependency injection for database sessions, authentication, and authorization
 """
 
+from datetime import datetime
 from typing import Optional
 from fastapi import Depends, HTTPException, Cookie, status
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from jose import JWTError
 
 from app.database import get_db
 from app.auth import decode_access_token
 from app.models import User, Company
+from app import user_cache
 
 
 def get_current_user(
@@ -43,32 +46,47 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    try:
-        payload = decode_access_token(access_token)
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    # Recently seen token: reuse the cached user instead of decoding and querying
+    user = user_cache.get(access_token)
+    if user is not None:
+        user = db.merge(user, load=False)
+    else:
+        try:
+            payload = decode_access_token(access_token)
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid authentication credentials"
+                )
+        except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
+                detail="Invalid or expired token"
             )
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
-
-    # Fetch user from database
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found or inactive"
-        )
 
-    # Update last login timestamp
-    from datetime import datetime
-    user.last_login_at = datetime.utcnow()
-    db.commit()
+        # Fetch user from database
+        user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found or inactive"
+            )
+        user_cache.put(access_token, user, payload.get("exp"))
+
+    # Update last login timestamp (at most once every LAST_SEEN_UPDATE_MINUTES)
+    if user_cache.last_seen_due(user.id):
+        user.last_login_at = datetime.utcnow()
+        try:
+            db.commit()
+        except StaleDataError:
+            # Cached user whose row has since been deleted
+            db.rollback()
+            user_cache.invalidate(access_token)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found or inactive"
+            )
 
     return user
 
@@ -101,6 +119,10 @@ def get_optional_current_user(
     if not access_token:
         return None
 
+    user = user_cache.get(access_token)
+    if user is not None:
+        return db.merge(user, load=False)
+
     try:
         payload = decode_access_token(access_token)
         user_id: str = payload.get("sub")
@@ -108,6 +130,8 @@ def get_optional_current_user(
             return None
 
         user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+        if user is not None:
+            user_cache.put(access_token, user, payload.get("exp"))
         return user
     except JWTError:
         return None
@@ -0,0 +1,192 @@
+"""
+Image processing for PrimeHaul OS
+Photo compression (PIL decode, EXIF rotate, resize, JPEG encode) is CPU-bound,
+so it runs on a shared process pool instead of the event loop. A semaphore
+caps how many images can be queued for the pool at once; uploads beyond that
+wait their turn (backpressure) rather than piling work onto the workers.
+
+The same pool also makes the small JPEG derivatives sent to the vision model,
+so API calls never have to read and encode full-size originals.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+VISION_MAX_DIMENSION = 1024  # Long edge of the images sent to the vision model
+VISION_JPEG_QUALITY = 80
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _encode_jpeg(content: bytes, max_dimension: int, quality: int) -> bytes:
+    """Decode, EXIF-rotate, shrink to max_dimension and re-encode as JPEG (raises if undecodable)"""
+    from PIL import Image, ExifTags
+    img = Image.open(BytesIO(content))
+
+    # Auto-rotate from EXIF
+    try:
+        for orientation in ExifTags.TAGS.keys():
+            if ExifTags.TAGS[orientation] == 'Orientation':
+                break
+        exif = img._getexif()
+        if exif and orientation in exif:
+            if exif[orientation] == 3:
+                img = img.rotate(180, expand=True)
+            elif exif[orientation] == 6:
+                img = img.rotate(270, expand=True)
+            elif exif[orientation] == 8:
+                img = img.rotate(90, expand=True)
+    except (AttributeError, KeyError):
+        pass
+
+    # Resize if larger than max_dimension
+    if max(img.size) > max_dimension:
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    # Convert to RGB if needed (e.g. RGBA PNGs)
+    if img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def compress_photo(content: bytes, max_dimension: int = 2048, quality: int = 80) -> bytes:
+    """Compress and resize a photo. Returns original bytes if compression fails."""
+    try:
+        compressed = _encode_jpeg(content, max_dimension, quality)
+
+        # Only use compressed version if it's actually smaller
+        if len(compressed) < len(content):
+            return compressed
+        return content
+    except Exception as e:
+        logger.warning(f"Photo compression failed, using original: {e}")
+        return content
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Shared image-processing pool, created on first use (one worker per core by default)"""
+    global _executor
+    if _executor is None:
+        workers = settings.IMAGE_WORKERS or os.cpu_count() or 1
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        logger.info(f"Image processing pool started with {workers} workers")
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        limit = settings.IMAGE_QUEUE_LIMIT or 2 * (settings.IMAGE_WORKERS or os.cpu_count() or 1)
+        _slots = asyncio.Semaphore(limit)
+    return _slots
+
+
+async def run_in_pool(func, *args):
+    """Run a picklable CPU-bound function on the image pool, waiting for a free slot first"""
+    async with _get_slots():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), func, *args)
+
+
+def compress_photo_file(path: str, max_dimension: int = 2048, quality: int = 80) -> bool:
+    """
+    Compress a photo file in place (runs in a pool worker)
+
+    Returns:
+        True if the file was replaced with a smaller JPEG, False if it was left as-is
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    compressed = compress_photo(content, max_dimension=max_dimension, quality=quality)
+    if len(compressed) >= len(content):
+        return False
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_path, path)
+    return True
+
+
+async def compress_photo_files(paths: List[str]) -> List[bool]:
+    """
+    Compress several photo files in place, in parallel on the image pool
+
+    Args:
+        paths: Photo file paths
+
+    Returns:
+        One flag per path (same order): True if the file is now a compressed JPEG
+    """
+    async def one(path: str) -> bool:
+        try:
+            return await run_in_pool(compress_photo_file, path)
+        except Exception as e:
+            logger.warning(f"Image pool compression failed for {path}, keeping original: {e}")
+            return False
+
+    return list(await asyncio.gather(*(one(path) for path in paths)))
+
+
+def make_vision_derivative(src: str, dest: str, max_dimension: int = VISION_MAX_DIMENSION,
+                           quality: int = VISION_JPEG_QUALITY) -> bool:
+    """
+    Write the model-sized JPEG copy of a photo (runs in a pool worker)
+
+    Returns:
+        True if the derivative was written, False if the photo could not be decoded
+    """
+    with open(src, "rb") as f:
+        content = f.read()
+    try:
+        derivative = _encode_jpeg(content, max_dimension, quality)
+    except Exception as e:
+        logger.warning(f"Could not make vision derivative of {src}: {e}")
+        return False
+
+    tmp_path = f"{dest}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(derivative)
+    os.replace(tmp_path, dest)
+    return True
+
+
+async def make_vision_derivatives(pairs: List[Tuple[str, str]]) -> List[bool]:
+    """
+    Make vision derivatives for several photos, in parallel on the image pool
+
+    Args:
+        pairs: (source path, derivative path) tuples
+
+    Returns:
+        One flag per pair (same order): True if the derivative now exists
+    """
+    async def one(src: str, dest: str) -> bool:
+        try:
+            return await run_in_pool(make_vision_derivative, src, dest)
+        except Exception as e:
+            logger.warning(f"Image pool failed to make vision derivative for {src}: {e}")
+            return False
+
+    return list(await asyncio.gather(*(one(src, dest) for src, dest in pairs)))
+
+
+def shutdown():
+    """Stop the pool (called on app shutdown)"""
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+    _slots = None
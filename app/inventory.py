@@ -0,0 +1,134 @@
+"""
+Job inventory loading for PrimeHaul OS
+Fetches every room and item for a job in a single round trip and hands the
+quote calculators a compact, read-only snapshot instead of ORM rows.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Job, Room, Item
+
+
+@dataclass(frozen=True)
+class InventoryItem:
+    """One inventory line with just the fields the calculators read"""
+    qty: int
+    cbm: float
+    weight_kg: float
+    bulky: bool
+    fragile: bool
+    packing_requirement: str
+
+
+@dataclass(frozen=True)
+class InventoryRoom:
+    """A room and its items"""
+    id: str
+    name: str
+    items: Tuple[InventoryItem, ...]
+
+
+@dataclass(frozen=True)
+class JobInventory:
+    """All rooms and items for a job, in room creation order"""
+    rooms: Tuple[InventoryRoom, ...]
+
+    @property
+    def items(self) -> Tuple[InventoryItem, ...]:
+        return tuple(item for room in self.rooms for item in room.items)
+
+
+def _inventory_query(db: Session):
+    return (
+        db.query(
+            Room.job_id,
+            Room.id,
+            Room.name,
+            Item.id,
+            Item.qty,
+            Item.cbm,
+            Item.weight_kg,
+            Item.bulky,
+            Item.fragile,
+            Item.packing_requirement,
+        )
+        .outerjoin(Item, Item.room_id == Room.id)
+        .order_by(Room.created_at, Room.id, Item.created_at, Item.id)
+    )
+
+
+def _build_inventories(rows) -> Dict[str, JobInventory]:
+    """Group (job, room, item) rows into one JobInventory per job"""
+    jobs: Dict[str, Dict[str, Tuple[str, list]]] = {}
+    for job_id, room_id, room_name, item_id, qty, cbm, weight_kg, bulky, fragile, packing_req in rows:
+        rooms = jobs.setdefault(str(job_id), {})
+        key = str(room_id)
+        if key not in rooms:
+            rooms[key] = (room_name, [])
+        if item_id is None:
+            continue
+        rooms[key][1].append(InventoryItem(
+            qty=qty if qty is not None else 1,
+            cbm=float(cbm) if cbm else 0.0,
+            weight_kg=float(weight_kg) if weight_kg else 0.0,
+            bulky=bool(bulky),
+            fragile=bool(fragile),
+            packing_requirement=packing_req or "none",
+        ))
+
+    return {
+        job_id: JobInventory(rooms=tuple(
+            InventoryRoom(id=key, name=name, items=tuple(items))
+            for key, (name, items) in rooms.items()
+        ))
+        for job_id, rooms in jobs.items()
+    }
+
+
+def load_job_inventory(job_id, db: Session) -> JobInventory:
+    """
+    Load all rooms and items for a job with one LEFT JOIN query
+
+    Rooms without items are kept (with an empty item tuple) so per-room
+    calculations still see them.
+
+    Args:
+        job_id: Job UUID
+        db: Database session
+
+    Returns:
+        JobInventory snapshot
+    """
+    rows = _inventory_query(db).filter(Room.job_id == job_id).all()
+    return _build_inventories(rows).get(str(job_id), JobInventory(rooms=()))
+
+
+def load_job_inventories(job_ids: Iterable, db: Session) -> Dict[str, JobInventory]:
+    """
+    Load inventories for many jobs with one LEFT JOIN query
+
+    Callers should pass ids in bounded chunks (see batch re-quoting) rather
+    than every job at once.
+
+    Args:
+        job_ids: Job UUIDs
+        db: Database session
+
+    Returns:
+        Dict mapping str(job_id) to JobInventory; jobs without rooms get an
+        empty inventory
+    """
+    job_ids = list(job_ids)
+    if not job_ids:
+        return {}
+    inventories = _build_inventories(_inventory_query(db).filter(Room.job_id.in_(job_ids)).all())
+    return {str(job_id): inventories.get(str(job_id), JobInventory(rooms=())) for job_id in job_ids}
+
+
+def mark_inventory_changed(job: Job):
+    """Bump the job's inventory revision (atomically, on flush) so its cached quote is recomputed"""
+    job.inventory_revision = func.coalesce(Job.inventory_revision, 0) + 1
@@ -4,30 +4,32 @@ import logging
 import json
 import secrets
 import asyncio
+import dataclasses
+import hashlib
 from pathlib import Path
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from typing import List, Optional
-from io import BytesIO
+from typing import List, Optional, Tuple
 
 from fastapi import FastAPI, Request, Form, UploadFile, File, Response, Depends, HTTPException, status, BackgroundTasks
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.security import HTTPBasicCredentials
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-import aiofiles
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, func, select, true, tuple_
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from app.config import settings
-from app.ai_vision import extract_removal_inventory
-from app.database import get_db, engine
-from app.models import Base, Company, User, PricingConfig, Job, Room, Item, Photo, AdminNote, UsageAnalytics, UserInteraction, AIItemPrediction, MarketplaceJob, Bid, JobBroadcast, Commission, MarketplaceRoom, MarketplaceItem, MarketplacePhoto, ItemFeedback, FurnitureCatalog, TrainingDataset, LearnedCorrection
+from app import ai_vision
+from app.database import get_db, get_async_db, get_read_db, get_async_read_db, engine, async_engine, SessionLocal
+from app import database
+from app.models import Base, Company, User, PricingConfig, Job, Room, Item, Photo, AdminNote, UsageAnalytics, UserInteraction, AIItemPrediction, MarketplaceJob, Bid, JobBroadcast, Commission, MarketplaceRoom, MarketplaceItem, MarketplacePhoto, PhotoAnalysis, ItemFeedback, FurnitureCatalog, TrainingDataset, LearnedCorrection
 from app.auth import hash_password, verify_password, create_access_token, validate_password_strength
 from app.dependencies import get_current_user, require_role, verify_company_access, get_optional_current_user
 from app.sms import notify_quote_approved, notify_quote_submitted, notify_booking_confirmed
@@ -36,6 +38,18 @@ from app import marketplace
 from app import notifications
 from app.variants import get_variants_for_item, get_variant_map_for_js
 from app import ml_learning
+from app.inventory import JobInventory, load_job_inventory, mark_inventory_changed
+from app import quote_engine
+from app import requote
+from app import image_processing
+from app import uploads
+from app import photo_store
+from app import analysis_queue
+from app import company_cache
+from app import metrics_rollup
+from app import dashboard_events
+from app import tracking
+from app.analysis_queue import analyze_photos
 
 load_dotenv()
 
@@ -150,17 +164,21 @@ async def resolve_and_check_company(request: Request, call_next):
     if len(path_parts) >= 3 and path_parts[0] == 's':
         company_slug = path_parts[1]
 
-        # Get database session
-        db = next(get_db())
+        db = None
         try:
-            # Find company by slug
-            company = db.query(Company).filter(Company.slug == company_slug).first()
-
-            if not company:
-                return JSONResponse(
-                    status_code=404,
-                    content={"error": f"Company '{company_slug}' not found"}
-                )
+            # Cached per process for COMPANY_CACHE_TTL_SECONDS; only a miss touches the database
+            company = company_cache.get(company_slug)
+            if company is None:
+                db = SessionLocal()
+                request.state.db = db  # Reused by the request handler (see get_db)
+                company = db.query(Company).filter(Company.slug == company_slug).first()
+
+                if not company:
+                    return JSONResponse(
+                        status_code=404,
+                        content={"error": f"Company '{company_slug}' not found"}
+                    )
+                company_cache.put(company)
 
             # Credits handle billing now — only check company is active
             if not company.is_active:
@@ -173,14 +191,12 @@ async def resolve_and_check_company(request: Request, call_next):
             request.state.company = company
 
             # Attach branding for template injection
-            request.state.branding = {
-                "company_name": company.company_name,
-                "logo_url": company.logo_url or "/static/placeholder-photo.jpg",
-                "primary_color": company.primary_color,
-                "secondary_color": company.secondary_color
-            }
+            request.state.branding = company_cache.branding(company)
+
+            return await call_next(request)
         finally:
-            db.close()
+            if db is not None:
+                db.close()
 
     response = await call_next(request)
     return response
@@ -191,51 +207,190 @@ templates = Jinja2Templates(directory="app/templates")
 
 # Create uploads directory OUTSIDE of static (for security)
 # Photos will be served through an authenticated endpoint
-UPLOAD_DIR = Path("uploads")  # Not in app/static - not publicly accessible
+UPLOAD_DIR = photo_store.UPLOAD_DIR  # Not in app/static - not publicly accessible
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def compress_photo(content: bytes, max_dimension: int = 2048, quality: int = 80) -> bytes:
-    """Compress and resize a photo. Returns original bytes if compression fails."""
-    try:
-        from PIL import Image, ExifTags
-        img = Image.open(BytesIO(content))
+# Startup background jobs, held here so they aren't garbage-collected mid-run
+_background_tasks = set()
+
+
+def _start_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+@app.on_event("startup")
+async def resume_photo_analyses():
+    """Inline mode: pick up analyses left queued or interrupted by a restart"""
+    if settings.ANALYSIS_INLINE:
+        _start_background(analysis_queue.drain())
+
+
+@app.on_event("startup")
+async def start_dashboard_events_bridge():
+    """Relay dashboard events from other processes (PostgreSQL LISTEN/NOTIFY)"""
+    if dashboard_events.bridge_available():
+        _start_background(dashboard_events.listen_forever())
+
+
+@app.on_event("startup")
+async def start_metrics_rollup():
+    """Keep the developer dashboard's metrics rollup fresh"""
+    if metrics_rollup.refresh_in_background():
+        _start_background(metrics_rollup.refresh_loop())
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    """Cancel the startup background jobs"""
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
+@app.on_event("shutdown")
+def shutdown_image_pool():
+    """Stop the photo compression process pool"""
+    image_processing.shutdown()
+
+
+@app.on_event("shutdown")
+async def shutdown_vision_client():
+    """Close pooled connections to the vision API"""
+    await ai_vision.close_async_client()
+
+
+@app.on_event("startup")
+async def start_tracking_buffer():
+    """Flush buffered /api/track events in the background"""
+    tracking.buffer.start()
+
+
+@app.on_event("shutdown")
+async def flush_tracking_buffer():
+    """Write tracked events still in the buffer (before the async pool closes)"""
+    await tracking.buffer.stop()
+
+
+@app.on_event("shutdown")
+async def shutdown_async_engine():
+    """Close the async database connection pool"""
+    await async_engine.dispose()
+
+
+async def save_uploaded_photos(photos: List[UploadFile], company_id, allowed_types: set = None, max_bytes: int = 10 * 1024 * 1024) -> List[photo_store.StoredPhoto]:
+    """
+    Stream uploaded photos into the company's content-addressed blob store
+
+    Files of the wrong type or over the size cap are skipped. Identical
+    content (within the request or from an earlier upload) is stored once.
+
+    Args:
+        photos: Uploaded files
+        company_id: Owning company
+        allowed_types: Accepted MIME types (None accepts anything)
+        max_bytes: Per-file size cap
+
+    Returns:
+        One StoredPhoto per distinct photo, in upload order
+    """
+    blob_dir = photo_store.blob_dir(company_id)
+    ingested = []
+    for f in photos:
+        # Validate file type
+        if allowed_types is not None and f.content_type not in allowed_types:
+            logger.warning(f"Rejected file with invalid type: {f.content_type}")
+            continue
 
-        # Auto-rotate from EXIF
         try:
-            for orientation in ExifTags.TAGS.keys():
-                if ExifTags.TAGS[orientation] == 'Orientation':
-                    break
-            exif = img._getexif()
-            if exif and orientation in exif:
-                if exif[orientation] == 3:
-                    img = img.rotate(180, expand=True)
-                elif exif[orientation] == 6:
-                    img = img.rotate(270, expand=True)
-                elif exif[orientation] == 8:
-                    img = img.rotate(90, expand=True)
-        except (AttributeError, KeyError):
-            pass
-
-        # Resize if larger than max_dimension
-        if max(img.size) > max_dimension:
-            img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
-
-        # Convert to RGB if needed (e.g. RGBA PNGs)
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
-
-        buf = BytesIO()
-        img.save(buf, format="JPEG", quality=quality, optimize=True)
-        compressed = buf.getvalue()
-
-        # Only use compressed version if it's actually smaller
-        if len(compressed) < len(content):
-            return compressed
-        return content
-    except Exception as e:
-        logger.warning(f"Photo compression failed, using original: {e}")
-        return content
+            ingested.append(await uploads.ingest_upload(f, blob_dir, max_bytes))
+        except uploads.UploadTooLarge:
+            logger.warning(f"File {f.filename} exceeds size limit")
+        except Exception as e:
+            logger.error(f"Error saving photo {f.filename}: {e}")
+
+    # Compress new content on the image pool (resize to max 2048px, JPEG quality 80) and store by hash
+    return await photo_store.store_uploads(company_id, ingested)
+
+
+def add_room_photos(room: Room, stored: List[photo_store.StoredPhoto], db: Session) -> List[Photo]:
+    """
+    Record stored photos against a room, skipping content the room already has
+
+    Returns:
+        The newly added Photo rows (photos the room already had are not
+        returned, so they are not analysed again)
+    """
+    existing = {}
+    hashes = [photo.sha256 for photo in stored]
+    if hashes:
+        existing = {
+            photo.content_hash: photo
+            for photo in db.query(Photo).filter(Photo.room_id == room.id, Photo.content_hash.in_(hashes))
+        }
+
+    added = []
+    for stored_photo in stored:
+        photo = existing.get(stored_photo.sha256)
+        if photo is None:
+            photo = Photo(
+                room_id=room.id,
+                filename=stored_photo.filename,
+                original_filename=stored_photo.original_filename,
+                file_size_bytes=stored_photo.size,
+                mime_type=stored_photo.content_type,
+                storage_path=stored_photo.storage_path,
+                content_hash=stored_photo.sha256,
+            )
+            db.add(photo)
+            added.append(photo)
+            logger.info(f"Saved photo: {photo.filename}")
+        else:
+            logger.info(f"Room already has photo {photo.filename}, not adding a duplicate")
+    return added
+
+
+def queue_photo_analysis(company_id, job: Job, room: Room, photos: List[Photo],
+                         background_tasks: BackgroundTasks, db: Session) -> Optional[PhotoAnalysis]:
+    """
+    Queue AI analysis of newly added room photos (caller commits)
+
+    With ANALYSIS_INLINE the web process runs it after the response is sent;
+    otherwise an analysis worker picks it up.
+
+    Returns:
+        The queued PhotoAnalysis, or None if there was nothing new to analyse
+    """
+    if not photos:
+        return None
+    analysis = analysis_queue.enqueue_analysis(company_id, job.id, room.id, photos, db)
+    if settings.ANALYSIS_INLINE:
+        background_tasks.add_task(analysis_queue.run_inline, analysis.id)
+    return analysis
+
+
+def room_items_json(room: Room, db: Session) -> dict:
+    """Room items (ordered by ID for consistent indexing) with variant options, for the room scan page"""
+    items = db.query(Item).filter(Item.room_id == room.id).order_by(Item.id).all()
+    return {
+        "items": [{
+            "name": item.name,
+            "qty": item.qty,
+            "notes": item.notes or "",
+            "bulky": item.bulky,
+            "fragile": item.fragile,
+            "length_cm": float(item.length_cm) if item.length_cm else None,
+            "width_cm": float(item.width_cm) if item.width_cm else None,
+            "height_cm": float(item.height_cm) if item.height_cm else None,
+            "weight_kg": float(item.weight_kg) if item.weight_kg else None,
+            "cbm": float(item.cbm) if item.cbm else None,
+            "variants": [v["name"] for v in (get_variants_for_item(item.name) or [])],
+        } for item in items],
+        "summary": room.summary or ""
+    }
 
 
 def get_or_create_job(company_id: uuid.UUID, token: str, db: Session, survey_mode: str = None) -> Job:
@@ -270,6 +425,22 @@ def get_or_create_job(company_id: uuid.UUID, token: str, db: Session, survey_mod
     return job
 
 
+def find_job_room(company_id: uuid.UUID, token: str, room_id: str, db: Session) -> Tuple[Job, Optional[Room]]:
+    """The survey's job (created if needed) and one of its rooms, or None if the room is not in this job"""
+    job = get_or_create_job(company_id, token, db)
+    room = db.query(Room).filter(Room.id == room_id, Room.job_id == job.id).first()
+    return job, room
+
+
+def record_room_upload(company_id, job: Job, room: Room, stored: List[photo_store.StoredPhoto],
+                       background_tasks: BackgroundTasks, db: Session) -> Optional[PhotoAnalysis]:
+    """Save a room's uploaded photos and queue the new ones for AI analysis (commits)"""
+    room_photos = add_room_photos(room, stored, db)
+    analysis = queue_photo_analysis(company_id, job, room, room_photos, background_tasks, db)
+    db.commit()
+    return analysis
+
+
 def staging_auth_required(credentials: HTTPBasicCredentials = Depends(security) if STAGING_MODE else None):
     """
     Dependency for routes that should be password-protected in staging mode
@@ -333,7 +504,7 @@ async def cbm_calculator(request: Request):
 async def dev_dashboard(
     request: Request,
     password: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Developer mission control dashboard
@@ -403,28 +574,15 @@ async def dev_dashboard(
             </html>
         """, status_code=401)
 
-    # Calculate metrics
+    # Platform metrics (precomputed rollup, see app/metrics_rollup.py)
     now = datetime.utcnow()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
+    metrics = await db.run_sync(metrics_rollup.get_dashboard_metrics)
 
     # Revenue metrics
-    paying_customers = db.query(Company).filter(
-        Company.subscription_status == 'active'
-    ).count()
-
-    active_trials = db.query(Company).filter(
-        Company.subscription_status == 'trial',
-        Company.trial_ends_at > now
-    ).count()
-
-    churned_customers = db.query(Company).filter(
-        Company.subscription_status == 'canceled',
-        Company.subscription_canceled_at >= month_ago
-    ).count()
-
-    total_companies = db.query(Company).count()
+    paying_customers = metrics["paying_customers"]
+    active_trials = metrics["active_trials"]
+    churned_customers = metrics["churned_customers"]
+    total_companies = metrics["total_companies"]
 
     # Calculate MRR (£99 per paying customer)
     mrr = paying_customers * 99
@@ -432,10 +590,7 @@ async def dev_dashboard(
     arpu = 99  # Fixed pricing
 
     # Trial conversion rate
-    total_trials = db.query(Company).filter(
-        Company.subscription_status.in_(['active', 'canceled']),
-        Company.created_at >= month_ago - timedelta(days=30)  # Last 60 days for fair sample
-    ).count()
+    total_trials = metrics["total_trials"]
     trial_conversion = round((paying_customers / max(total_trials, 1)) * 100, 1) if total_trials > 0 else 0
 
     # Churn rate
@@ -446,32 +601,15 @@ async def dev_dashboard(
     stripe_webhook_status = True  # TODO: Check last webhook timestamp
 
     # Activity metrics
-    total_jobs = db.query(Job).count()
-
-    signups_today = db.query(Company).filter(
-        Company.created_at >= today_start
-    ).count()
-
-    quotes_today = db.query(Job).filter(
-        Job.created_at >= today_start
-    ).count()
-
-    submitted_today = db.query(Job).filter(
-        Job.submitted_at >= today_start
-    ).count()
-
-    approved_today = db.query(Job).filter(
-        Job.approved_at >= today_start
-    ).count()
-
-    photos_today = db.query(Photo).filter(
-        Photo.created_at >= today_start
-    ).count()
+    total_jobs = metrics["total_jobs"]
+    signups_today = metrics["signups_today"]
+    quotes_today = metrics["quotes_today"]
+    submitted_today = metrics["submitted_today"]
+    approved_today = metrics["approved_today"]
+    photos_today = metrics["photos_today"]
 
     # Marketing metrics (7 days)
-    trial_signups_7d = db.query(Company).filter(
-        Company.created_at >= week_ago
-    ).count()
+    trial_signups_7d = metrics["trial_signups_7d"]
 
     landing_visits = 0  # TODO: Integrate Google Analytics
     signup_conversion = 0  # TODO: Calculate from analytics
@@ -591,7 +729,7 @@ async def dev_dashboard(
     recent_activity = []
 
     # Get recent companies
-    recent_companies = db.query(Company).order_by(Company.created_at.desc()).limit(5).all()
+    recent_companies = (await db.scalars(select(Company).order_by(Company.created_at.desc()).limit(5))).all()
     for company in recent_companies:
         time_ago = _time_ago(company.created_at, now)
         recent_activity.append({
@@ -601,9 +739,11 @@ async def dev_dashboard(
         })
 
     # Get recent jobs (batch-fetch companies to avoid N+1)
-    recent_jobs = db.query(Job).order_by(Job.created_at.desc()).limit(5).all()
+    recent_jobs = (await db.scalars(select(Job).order_by(Job.created_at.desc()).limit(5))).all()
     job_company_ids = {j.company_id for j in recent_jobs}
-    job_companies = {c.id: c for c in db.query(Company).filter(Company.id.in_(job_company_ids)).all()} if job_company_ids else {}
+    job_companies = {
+        c.id: c for c in (await db.scalars(select(Company).where(Company.id.in_(job_company_ids)))).all()
+    } if job_company_ids else {}
     for job in recent_jobs:
         time_ago = _time_ago(job.created_at, now)
         company = job_companies.get(job.company_id)
@@ -652,7 +792,7 @@ async def dev_dashboard(
         })
 
     # Marketplace metrics
-    marketplace_stats = marketplace.get_marketplace_stats(db)
+    marketplace_stats = metrics["marketplace"]
 
     return templates.TemplateResponse("dev_dashboard.html", {
         "request": request,
@@ -969,8 +1109,58 @@ def superadmin_logout():
     return response
 
 
+SUPERADMIN_COMPANIES_PER_PAGE = 50
+
+
+def _company_cursor(company: Company) -> str:
+    """Keyset cursor for the superadmin company list: created_at and id of the last company shown"""
+    return f"{company.created_at.isoformat()}_{company.id}"
+
+
+def _parse_company_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, uuid.UUID]]:
+    """(created_at, id) from a company list cursor, or None if missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        created_at, company_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(company_id)
+    except ValueError:
+        return None
+
+
+def superadmin_totals(db: Session) -> dict:
+    """
+    Platform totals for the superadmin dashboard in a single query
+
+    Company and feedback totals are aggregated with FILTER clauses (one pass
+    over each table); surveys submitted today use the submitted_at index.
+    """
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    paid_surveys = case((Company.surveys_used > 3, Company.surveys_used - 3), else_=0)
+
+    companies = select(
+        func.count().label("total_companies"),
+        func.coalesce(func.sum(Company.surveys_used), 0).label("total_surveys"),
+        func.coalesce(
+            func.sum(paid_surveys).filter(func.coalesce(Company.is_partner, False).is_(False)), 0
+        ).label("paid_surveys"),
+    ).subquery()
+    feedback = select(
+        func.count().label("feedback"),
+        func.count().filter(ItemFeedback.feedback_type == 'correction').label("corrections"),
+        func.count().filter(ItemFeedback.feedback_type == 'variant_change').label("variant_changes"),
+    ).subquery()
+    surveys_today = select(func.count()).select_from(Job).where(Job.submitted_at >= today_start).scalar_subquery()
+
+    row = db.execute(
+        select(companies, feedback, surveys_today.label("surveys_today"))
+        .select_from(companies.join(feedback, true()))
+    ).one()
+    return dict(row._mapping)
+
+
 @app.get("/superadmin/dashboard", response_class=HTMLResponse)
-def superadmin_dashboard(request: Request, db: Session = Depends(get_db)):
+def superadmin_dashboard(request: Request, before: Optional[str] = None, db: Session = Depends(get_read_db)):
     """Superadmin dashboard with all platform data"""
     if not verify_superadmin(request):
         return RedirectResponse(url="/superadmin/login", status_code=303)
@@ -978,51 +1168,49 @@ def superadmin_dashboard(request: Request, db: Session = Depends(get_db)):
     from datetime import datetime, timedelta
 
     try:
-        # Get all companies
-        companies = db.query(Company).order_by(Company.created_at.desc()).all()
+        # One page of companies, newest first (keyset pagination on created_at, id)
+        companies_query = db.query(Company)
+        cursor = _parse_company_cursor(before)
+        if cursor:
+            companies_query = companies_query.filter(tuple_(Company.created_at, Company.id) < cursor)
+        companies = companies_query.order_by(
+            Company.created_at.desc(), Company.id.desc()
+        ).limit(SUPERADMIN_COMPANIES_PER_PAGE + 1).all()
+        next_cursor = None
+        if len(companies) > SUPERADMIN_COMPANIES_PER_PAGE:
+            companies = companies[:SUPERADMIN_COMPANIES_PER_PAGE]
+            next_cursor = _company_cursor(companies[-1])
 
         # Calculate stats
-        total_surveys = db.query(func.sum(Company.surveys_used)).scalar() or 0
-        total_items = db.query(Item).count()
-        total_photos = db.query(Photo).count()
-        ml_corrections = db.query(ItemFeedback).count()
-        surveys_today = db.query(Job).filter(
-            Job.submitted_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)
-        ).count()
-
-        # Revenue estimate (surveys beyond free tier * £9.99)
-        revenue_total = 0
-        for c in companies:
-            is_partner = getattr(c, 'is_partner', False) or False
-            if not is_partner:
-                paid_surveys = max(0, (c.surveys_used or 0) - 3)
-                revenue_total += paid_surveys * 9.99
+        totals = superadmin_totals(db)
+        row_counts = database.estimated_row_counts(db, ["items", "photos", "jobs", "rooms", "usage_analytics"])
 
         stats = {
-            "total_companies": len(companies),
-            "total_surveys": total_surveys,
-            "total_items": total_items,
-            "ml_corrections": ml_corrections,
-            "surveys_today": surveys_today,
-            "revenue_total": revenue_total
+            "total_companies": totals["total_companies"],
+            "total_surveys": totals["total_surveys"],
+            "total_items": row_counts["items"],
+            "ml_corrections": totals["feedback"],
+            "surveys_today": totals["surveys_today"],
+            # Revenue estimate (surveys beyond free tier * £9.99)
+            "revenue_total": totals["paid_surveys"] * 9.99
         }
 
         # ML training data stats
         ml_stats = {
-            "total_photos": total_photos,
-            "total_items": total_items,
-            "corrections": db.query(ItemFeedback).filter(ItemFeedback.feedback_type == 'correction').count(),
-            "variant_changes": db.query(ItemFeedback).filter(ItemFeedback.feedback_type == 'variant_change').count()
+            "total_photos": row_counts["photos"],
+            "total_items": row_counts["items"],
+            "corrections": totals["corrections"],
+            "variant_changes": totals["variant_changes"]
         }
 
-        # Database stats
+        # Database stats (large tables are planner estimates)
         db_stats = {
-            "jobs": db.query(Job).count(),
-            "rooms": db.query(Room).count(),
-            "photos": total_photos,
-            "items": total_items,
-            "feedback": ml_corrections,
-            "analytics": db.query(UsageAnalytics).count()
+            "jobs": row_counts["jobs"],
+            "rooms": row_counts["rooms"],
+            "photos": row_counts["photos"],
+            "items": row_counts["items"],
+            "feedback": totals["feedback"],
+            "analytics": row_counts["usage_analytics"]
         }
 
         # Recent activity (last 20 analytics events) — batch-fetch companies
@@ -1044,7 +1232,7 @@ def superadmin_dashboard(request: Request, db: Session = Depends(get_db)):
                 "event_type": event.event_type,
                 "company_name": company.company_name if company else "Unknown",
                 "time_ago": time_ago,
-                "metadata": str(event.metadata)[:100] if event.metadata else None
+                "metadata": str(event.event_metadata)[:100] if event.event_metadata else None
             })
 
         # Recent ML feedback (last 30 corrections/changes) — batch-fetch companies
@@ -1074,6 +1262,8 @@ def superadmin_dashboard(request: Request, db: Session = Depends(get_db)):
         return templates.TemplateResponse("superadmin_dashboard.html", {
             "request": request,
             "companies": companies,
+            "next_cursor": next_cursor,
+            "paginated": cursor is not None,
             "stats": stats,
             "ml_stats": ml_stats,
             "db_stats": db_stats,
@@ -1097,13 +1287,14 @@ def make_partner(request: Request, company_slug: str, partner_name: str = Form(.
         company.is_partner = True
         company.partner_name = partner_name
         db.commit()
+        company_cache.invalidate(company.slug)
         logger.info(f"Made {company_slug} a partner: {partner_name}")
 
     return RedirectResponse(url="/superadmin/dashboard", status_code=303)
 
 
 @app.get("/superadmin/learning")
-def superadmin_learning(request: Request, db: Session = Depends(get_db)):
+def superadmin_learning(request: Request, db: Session = Depends(get_read_db)):
     """View ML learning stats and learned patterns"""
     if not verify_superadmin(request):
         return RedirectResponse(url="/superadmin/login", status_code=303)
@@ -1135,7 +1326,7 @@ def superadmin_run_learning(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/superadmin/activity")
-def superadmin_activity(request: Request, db: Session = Depends(get_db)):
+def superadmin_activity(request: Request, db: Session = Depends(get_read_db)):
     """Live activity monitor - real-time boss & customer behavior tracking"""
     if not verify_superadmin(request):
         return RedirectResponse(url="/superadmin/login", status_code=303)
@@ -1165,6 +1356,14 @@ def superadmin_activity(request: Request, db: Session = Depends(get_db)):
         return HTMLResponse(f"<h1>Activity Error</h1><pre>{str(e)}</pre><p><a href='/superadmin/dashboard'>Back</a></p>", status_code=500)
 
 
+@app.get("/superadmin/db-stats")
+def superadmin_db_stats(request: Request):
+    """Connection pool metrics (checked out, overflow, checkout wait times) and tracking buffer state for this worker process"""
+    if not verify_superadmin(request):
+        return JSONResponse({"error": "Not authorised"}, status_code=401)
+    return JSONResponse({**database.pool_stats(), "tracking_buffer": tracking.buffer.stats()})
+
+
 @app.post("/superadmin/fix-survey-counts")
 def superadmin_fix_survey_counts(request: Request, db: Session = Depends(get_db)):
     """
@@ -1198,6 +1397,7 @@ def superadmin_fix_survey_counts(request: Request, db: Session = Depends(get_db)
                     logger.info(f"Fixed {company.slug}: {old_count} → {submitted_count} surveys")
 
         db.commit()
+        company_cache.invalidate()
         logger.info(f"Survey count fix complete: {fixed} companies updated")
         return RedirectResponse(url=f"/superadmin/dashboard?fixed={fixed}", status_code=303)
 
@@ -1246,8 +1446,15 @@ def serve_protected_photo(
     # For customer access: always allowed (they uploaded the photos)
     # For admin access: allowed anytime (prepaid credits model)
 
-    # Construct file path
-    file_path = UPLOAD_DIR / company_id / token / filename
+    # Construct file path (content-addressed photos are looked up through the job's rooms)
+    photo = db.query(Photo).join(Room, Photo.room_id == Room.id).filter(
+        Room.job_id == job.id,
+        Photo.filename == filename
+    ).first()
+    if photo and photo.storage_path:
+        file_path = Path(photo.storage_path)
+    else:
+        file_path = UPLOAD_DIR / company_id / token / filename
 
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Photo not found")
@@ -1706,27 +1913,17 @@ def room_scan_get(request: Request, company_slug: str, token: str, room_id: str,
     if not room:
         return RedirectResponse(url=f"/s/{company_slug}/{token}/rooms", status_code=303)
 
-    # Get items and photos for this room (order by ID for consistent indexing)
-    items = db.query(Item).filter(Item.room_id == room.id).order_by(Item.id).all()
+    # Get items and photos for this room
     photos = db.query(Photo).filter(Photo.room_id == room.id).all()
 
     # Build items_json for template (include variant options per item)
-    items_json = {
-        "items": [{
-            "name": item.name,
-            "qty": item.qty,
-            "notes": item.notes or "",
-            "bulky": item.bulky,
-            "fragile": item.fragile,
-            "length_cm": float(item.length_cm) if item.length_cm else None,
-            "width_cm": float(item.width_cm) if item.width_cm else None,
-            "height_cm": float(item.height_cm) if item.height_cm else None,
-            "weight_kg": float(item.weight_kg) if item.weight_kg else None,
-            "cbm": float(item.cbm) if item.cbm else None,
-            "variants": [v["name"] for v in (get_variants_for_item(item.name) or [])],
-        } for item in items],
-        "summary": room.summary or ""
-    }
+    items_json = room_items_json(room, db)
+
+    # Latest unfinished photo analysis, so the page can show progress and poll for items
+    pending_analysis = db.query(PhotoAnalysis).filter(
+        PhotoAnalysis.room_id == room.id,
+        PhotoAnalysis.status.in_(["queued", "running"])
+    ).order_by(PhotoAnalysis.created_at.desc()).first()
 
     # Build photos list for template (use protected photo endpoint)
     photos_list = [{"filename": p.filename, "url": f"/photo/{company.id}/{token}/{p.filename}"} for p in photos]
@@ -1748,6 +1945,9 @@ def room_scan_get(request: Request, company_slug: str, token: str, room_id: str,
         "photos": photos_list,
         "items_json": items_json,
         "variant_map_js": variant_map_js,
+        "analysis_status_url": (
+            f"/s/{company_slug}/{token}/room/{room.id}/analysis/{pending_analysis.id}" if pending_analysis else None
+        ),
     })
 
 
@@ -1757,188 +1957,33 @@ async def room_scan_upload(
     company_slug: str,
     token: str,
     room_id: str,
+    background_tasks: BackgroundTasks,
     photos: list[UploadFile] = File(default=[]),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Upload and analyze photos for a room"""
+    """Upload photos for a room and queue them for AI analysis"""
     company = request.state.company
-    job = get_or_create_job(company.id, token, db)
+    job, room = await db.run_sync(lambda session: find_job_room(company.id, token, room_id, session))
 
-    # Get room
-    room = db.query(Room).filter(Room.id == room_id, Room.job_id == job.id).first()
     if not room:
         return RedirectResponse(url=f"/s/{company_slug}/{token}/rooms", status_code=303)
 
     if not photos:
         return RedirectResponse(url=f"/s/{company_slug}/{token}/room/{room_id}?err=no_photos", status_code=303)
 
-    # Create company-specific upload directory
-    company_upload_dir = UPLOAD_DIR / str(company.id) / token
-    company_upload_dir.mkdir(parents=True, exist_ok=True)
-
-    # Save uploaded photos and track paths for AI analysis
-    saved_paths = []
-    MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    # Save uploaded photos (deduplicated by content)
     ALLOWED_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp", "image/heic", "image/heif"}
+    stored = await save_uploaded_photos(photos, company.id, ALLOWED_TYPES)
 
-    for f in photos:
-        # Validate file type
-        if f.content_type not in ALLOWED_TYPES:
-            logger.warning(f"Rejected file with invalid type: {f.content_type}")
-            continue
-
-        # Generate unique filename
-        ext = os.path.splitext(f.filename or "photo.jpg")[1] or ".jpg"
-        fname = f"{uuid.uuid4().hex[:12]}{ext}"
-        file_path = company_upload_dir / fname
-
-        # Save file with size validation and compression
-        try:
-            content = await f.read()
-            if len(content) > MAX_FILE_SIZE:
-                logger.warning(f"File {f.filename} exceeds size limit")
-                continue
-
-            # Compress photo (resize to max 2048px, JPEG quality 80)
-            original_size = len(content)
-            content = compress_photo(content)
-            if len(content) < original_size:
-                logger.info(f"Compressed {f.filename}: {original_size // 1024}KB → {len(content) // 1024}KB")
-                # Update filename to .jpg if compressed
-                fname = f"{uuid.uuid4().hex[:12]}.jpg"
-                file_path = company_upload_dir / fname
-
-            async with aiofiles.open(file_path, 'wb') as out_file:
-                await out_file.write(content)
-
-            saved_paths.append(str(file_path))
-
-            # Save photo record to database
-            storage_path = f"uploads/{company.id}/{token}/{fname}"
-            photo = Photo(
-                room_id=room.id,
-                filename=fname,
-                original_filename=f.filename,
-                file_size_bytes=len(content),
-                mime_type=f.content_type,
-                storage_path=storage_path
-            )
-            db.add(photo)
-            logger.info(f"Saved photo: {fname}")
-        except Exception as e:
-            logger.error(f"Error saving photo {f.filename}: {e}")
-            continue
-
-    db.commit()
-
-    # Use AI to analyze photos and extract inventory
-    if saved_paths:
-        try:
-            # 🧠 SELF-LEARNING: Get learned patterns to enhance AI prompt
-            learned_guidance = None
-            try:
-                learned_guidance = ml_learning.get_learned_patterns_for_prompt(db)
-                if learned_guidance:
-                    logger.info("Injecting learned patterns into AI prompt")
-            except Exception as e:
-                logger.warning(f"Could not get learned patterns: {e}")
-
-            logger.info(f"Analyzing {len(saved_paths)} photos with AI vision...")
-            inventory = await asyncio.to_thread(extract_removal_inventory, saved_paths, learned_guidance=learned_guidance)
-
-            # 🧠 SELF-LEARNING: Apply learned corrections to AI detections (backup)
-            if inventory.get("items"):
-                try:
-                    inventory["items"], corrections = ml_learning.apply_learned_corrections(inventory["items"], db)
-                    if corrections:
-                        logger.info(f"Auto-applied {len(corrections)} learned corrections")
-                except Exception as e:
-                    logger.warning(f"Could not apply learned corrections: {e}")
-
-            # Store structured items
-            if inventory.get("items"):
-                created_items = []
-                for item_data in inventory["items"]:
-                    weight_kg = item_data.get("weight_kg")
-                    item = Item(
-                        room_id=room.id,
-                        name=item_data.get("name", "Unknown item"),
-                        qty=item_data.get("qty", 1),
-                        notes=item_data.get("notes", ""),
-                        length_cm=item_data.get("length_cm"),
-                        width_cm=item_data.get("width_cm"),
-                        height_cm=item_data.get("height_cm"),
-                        weight_kg=weight_kg,
-                        cbm=item_data.get("cbm"),
-                        bulky=(float(weight_kg) > 50) if weight_kg else False,
-                        fragile=item_data.get("fragile", False),
-                        item_category=item_data.get("item_category", "furniture"),
-                        packing_requirement=item_data.get("packing_requirement", "none")
-                    )
-                    db.add(item)
-                    created_items.append((item, item_data))
-
-                # Update room summary
-                if inventory.get("summary"):
-                    room.summary = inventory.get("summary", "")
-
-                db.commit()
-                logger.info(f"AI detected {len(inventory['items'])} items")
-
-                # 🎓 AUTO-LEARN: Save OpenAI detections as training data
-                for item, item_data in created_items:
-                    try:
-                        # Only save if we have dimensions (good training data)
-                        if item.length_cm and item.width_cm and item.height_cm:
-                            training_entry = TrainingDataset(
-                                id=uuid.uuid4(),
-                                image_url=saved_paths[0] if saved_paths else None,
-                                image_hash=None,
-                                item_name=item.name,
-                                item_category=item.item_category or "furniture",
-                                length_cm=item.length_cm,
-                                width_cm=item.width_cm,
-                                height_cm=item.height_cm,
-                                cbm=item.cbm,
-                                weight_kg=item.weight_kg,
-                                is_bulky=item.bulky,
-                                is_fragile=item.fragile,
-                                packing_requirement=item.packing_requirement,
-                                source_type='openai_live',  # Live detection
-                                source_id=item.id,
-                                confidence_score=0.85,  # OpenAI is reliable
-                                verified=False,  # Not yet verified by admin
-                                used_in_training=False
-                            )
-                            db.add(training_entry)
-                    except Exception as e:
-                        logger.warning(f"Could not save training data for item: {e}")
-
-                db.commit()
-                logger.info(f"💡 Saved {len(created_items)} OpenAI detections to training dataset")
-
-                # Track analytics event
-                photo_count = len(photos)
-                ai_cost = photo_count * 0.003  # Approximate $0.003 per image
-                track_event(
-                    company_id=company.id,
-                    event_type='photo_analyzed',
-                    metadata={
-                        'job_token': token,
-                        'room_id': str(room_id),
-                        'photo_count': photo_count,
-                        'items_detected': len(inventory['items'])
-                    },
-                    ai_cost_usd=ai_cost,
-                    db=db
-                )
-            else:
-                logger.warning("AI returned no items")
-
-        except Exception as e:
-            logger.error(f"AI vision error: {e}")
+    # Queue AI analysis; the page polls for progress
+    analysis = await db.run_sync(
+        lambda session: record_room_upload(company.id, job, room, stored, background_tasks, session)
+    )
 
-    return RedirectResponse(url=f"/s/{company_slug}/{token}/room/{room_id}?saved=1", status_code=303)
+    url = f"/s/{company_slug}/{token}/room/{room_id}?saved=1"
+    if analysis:
+        url += f"&analysis={analysis.id}"
+    return RedirectResponse(url=url, status_code=303)
 
 
 @app.post("/s/{company_slug}/{token}/room/{room_id}/upload-json")
@@ -1947,169 +1992,74 @@ async def room_scan_upload_json(
     company_slug: str,
     token: str,
     room_id: str,
+    background_tasks: BackgroundTasks,
     photos: list[UploadFile] = File(default=[]),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """JSON version of upload endpoint for AJAX calls"""
+    """JSON version of upload endpoint for AJAX calls (returns an analysis id to poll)"""
     company = request.state.company
-    job = get_or_create_job(company.id, token, db)
+    job, room = await db.run_sync(lambda session: find_job_room(company.id, token, room_id, session))
 
-    # Get room
-    room = db.query(Room).filter(Room.id == room_id, Room.job_id == job.id).first()
     if not room:
         return JSONResponse({"ok": False, "error": "Room not found"}, status_code=404)
 
     if not photos:
         return JSONResponse({"ok": False, "error": "No photos provided"}, status_code=400)
 
-    # Create company-specific upload directory
-    company_upload_dir = UPLOAD_DIR / str(company.id) / token
-    company_upload_dir.mkdir(parents=True, exist_ok=True)
-
-    # Save uploaded photos and track paths for AI analysis
-    saved_paths = []
-    photo_records = []
-    MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    # Save uploaded photos (deduplicated by content)
     ALLOWED_TYPES = {"image/jpeg", "image/jpg", "image/webp", "image/heic", "image/heif"}
+    stored = await save_uploaded_photos(photos, company.id, ALLOWED_TYPES)
+    photo_records = [
+        {"filename": photo.filename, "url": f"/photo/{company.id}/{token}/{photo.filename}"}
+        for photo in stored
+    ]
 
-    for f in photos:
-        # Validate file type
-        if f.content_type not in ALLOWED_TYPES:
-            logger.warning(f"Rejected file with invalid type: {f.content_type}")
-            continue
-
-        # Generate unique filename
-        ext = os.path.splitext(f.filename or "photo.jpg")[1] or ".jpg"
-        fname = f"{uuid.uuid4().hex[:12]}{ext}"
-        file_path = company_upload_dir / fname
-
-        # Save file with size validation
-        try:
-            content = await f.read()
-            if len(content) > MAX_FILE_SIZE:
-                logger.warning(f"File {f.filename} exceeds size limit")
-                continue
-
-            async with aiofiles.open(file_path, 'wb') as out_file:
-                await out_file.write(content)
-
-            saved_paths.append(str(file_path))
-
-            # Save photo record to database
-            storage_path = f"uploads/{company.id}/{token}/{fname}"
-            photo = Photo(
-                room_id=room.id,
-                filename=fname,
-                original_filename=f.filename,
-                file_size_bytes=len(content),
-                mime_type=f.content_type,
-                storage_path=storage_path
-            )
-            db.add(photo)
-            photo_records.append({"filename": fname, "url": f"/photo/{company.id}/{token}/{fname}"})
-            logger.info(f"Saved photo: {fname}")
-        except Exception as e:
-            logger.error(f"Error saving photo {f.filename}: {e}")
-            continue
+    # Queue AI analysis; the client polls the status URL for the detected items
+    analysis = await db.run_sync(
+        lambda session: record_room_upload(company.id, job, room, stored, background_tasks, session)
+    )
 
-    db.commit()
+    response = {
+        "ok": True,
+        "photos": photo_records,
+        "items_json": await db.run_sync(lambda session: room_items_json(room, session)),
+    }
+    if analysis:
+        response.update(analysis_queue.analysis_status(analysis))
+        response["status_url"] = f"/s/{company_slug}/{token}/room/{room_id}/analysis/{analysis.id}"
+    return JSONResponse(response, status_code=202 if analysis else 200)
 
-    # Use AI to analyze photos and extract inventory
-    items_list = []
-    if saved_paths:
-        try:
-            # 🧠 SELF-LEARNING: Get learned patterns to enhance AI prompt
-            learned_guidance = None
-            try:
-                learned_guidance = ml_learning.get_learned_patterns_for_prompt(db)
-                if learned_guidance:
-                    logger.info("Injecting learned patterns into AI prompt")
-            except Exception as e:
-                logger.warning(f"Could not get learned patterns: {e}")
 
-            logger.info(f"Analyzing {len(saved_paths)} photos with AI vision...")
-            inventory = await asyncio.to_thread(extract_removal_inventory, saved_paths, learned_guidance=learned_guidance)
+@app.get("/s/{company_slug}/{token}/room/{room_id}/analysis/{analysis_id}")
+def room_analysis_status(
+    request: Request,
+    company_slug: str,
+    token: str,
+    room_id: str,
+    analysis_id: str,
+    db: Session = Depends(get_db)
+):
+    """Poll a queued photo analysis; includes the room's items once it has finished"""
+    company = request.state.company
+    job = get_or_create_job(company.id, token, db)
 
-            # 🧠 SELF-LEARNING: Apply learned corrections to AI detections (backup)
-            if inventory.get("items"):
-                try:
-                    inventory["items"], corrections = ml_learning.apply_learned_corrections(inventory["items"], db)
-                    if corrections:
-                        logger.info(f"Auto-applied {len(corrections)} learned corrections")
-                except Exception as e:
-                    logger.warning(f"Could not apply learned corrections: {e}")
-
-            # Store structured items
-            if inventory.get("items"):
-                created_items = []
-                for item_data in inventory["items"]:
-                    weight_kg = item_data.get("weight_kg")
-                    item = Item(
-                        room_id=room.id,
-                        name=item_data.get("name", "Unknown item"),
-                        qty=item_data.get("qty", 1),
-                        notes=item_data.get("notes", ""),
-                        length_cm=item_data.get("length_cm"),
-                        width_cm=item_data.get("width_cm"),
-                        height_cm=item_data.get("height_cm"),
-                        weight_kg=weight_kg,
-                        cbm=item_data.get("cbm"),
-                        bulky=(float(weight_kg) > 50) if weight_kg else False,
-                        fragile=item_data.get("fragile", False),
-                        item_category=item_data.get("item_category", "furniture"),
-                        packing_requirement=item_data.get("packing_requirement", "none")
-                    )
-                    db.add(item)
-                    items_list.append(item_data)
-                    created_items.append((item, item_data))
-
-                # Update room summary
-                if inventory.get("summary"):
-                    room.summary = inventory.get("summary", "")
-
-                db.commit()
-                logger.info(f"AI detected {len(inventory['items'])} items")
-
-                # 🎓 AUTO-LEARN: Save OpenAI detections as training data
-                for item, item_data in created_items:
-                    try:
-                        if item.length_cm and item.width_cm and item.height_cm:
-                            training_entry = TrainingDataset(
-                                id=uuid.uuid4(),
-                                image_url=saved_paths[0] if saved_paths else None,
-                                item_name=item.name,
-                                item_category=item.item_category or "furniture",
-                                length_cm=item.length_cm,
-                                width_cm=item.width_cm,
-                                height_cm=item.height_cm,
-                                cbm=item.cbm,
-                                weight_kg=item.weight_kg,
-                                is_bulky=item.bulky,
-                                is_fragile=item.fragile,
-                                packing_requirement=item.packing_requirement,
-                                source_type='openai_live',
-                                source_id=item.id,
-                                confidence_score=0.85,
-                                verified=False,
-                                used_in_training=False
-                            )
-                            db.add(training_entry)
-                    except Exception as e:
-                        logger.warning(f"Could not save training data: {e}")
-                db.commit()
+    try:
+        analysis_uuid = uuid.UUID(analysis_id)
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "Analysis not found"}, status_code=404)
 
-        except Exception as e:
-            logger.error(f"AI vision error: {e}")
+    analysis = db.query(PhotoAnalysis).filter(
+        PhotoAnalysis.id == analysis_uuid,
+        PhotoAnalysis.job_id == job.id
+    ).first()
+    if not analysis or str(analysis.room_id) != room_id:
+        return JSONResponse({"ok": False, "error": "Analysis not found"}, status_code=404)
 
-    # Return JSON response
-    return JSONResponse({
-        "ok": True,
-        "photos": photo_records,
-        "items_json": {
-            "items": items_list,
-            "summary": room.summary or ""
-        }
-    })
+    response = {"ok": True, **analysis_queue.analysis_status(analysis)}
+    if analysis.status in ("done", "failed"):
+        room = db.query(Room).filter(Room.id == analysis.room_id).first()
+        response["items_json"] = room_items_json(room, db)
+    return JSONResponse(response)
 
 
 @app.delete("/s/{company_slug}/{token}/room/{room_id}/delete-item/{item_index}")
@@ -2140,6 +2090,7 @@ def delete_room_item(
     # Delete the item at this index
     item_to_delete = items[item_index]
     db.delete(item_to_delete)
+    mark_inventory_changed(job)
     db.commit()
 
     logger.info(f"Deleted item '{item_to_delete.name}' from room {room.name} (job {token})")
@@ -2175,6 +2126,7 @@ def increment_room_item(
     # Increment the item quantity
     item = items[item_index]
     item.qty = (item.qty or 1) + 1
+    mark_inventory_changed(job)
     db.commit()
 
     logger.info(f"Incremented item '{item.name}' to qty {item.qty} in room {room.name} (job {token})")
@@ -2235,6 +2187,7 @@ def update_item_variant(
     item.weight_kg = variant_data["weight_kg"]
     item.cbm = variant_data["cbm"]
     item.bulky = variant_data["weight_kg"] > 50
+    mark_inventory_changed(job)
     db.commit()
 
     # Save correction as ItemFeedback for ML training
@@ -2308,13 +2261,11 @@ async def photos_bulk_upload(
     company_slug: str,
     token: str,
     photos: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Handle bulk photo upload with AI room detection"""
-    import asyncio
-
     company = request.state.company
-    job = get_or_create_job(company.id, token, db)
+    job = await db.run_sync(lambda session: get_or_create_job(company.id, token, session))
 
     if not photos or len(photos) == 0:
         return JSONResponse({"ok": False, "error": "No photos uploaded"}, status_code=400)
@@ -2325,32 +2276,18 @@ async def photos_bulk_upload(
     if len(photos) < 3:
         return JSONResponse({"ok": False, "error": "Please upload at least 3 photos"}, status_code=400)
 
-    # Create uploads directory
-    upload_dir = os.path.join("uploads", str(company.id), token)
-    os.makedirs(upload_dir, exist_ok=True)
-
     try:
-        # Save all photos first
-        saved_paths = []
-        photo_records = []
-
-        for photo_file in photos:
-            # Generate unique filename
-            ext = os.path.splitext(photo_file.filename)[1] or ".jpg"
-            unique_filename = f"{uuid.uuid4()}{ext}"
-            file_path = os.path.join(upload_dir, unique_filename)
+        # Save all photos first (deduplicated by content)
+        stored = await save_uploaded_photos(photos, company.id)
+        saved_paths = [str(photo.path) for photo in stored]
 
-            # Save file
-            async with aiofiles.open(file_path, 'wb') as f:
-                content = await photo_file.read()
-                await f.write(content)
-
-            saved_paths.append(file_path)
+        if not saved_paths:
+            return JSONResponse({"ok": False, "error": "Photos must be under 10MB each"}, status_code=400)
 
         # 🧠 SELF-LEARNING: Get learned patterns to enhance AI prompt
         learned_guidance = None
         try:
-            learned_guidance = ml_learning.get_learned_patterns_for_prompt(db)
+            learned_guidance = await db.run_sync(ml_learning.get_learned_patterns_for_prompt)
             if learned_guidance:
                 logger.info("Injecting learned patterns into AI prompt")
         except Exception as e:
@@ -2358,12 +2295,15 @@ async def photos_bulk_upload(
 
         # Use AI to analyze all photos together
         logger.info(f"Analyzing {len(saved_paths)} photos with AI for bulk upload...")
-        inventory = await asyncio.to_thread(extract_removal_inventory, saved_paths, learned_guidance=learned_guidance)
+        # Photos span every room, so the same item in different batches is counted in each
+        inventory = await analyze_photos(stored, learned_guidance, db, add_quantities=True)
 
         # 🧠 SELF-LEARNING: Apply learned corrections to AI detections (backup)
         if inventory.get("items"):
             try:
-                inventory["items"], corrections = ml_learning.apply_learned_corrections(inventory["items"], db)
+                inventory["items"], corrections = await db.run_sync(
+                    lambda session: ml_learning.apply_learned_corrections(inventory["items"], session)
+                )
                 if corrections:
                     logger.info(f"Auto-applied {len(corrections)} learned corrections")
             except Exception as e:
@@ -2371,52 +2311,26 @@ async def photos_bulk_upload(
 
         # Get room suggestion from AI (we'll use the summary to guess the room type)
         # For bulk upload, create ONE room called "Whole Property" and put everything in it
-        room = Room(
-            job_id=job.id,
-            name="Whole Property",
-            summary=inventory.get("summary", "AI-detected items from all photos")
-        )
-        db.add(room)
-        db.flush()  # Get room ID
-
-        # Save photos to database
-        for i, file_path in enumerate(saved_paths):
-            photo = Photo(
-                room_id=room.id,
-                filename=os.path.basename(file_path),
-                original_filename=photos[i].filename,
-                file_size_bytes=len(content),  # Approximate
-                mime_type=photos[i].content_type,
-                storage_path=file_path
+        def save_room(session: Session) -> Room:
+            room = Room(
+                job_id=job.id,
+                name="Whole Property",
+                summary=inventory.get("summary", "AI-detected items from all photos")
             )
-            db.add(photo)
-            photo_records.append({
-                "url": f"/uploads/{company.id}/{token}/{photo.filename}",
-                "filename": photo.filename
-            })
-
-        # Store detected items
-        if inventory.get("items"):
-            for item_data in inventory["items"]:
-                weight_kg = item_data.get("weight_kg")
-                item = Item(
-                    room_id=room.id,
-                    name=item_data.get("name", "Unknown item"),
-                    qty=item_data.get("qty", 1),
-                    notes=item_data.get("notes", ""),
-                    length_cm=item_data.get("length_cm"),
-                    width_cm=item_data.get("width_cm"),
-                    height_cm=item_data.get("height_cm"),
-                    weight_kg=weight_kg,
-                    cbm=item_data.get("cbm"),
-                    bulky=(float(weight_kg) > 50) if weight_kg else False,
-                    fragile=item_data.get("fragile", False),
-                    item_category=item_data.get("item_category", "furniture"),
-                    packing_requirement=item_data.get("packing_requirement", "none")
-                )
-                db.add(item)
-
-        db.commit()
+            session.add(room)
+            session.flush()  # Get room ID
+
+            # Save photos and detected items (one set-based INSERT)
+            add_room_photos(room, stored, session)
+            analysis_queue.insert_detected_items(room, job, inventory, session)
+            session.commit()
+            return room
+
+        room = await db.run_sync(save_room)
+        photo_records = [
+            {"url": f"/photo/{company.id}/{token}/{photo.filename}", "filename": photo.filename}
+            for photo in stored
+        ]
 
         logger.info(f"Bulk upload: Created 1 room with {len(inventory.get('items', []))} items")
 
@@ -2428,7 +2342,8 @@ async def photos_bulk_upload(
                 "summary": room.summary,
                 "item_count": len(inventory.get("items", []))
             }],
-            "total_items": len(inventory.get("items", []))
+            "total_items": len(inventory.get("items", [])),
+            "incomplete": bool(inventory.get("incomplete_batches"))  # Some photos couldn't be analysed
         })
 
     except Exception as e:
@@ -2481,7 +2396,7 @@ def survey_complete_get(request: Request, company_slug: str, token: str, db: Ses
     company = request.state.company
     job = get_or_create_job(company.id, token, db)
 
-    rooms = db.query(Room).filter(Room.job_id == job.id).all()
+    inventory = load_job_inventory(job.id, db)
 
     total_items = 0
     total_cbm = 0.0
@@ -2490,16 +2405,13 @@ def survey_complete_get(request: Request, company_slug: str, token: str, db: Ses
     fragile_count = 0
     room_stats = []
 
-    for room in rooms:
-        items = db.query(Item).filter(Item.room_id == room.id).all()
-        room_item_count = sum(i.qty for i in items)
+    for room in inventory.rooms:
+        room_item_count = sum(i.qty for i in room.items)
         total_items += room_item_count
-        for item in items:
+        for item in room.items:
             qty = item.qty
-            if item.cbm:
-                total_cbm += float(item.cbm) * qty
-            if item.weight_kg:
-                total_weight += float(item.weight_kg) * qty
+            total_cbm += item.cbm * qty
+            total_weight += item.weight_kg * qty
             if item.bulky:
                 bulky_count += qty
             if item.fragile:
@@ -2543,13 +2455,15 @@ def packing_services_get(request: Request, company_slug: str, token: str, db: Se
     if not pricing:
         return RedirectResponse(url=f"/s/{company_slug}/{token}/quote-preview", status_code=303)
 
+    inventory = load_job_inventory(job.id, db)
+
     # Temporarily force customer_provides_packing=False so costs are calculated
     original_flag = job.customer_provides_packing
     job.customer_provides_packing = False
-    packing_materials = calculate_packing_materials(job, pricing, db)
+    packing_materials = calculate_packing_materials(job, pricing, db, inventory)
     job.customer_provides_packing = original_flag
 
-    packing_service = calculate_packing_service(job, pricing, db)
+    packing_service = calculate_packing_service(job, pricing, db, inventory)
 
     has_packing_items = packing_materials["total_boxes"] > 0
     has_loose_rooms = len(packing_service["rooms"]) > 0
@@ -2595,388 +2509,72 @@ def packing_services_post(
     return RedirectResponse(url=f"/s/{company_slug}/{token}/quote-preview", status_code=303)
 
 
-def calculate_packing_materials(job: Job, pricing: PricingConfig, db: Session) -> dict:
+def calculate_packing_materials(job: Job, pricing: PricingConfig, db: Session, inventory: Optional[JobInventory] = None) -> dict:
     """Calculate packing materials needed based on items"""
-    import re
-
-    # Get all items for this job
-    rooms = db.query(Room).filter(Room.job_id == job.id).all()
-
-    # Count packing requirements
-    small_boxes = 0      # Pack 1
-    medium_boxes = 0     # Pack 2
-    large_boxes = 0      # Pack 3
-    extra_small = 0      # Pack 6
-    robe_cartons = 0     # Wardrobe boxes
-    mattress_covers = 0  # Mattress covers
-
-    for room in rooms:
-        items = db.query(Item).filter(Item.room_id == room.id).all()
-        for item in items:
-            qty = item.qty or 1
-            packing_req = item.packing_requirement or "none"
-
-            if packing_req == 'small_box':
-                # Books, heavy items: ~20 books per box
-                small_boxes += max(1, qty // 20)
-            elif packing_req == 'medium_box':
-                # Kitchen items, clothes: ~15 items per box
-                medium_boxes += max(1, qty // 15)
-            elif packing_req == 'large_box':
-                # Linens, bedding: ~10 items per box
-                large_boxes += max(1, qty // 10)
-            elif packing_req in ('robe_carton', 'wardrobe_box'):
-                # Wardrobe boxes for hanging clothes
-                # qty represents number of wardrobe boxes needed
-                robe_cartons += qty
-            elif packing_req == 'mattress_cover':
-                mattress_covers += qty
-
-    total_boxes = small_boxes + medium_boxes + large_boxes + extra_small + robe_cartons
-
-    # Calculate costs
-    pack1_cost = small_boxes * float(pricing.pack1_price)
-    pack2_cost = medium_boxes * float(pricing.pack2_price)
-    pack3_cost = large_boxes * float(pricing.pack3_price)
-    pack6_cost = extra_small * float(pricing.pack6_price)
-    robe_cost = robe_cartons * float(pricing.robe_carton_price)
-    mattress_cost = mattress_covers * float(pricing.mattress_cover_price)
-
-    # Tape: 1 roll per 10 boxes
-    tape_rolls = max(1, (total_boxes // 10) + (1 if total_boxes % 10 > 0 else 0)) if total_boxes > 0 else 0
-    tape_cost = tape_rolls * float(pricing.tape_price)
-
-    # Paper: 1.5 packs per 10 CBM
-    total_cbm = float(job.total_cbm or 0)
-    paper_packs = (total_cbm / 10) * 1.5 if total_cbm > 0 else 0
-    paper_cost = paper_packs * float(pricing.paper_price)
-
-    # If customer is providing their own packing, cost is £0 but still show quantities
-    if job.customer_provides_packing:
-        total_packing_cost = 0
-        pack1_cost = pack2_cost = pack3_cost = pack6_cost = 0
-        robe_cost = mattress_cost = tape_cost = paper_cost = 0
-    else:
-        total_packing_cost = (pack1_cost + pack2_cost + pack3_cost + pack6_cost +
-                              robe_cost + mattress_cost + tape_cost + paper_cost)
-
-    return {
-        "total_cost": round(total_packing_cost, 2),
-        "breakdown": {
-            "small_boxes": {"qty": small_boxes, "cost": round(pack1_cost, 2)},
-            "medium_boxes": {"qty": medium_boxes, "cost": round(pack2_cost, 2)},
-            "large_boxes": {"qty": large_boxes, "cost": round(pack3_cost, 2)},
-            "extra_small_boxes": {"qty": extra_small, "cost": round(pack6_cost, 2)},
-            "robe_cartons": {"qty": robe_cartons, "cost": round(robe_cost, 2)},
-            "mattress_covers": {"qty": mattress_covers, "cost": round(mattress_cost, 2)},
-            "tape_rolls": {"qty": tape_rolls, "cost": round(tape_cost, 2)},
-            "paper_packs": {"qty": round(paper_packs, 1), "cost": round(paper_cost, 2)}
-        },
-        "total_boxes": total_boxes
-    }
+    if inventory is None:
+        inventory = load_job_inventory(job.id, db)
+    columns = quote_engine.InventoryColumns.from_inventory(inventory)
+    snapshot = quote_engine.PricingSnapshot.from_config(pricing)
+    total_cbm = quote_engine.inventory_totals(columns, snapshot)["total_cbm"]
+    return quote_engine.packing_materials(columns, snapshot, total_cbm, bool(job.customer_provides_packing))
+
+
+def calculate_packing_service(job: Job, pricing: PricingConfig, db: Session, inventory: Optional[JobInventory] = None) -> dict:
+    """Calculate packing service estimates per room (see quote_engine.packing_service)"""
+    if inventory is None:
+        inventory = load_job_inventory(job.id, db)
+    columns = quote_engine.InventoryColumns.from_inventory(inventory)
+    snapshot = quote_engine.PricingSnapshot.from_config(pricing)
+    return quote_engine.packing_service(columns, snapshot, tuple(job.packing_service_rooms or ()))
+
+
+def quote_cache_key(job: Job, pricing: PricingConfig) -> str:
+    """Cache key for a job's quote: inventory revision, pricing revision and price-affecting job fields"""
+    payload = json.dumps([
+        quote_engine.ENGINE_VERSION,
+        job.inventory_revision or 0,
+        str(pricing.id),
+        pricing.revision or 0,
+        dataclasses.asdict(quote_engine.QuoteInputs.from_job(job)),
+    ], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
 
-def calculate_packing_service(job: Job, pricing: PricingConfig, db: Session) -> dict:
-    """
-    Calculate packing service estimates per room
-    Returns: {
-        "rooms": [{"room_id": "...", "room_name": "Kitchen", "hours": 2.5, "cost": 100.00, "items_count": 45}],
-        "total_hours": 5.0,
-        "total_cost": 200.00
-    }
+def calculate_quote(job: Job, db: Session) -> dict:
     """
-    rooms = db.query(Room).filter(Room.job_id == job.id).all()
-    room_estimates = []
-    total_hours = 0
+    Calculate professional quote using company's custom pricing
 
-    for room in rooms:
-        items = db.query(Item).filter(Item.room_id == room.id).all()
-
-        # Count items that need packing (loose items)
-        items_needing_packing = 0
-        for item in items:
-            packing_req = item.packing_requirement or "none"
-            if packing_req in ['small_box', 'medium_box', 'large_box']:
-                items_needing_packing += (item.qty or 1)
-
-        # Skip rooms with no loose items
-        if items_needing_packing == 0:
-            continue
-
-        # Estimate packing time based on item count and room type
-        # Base: 5 items per 15 minutes = 20 items/hour
-        # Kitchens are slower (fragile, wrapping): 15 items/hour
-        # Bedrooms/living rooms: 20 items/hour
-
-        if 'kitchen' in room.name.lower():
-            packing_rate = 15  # items per hour
-        else:
-            packing_rate = 20  # items per hour
-
-        estimated_hours = max(0.5, items_needing_packing / packing_rate)  # Minimum 30min per room
-        estimated_cost = estimated_hours * float(pricing.packing_labor_per_hour)
-
-        # Check if customer wants this room packed
-        is_selected = False
-        if job.packing_service_rooms:
-            is_selected = str(room.id) in job.packing_service_rooms
-
-        room_estimates.append({
-            "room_id": str(room.id),
-            "room_name": room.name,
-            "hours": round(estimated_hours, 1),
-            "cost": round(estimated_cost, 2),
-            "items_count": items_needing_packing,
-            "is_selected": is_selected
-        })
-
-        if is_selected:
-            total_hours += estimated_hours
-
-    total_cost = total_hours * float(pricing.packing_labor_per_hour)
-
-    return {
-        "rooms": room_estimates,
-        "total_hours": round(total_hours, 1),
-        "total_cost": round(total_cost, 2)
-    }
-
-
-def calculate_quote(job: Job, db: Session) -> dict:
-    """Calculate professional quote using company's custom pricing"""
+    The result is cached on the job row (quote_cache) and reused until the
+    inventory, pricing or price-affecting job fields change, so repeated views
+    cost one pricing lookup.
+    """
     # Get company pricing config
     pricing = db.query(PricingConfig).filter(PricingConfig.company_id == job.company_id).first()
     if not pricing:
         raise ValueError(f"No pricing config for company {job.company_id}")
 
-    # Get all items across all rooms for this job
-    total_items = 0
-    bulky_items = 0
-    fragile_items = 0
-    total_cbm = 0
-    total_weight_kg = 0
+    cache_key = quote_cache_key(job, pricing)
+    if job.quote_cache and job.quote_cache_key == cache_key:
+        return job.quote_cache
 
-    rooms = db.query(Room).filter(Room.job_id == job.id).all()
-    for room in rooms:
-        items = db.query(Item).filter(Item.room_id == room.id).all()
-        for item in items:
-            qty = item.qty
-            total_items += qty
-
-            # CBM calculations
-            if item.cbm:
-                total_cbm += float(item.cbm) * qty
-
-            # Weight calculations
-            if item.weight_kg:
-                total_weight_kg += float(item.weight_kg) * qty
-
-            if item.weight_kg and float(item.weight_kg) > float(pricing.bulky_weight_threshold_kg or 50):
-                bulky_items += qty
-            if item.fragile:
-                fragile_items += qty
-
-    # Professional pricing using company's custom rates
-    base_price = float(pricing.callout_fee)
-    cbm_price = total_cbm * float(pricing.price_per_cbm)
-    bulky_surcharge = bulky_items * float(pricing.bulky_item_fee)
-    fragile_surcharge = fragile_items * float(pricing.fragile_item_fee)
-
-    # Weight-based pricing
-    weight_price = 0
-    if total_weight_kg > pricing.weight_threshold_kg:
-        weight_price = (total_weight_kg - pricing.weight_threshold_kg) * float(pricing.price_per_kg_over_threshold)
-
-    # Distance pricing - calculated from pickup/dropoff coordinates
-    distance_price = 0
-    distance_miles = 0
-    if job.pickup and job.dropoff:
-        pickup_lat = job.pickup.get('lat')
-        pickup_lng = job.pickup.get('lng')
-        dropoff_lat = job.dropoff.get('lat')
-        dropoff_lng = job.dropoff.get('lng')
-
-        if all([pickup_lat, pickup_lng, dropoff_lat, dropoff_lng]):
-            # Haversine formula for distance in miles
-            import math
-            R = 3959.0  # Earth's radius in miles
-            lat1_rad = math.radians(float(pickup_lat))
-            lat2_rad = math.radians(float(dropoff_lat))
-            dlat = math.radians(float(dropoff_lat) - float(pickup_lat))
-            dlng = math.radians(float(dropoff_lng) - float(pickup_lng))
-            a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng / 2)**2
-            c = 2 * math.asin(math.sqrt(a))
-            distance_miles = R * c
-
-            # Calculate price: miles over base distance × price per mile
-            base_distance = float(pricing.base_distance_km or 0) * 0.621371  # Convert km to miles
-            price_per_mile = float(pricing.price_per_km or 2.00) * 1.60934  # Convert per-km to per-mile
-            if distance_miles > base_distance:
-                distance_price = (distance_miles - base_distance) * price_per_mile
-            else:
-                distance_price = 0
-
-    # === ACCESS DIFFICULTY PRICING ===
-    access_price = 0
-    access_breakdown = {"pickup": {}, "dropoff": {}}
-
-    # Helper function to calculate access fees for one location
-    def calculate_location_access(access_data):
-        if not access_data:
-            return 0, {}
-
-        location_fees = {}
-        location_total = 0
-
-        # Floors pricing
-        floors = access_data.get('floors', 0)
-        if floors > 0:
-            floor_fee = floors * float(pricing.price_per_floor)
-            location_fees['floors'] = floor_fee
-            location_total += floor_fee
-
-        # No lift surcharge (only if floors > 0 AND no lift)
-        if floors > 0 and not access_data.get('has_lift', False):
-            no_lift_fee = float(pricing.no_lift_surcharge)
-            location_fees['no_lift'] = no_lift_fee
-            location_total += no_lift_fee
-
-        # Parking difficulty
-        parking_type = access_data.get('parking_type', 'driveway')
-        if parking_type == 'street':
-            parking_fee = float(pricing.parking_street_fee)
-            location_fees['parking'] = parking_fee
-            location_total += parking_fee
-        elif parking_type == 'permit_zone':
-            parking_fee = float(pricing.parking_permit_fee)
-            location_fees['parking'] = parking_fee
-            location_total += parking_fee
-        elif parking_type == 'limited':
-            parking_fee = float(pricing.parking_limited_fee)
-            location_fees['parking'] = parking_fee
-            location_total += parking_fee
-
-        # Parking distance (if not driveway)
-        if parking_type != 'driveway':
-            distance_meters = access_data.get('parking_distance_meters', 0)
-            if distance_meters > 0:
-                distance_increments = (distance_meters // 50) + (1 if distance_meters % 50 > 0 else 0)
-                distance_fee = distance_increments * float(pricing.parking_distance_per_50m)
-                location_fees['parking_distance'] = distance_fee
-                location_total += distance_fee
-
-        # Building restrictions
-        restrictions = access_data.get('building_restrictions', [])
-        if 'narrow_stairs' in restrictions or 'narrow_doorways' in restrictions or 'narrow_hallway' in restrictions:
-            narrow_fee = float(pricing.narrow_access_fee)
-            location_fees['narrow_access'] = narrow_fee
-            location_total += narrow_fee
-
-        if 'time_restrictions' in restrictions:
-            time_fee = float(pricing.time_restriction_fee)
-            location_fees['time_restrictions'] = time_fee
-            location_total += time_fee
-
-        if 'booking_required' in restrictions:
-            booking_fee = float(pricing.booking_required_fee)
-            location_fees['booking_required'] = booking_fee
-            location_total += booking_fee
-
-        # Outdoor access
-        outdoor_access = access_data.get('outdoor_access', 'direct')
-        if outdoor_access == 'path':
-            path_fee = float(pricing.outdoor_path_fee)
-            location_fees['outdoor_path'] = path_fee
-            location_total += path_fee
-        elif outdoor_access == 'steps':
-            path_fee = float(pricing.outdoor_path_fee)
-            location_fees['outdoor_path'] = path_fee
-            location_total += path_fee
-
-            # Outdoor steps pricing (per 5 steps)
-            outdoor_steps = access_data.get('outdoor_steps', 0)
-            if outdoor_steps > 0:
-                step_increments = (outdoor_steps // 5) + (1 if outdoor_steps % 5 > 0 else 0)
-                steps_fee = step_increments * float(pricing.outdoor_steps_per_5)
-                location_fees['outdoor_steps'] = steps_fee
-                location_total += steps_fee
-
-        return location_total, location_fees
-
-    # Calculate pickup access fees
-    pickup_access_total, pickup_access_fees = calculate_location_access(job.pickup_access)
-    access_breakdown['pickup'] = pickup_access_fees
-    access_price += pickup_access_total
-
-    # Calculate dropoff access fees
-    dropoff_access_total, dropoff_access_fees = calculate_location_access(job.dropoff_access)
-    access_breakdown['dropoff'] = dropoff_access_fees
-    access_price += dropoff_access_total
-
-    # === PACKING MATERIALS PRICING ===
-    packing_data = calculate_packing_materials(job, pricing, db)
-    packing_price = packing_data['total_cost']
-    packing_breakdown = packing_data['breakdown']
-
-    # === PACKING SERVICE LABOR PRICING ===
-    packing_service_data = calculate_packing_service(job, pricing, db)
-    packing_service_price = packing_service_data['total_cost']
-    packing_service_breakdown = packing_service_data
-
-    total = base_price + cbm_price + bulky_surcharge + fragile_surcharge + weight_price + distance_price + access_price + packing_price + packing_service_price
-
-    # Apply company's estimate multipliers
-    estimate_low = int(total * float(pricing.estimate_low_multiplier))
-    estimate_high = int(total * float(pricing.estimate_high_multiplier))
-
-    # Determine confidence based on completeness
-    if total_items < 5 or total_cbm < 1:
-        confidence = "Low - Need more photos"
-    elif total_items < 20 or total_cbm < 5:
-        confidence = "Medium"
-    else:
-        confidence = "High"
+    columns = quote_engine.InventoryColumns.from_inventory(load_job_inventory(job.id, db))
+    quote = quote_engine.quote(
+        columns,
+        quote_engine.PricingSnapshot.from_config(pricing),
+        quote_engine.QuoteInputs.from_job(job),
+    )
 
-    # Update job with totals
-    job.total_cbm = round(total_cbm, 2)
-    job.total_weight_kg = round(total_weight_kg, 0)
+    # Update job with totals and cache the result for other views / workers
+    job.total_cbm = quote["total_cbm"]
+    job.total_weight_kg = quote["total_weight_kg"]
+    job.quote_cache = quote
+    job.quote_cache_key = cache_key
     db.commit()
 
-    # Use custom prices if admin set them
-    final_low = job.custom_price_low or estimate_low
-    final_high = job.custom_price_high or estimate_high
-
     # NOTE: Auto-approval removed - all quotes require manual admin approval
     # This ensures the admin always reviews before the customer can accept
 
-    return {
-        "estimate_low": final_low,
-        "estimate_high": final_high,
-        "ai_estimate_low": estimate_low,
-        "ai_estimate_high": estimate_high,
-        "has_custom_price": bool(job.custom_price_low),
-        "total_items": total_items,
-        "bulky_items": bulky_items,
-        "fragile_items": fragile_items,
-        "total_cbm": round(total_cbm, 2),
-        "total_weight_kg": round(total_weight_kg, 0),
-        "confidence": confidence,
-        "distance_miles": round(distance_miles, 1),
-        "breakdown": {
-            "base": base_price,
-            "volume": round(cbm_price, 2),
-            "bulky": bulky_surcharge,
-            "fragile": fragile_surcharge,
-            "weight": round(weight_price, 2),
-            "distance": distance_price,
-            "access": round(access_price, 2),
-            "packing": round(packing_price, 2),
-            "packing_service": round(packing_service_price, 2)
-        },
-        "access_breakdown": access_breakdown,
-        "packing_breakdown": packing_breakdown,
-        "packing_service_breakdown": packing_service_breakdown
-    }
+    return quote
 
 
 @app.get("/s/{company_slug}/{token}/quote-preview", response_class=HTMLResponse)
@@ -3087,12 +2685,13 @@ def do_submit_quote(
     if job.status == "in_progress":
         job.status = "awaiting_approval"
         job.submitted_at = datetime.utcnow()
+        dashboard_events.awaiting_changed(db, company.id, +1, token)
         db.commit()
         logger.info(f"Quote {token} submitted for approval by {job.customer_name}. CBM: {job.total_cbm}, Weight: {job.total_weight_kg}kg")
 
-        # Use survey credit (prepaid credits system)
+        # Use survey credit (prepaid credits system) on a fresh row in this session, not the cached company
         try:
-            credit_result = billing.use_survey_credit(company, token, db)
+            credit_result = billing.use_survey_credit(db.get(Company, company.id), token, db)
             if credit_result.get("success"):
                 if credit_result.get("reason") == "partner_account":
                     logger.info(f"Partner survey (unlimited) by {company.slug}")
@@ -3730,6 +3329,97 @@ def admin_dashboard(
     })
 
 
+# Dashboard counter name → job status
+DASHBOARD_COUNTER_STATUSES = {
+    "awaiting": "awaiting_approval",
+    "approved": "approved",
+    "rejected": "rejected",
+    "deposit": "deposit_paid",
+}
+
+
+def dashboard_counters(company_id, db: Session) -> dict:
+    """Job counts per dashboard column in one grouped query (index-only on idx_jobs_company_status)"""
+    counts = dict(db.query(Job.status, func.count()).filter(
+        Job.company_id == company_id,
+        Job.status.in_(DASHBOARD_COUNTER_STATUSES.values())
+    ).group_by(Job.status).all())
+    return {name: counts.get(job_status, 0) for name, job_status in DASHBOARD_COUNTER_STATUSES.items()}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers this ETag"""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
+
+
+@app.get("/{company_slug}/admin/dashboard/counters")
+def admin_dashboard_counters(
+    request: Request,
+    company_slug: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Dashboard job counts as JSON, for clients that poll instead of holding the event stream
+
+    Answers 304 when If-None-Match carries the current ETag. Records no activity.
+    """
+    company = verify_company_access(company_slug, current_user)
+    counters = dashboard_counters(company.id, db)
+
+    body = json.dumps(counters, sort_keys=True)
+    etag = f'"{hashlib.sha1(body.encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/{company_slug}/admin/dashboard/events")
+async def admin_dashboard_events(
+    request: Request,
+    company_slug: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent events for the live dashboard
+
+    Sends the current awaiting-approval count on connect ("awaiting" event),
+    then a message per change: {"awaiting_delta": 1 | -1, "token": ...}.
+    The database session is released before streaming starts.
+    """
+    company = verify_company_access(company_slug, current_user)
+
+    # Subscribe before counting so no change falls between the two
+    queue = dashboard_events.broadcaster.subscribe(company.id)
+    counters = await asyncio.to_thread(dashboard_counters, company.id, db)
+
+    async def stream():
+        try:
+            yield dashboard_events.format_sse({"awaiting": counters["awaiting"]}, "awaiting")
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=dashboard_events.KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield dashboard_events.format_sse({
+                    "awaiting_delta": message["awaiting_delta"],
+                    "token": message.get("token"),
+                })
+        finally:
+            dashboard_events.broadcaster.unsubscribe(company.id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Don't let proxies buffer the stream
+    })
+
+
 @app.post("/{company_slug}/admin/dismiss-onboarding")
 def dismiss_onboarding(
     company_slug: str,
@@ -3740,6 +3430,7 @@ def dismiss_onboarding(
     company = verify_company_access(company_slug, current_user)
     company.onboarding_completed = True
     db.commit()
+    company_cache.invalidate(company.slug)
     return {"status": "ok"}
 
 
@@ -3840,7 +3531,10 @@ def admin_job_review(
     """Detailed job review for admin"""
     company = verify_company_access(company_slug, current_user)
 
-    job = db.query(Job).filter(
+    job = db.query(Job).options(
+        selectinload(Job.rooms).selectinload(Room.photos),
+        selectinload(Job.rooms).selectinload(Room.items),
+    ).filter(
         Job.token == token,
         Job.company_id == company.id
     ).first()
@@ -3899,6 +3593,8 @@ def admin_approve_job(
             return RedirectResponse(url=f"/{company_slug}/admin/dashboard?error=not_submitted", status_code=303)
 
         # Set the final quote price (single fixed price, not a range)
+        if job.status == "awaiting_approval":
+            dashboard_events.awaiting_changed(db, company.id, -1, token)
         job.final_quote_price = final_price
         job.status = "approved"
         job.approved_at = datetime.utcnow()
@@ -4034,6 +3730,8 @@ def admin_reject_job(
         if job.status == "in_progress":
             return RedirectResponse(url=f"/{company_slug}/admin/dashboard?error=not_submitted", status_code=303)
 
+        if job.status == "awaiting_approval":
+            dashboard_events.awaiting_changed(db, company.id, -1, token)
         job.status = "rejected"
         job.rejected_at = datetime.utcnow()
         job.rejection_reason = reason
@@ -4143,6 +3841,8 @@ def admin_quick_approve(
         quote = calculate_quote(job, db)
         final_price = (quote["estimate_low"] + quote["estimate_high"]) // 2
 
+        if job.status == "awaiting_approval":
+            dashboard_events.awaiting_changed(db, company.id, -1, token)
         job.final_quote_price = final_price
         job.status = "approved"
         job.approved_at = datetime.utcnow()
@@ -4212,23 +3912,23 @@ def admin_quick_approve(
 async def submit_item_feedback(
     request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit AI training feedback for an item"""
     try:
         data = await request.json()
 
         # Get the item
-        item = db.query(Item).filter(Item.id == data.get('item_id')).first()
+        item = await db.scalar(select(Item).where(Item.id == data.get('item_id')))
         if not item:
             return JSONResponse({"error": "Item not found"}, status_code=404)
 
         # Get the item's job to find the company
-        room = db.query(Room).filter(Room.id == item.room_id).first()
+        room = await db.scalar(select(Room).where(Room.id == item.room_id))
         if not room:
             return JSONResponse({"error": "Room not found"}, status_code=404)
 
-        job = db.query(Job).filter(Job.id == room.job_id).first()
+        job = await db.scalar(select(Job).where(Job.id == room.job_id))
         if not job:
             return JSONResponse({"error": "Job not found"}, status_code=404)
 
@@ -4260,7 +3960,7 @@ async def submit_item_feedback(
                 feedback.corrected_cbm = (length * width * height) / 1_000_000
 
         db.add(feedback)
-        db.commit()
+        await db.commit()
 
         logger.info(f"AI feedback submitted for item {item.id} by {current_user.email}: {data.get('feedback_type')}")
 
@@ -4268,14 +3968,14 @@ async def submit_item_feedback(
 
     except Exception as e:
         logger.error(f"Error submitting item feedback: {e}")
-        db.rollback()
+        await db.rollback()
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
 @app.get("/admin/export-training-data")
 def export_training_data(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Export all training data (catalog + feedback) for ML model training"""
     try:
@@ -4320,7 +4020,7 @@ def export_training_data(
 
             # Get photo URLs
             photos = db.query(Photo).filter(Photo.room_id == room.id).all()
-            image_urls = [photo.url for photo in photos]
+            image_urls = [photo.url_for(room.job.token) for photo in photos]
 
             if feedback.feedback_type == 'correction':
                 # Use corrected data
@@ -4473,7 +4173,7 @@ def manage_subscription(
 
 
 @app.post("/webhooks/stripe")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Handle Stripe webhook events"""
     payload = await request.body()
     signature = request.headers.get("stripe-signature")
@@ -4487,7 +4187,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
         event = billing.verify_webhook_signature(payload, signature)
 
         # Process the event
-        success = billing.process_webhook_event(event, db)
+        success = await db.run_sync(lambda session: billing.process_webhook_event(event, session))
 
         if success:
             return JSONResponse({"status": "success"})
@@ -4706,18 +4406,19 @@ async def upload_logo(
             status_code=303
         )
 
-    # Validate file size (max 2MB)
-    contents = await logo.read()
-    if len(contents) > 2 * 1024 * 1024:  # 2MB
+    # Create logos directory if it doesn't exist
+    logos_dir = Path("app/static/logos")
+    logos_dir.mkdir(parents=True, exist_ok=True)
+
+    # Stream to disk with size validation (max 2MB)
+    try:
+        upload = await uploads.ingest_upload(logo, logos_dir, 2 * 1024 * 1024)
+    except uploads.UploadTooLarge:
         return RedirectResponse(
             url=f"/{company_slug}/admin/branding?error=File too large. Maximum size is 2MB.",
             status_code=303
         )
 
-    # Create logos directory if it doesn't exist
-    logos_dir = Path("app/static/logos")
-    logos_dir.mkdir(parents=True, exist_ok=True)
-
     # Determine file extension (validate against allowlist)
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
     _, ext = os.path.splitext(logo.filename or "logo.png")
@@ -4728,12 +4429,12 @@ async def upload_logo(
     file_path = logos_dir / filename
 
     # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(contents)
+    upload.move_to(file_path)
 
     # Update company logo URL
     company.logo_url = f"/static/logos/{filename}"
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Logo uploaded for company {company.slug} by {current_user.email}")
 
@@ -4774,6 +4475,7 @@ def update_brand_colors(
     company.primary_color = primary_color
     company.secondary_color = secondary_color
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Brand colors updated for company {company.slug} by {current_user.email}")
 
@@ -4869,6 +4571,7 @@ def update_company_details(
     company.email = email.strip()
     company.phone = phone.strip() if phone and phone.strip() else None
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"Company details updated for {company.slug} by {current_user.email}")
 
@@ -4912,6 +4615,7 @@ def update_smtp_settings(
     company.smtp_password = password or None
     company.smtp_from_email = from_email or None
     db.commit()
+    company_cache.invalidate(company.slug)
 
     if host:
         logger.info(f"SMTP settings updated for {company.slug} by {current_user.email}: {host}")
@@ -4956,6 +4660,7 @@ def test_smtp_settings(
     company.smtp_password = password
     company.smtp_from_email = from_email or None
     db.commit()
+    company_cache.invalidate(company.slug)
 
     # Send test email
     from app.notifications import send_email
@@ -5131,8 +4836,6 @@ async def upload_terms_document(
     db: Session = Depends(get_db)
 ):
     """Upload new T&Cs PDF document"""
-    import hashlib
-
     company = verify_company_access(company_slug, current_user)
 
     # Validate file type
@@ -5142,20 +4845,21 @@ async def upload_terms_document(
             status_code=303
         )
 
-    # Validate file size (max 10MB)
-    contents = await tcs_document.read()
-    if len(contents) > 10 * 1024 * 1024:  # 10MB
+    # Create documents directory structure
+    documents_dir = Path("app/static/documents") / str(company.id)
+    documents_dir.mkdir(parents=True, exist_ok=True)
+
+    # Stream to disk with size validation (max 10MB)
+    try:
+        upload = await uploads.ingest_upload(tcs_document, documents_dir, 10 * 1024 * 1024)
+    except uploads.UploadTooLarge:
         return RedirectResponse(
             url=f"/{company_slug}/admin/terms?error=File too large. Maximum size is 10MB.",
             status_code=303
         )
 
-    # Calculate document hash (SHA-256) for legal proof
-    document_hash = hashlib.sha256(contents).hexdigest()
-
-    # Create documents directory structure
-    documents_dir = Path("app/static/documents") / str(company.id)
-    documents_dir.mkdir(parents=True, exist_ok=True)
+    # Document hash (SHA-256, computed while streaming) for legal proof
+    document_hash = upload.sha256
 
     # Calculate new version
     if company.tcs_version:
@@ -5172,8 +4876,7 @@ async def upload_terms_document(
     file_path = documents_dir / filename
 
     # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(contents)
+    upload.move_to(file_path)
 
     # Update company record
     company.tcs_document_url = f"/static/documents/{company.id}/{filename}"
@@ -5186,6 +4889,7 @@ async def upload_terms_document(
         company.tcs_enabled = True
 
     db.commit()
+    company_cache.invalidate(company.slug)
 
     logger.info(f"T&Cs v{new_version} uploaded for company {company.slug} by {current_user.email}")
 
@@ -5214,6 +4918,7 @@ def toggle_terms_requirement(
     # Toggle enabled status
     company.tcs_enabled = not company.tcs_enabled
     db.commit()
+    company_cache.invalidate(company.slug)
 
     status_text = "enabled" if company.tcs_enabled else "disabled"
     logger.info(f"T&Cs {status_text} for company {company.slug} by {current_user.email}")
@@ -5334,6 +5039,9 @@ def update_pricing(
     if not pricing:
         pricing = PricingConfig(company_id=company.id)
         db.add(pricing)
+    else:
+        # Invalidates every cached quote for this company
+        pricing.revision = func.coalesce(PricingConfig.revision, 0) + 1
 
     # Update all fields
     pricing.price_per_cbm = price_per_cbm
@@ -5367,6 +5075,79 @@ def update_pricing(
     )
 
 
+@app.post("/{company_slug}/admin/pricing/preview")
+def preview_pricing(
+    company_slug: str,
+    price_per_cbm: Optional[float] = Form(None),
+    callout_fee: Optional[float] = Form(None),
+    bulky_item_fee: Optional[float] = Form(None),
+    bulky_weight_threshold_kg: Optional[int] = Form(None),
+    fragile_item_fee: Optional[float] = Form(None),
+    weight_threshold_kg: Optional[int] = Form(None),
+    price_per_kg_over_threshold: Optional[float] = Form(None),
+    base_distance_km: Optional[int] = Form(None),
+    price_per_km: Optional[float] = Form(None),
+    pack1_price: Optional[float] = Form(None),
+    pack2_price: Optional[float] = Form(None),
+    pack3_price: Optional[float] = Form(None),
+    pack6_price: Optional[float] = Form(None),
+    robe_carton_price: Optional[float] = Form(None),
+    tape_price: Optional[float] = Form(None),
+    paper_price: Optional[float] = Form(None),
+    mattress_cover_price: Optional[float] = Form(None),
+    packing_labor_per_hour: Optional[float] = Form(None),
+    estimate_low_multiplier: Optional[float] = Form(None),
+    estimate_high_multiplier: Optional[float] = Form(None),
+    limit: int = Form(200),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Preview proposed pricing against recent submitted jobs without saving it"""
+    company = verify_company_access(company_slug, current_user)
+
+    pricing = db.query(PricingConfig).filter(PricingConfig.company_id == company.id).first()
+    if not pricing:
+        return JSONResponse({"error": "No pricing configuration"}, status_code=400)
+
+    overrides = {
+        "price_per_cbm": price_per_cbm,
+        "callout_fee": callout_fee,
+        "bulky_item_fee": bulky_item_fee,
+        "bulky_weight_threshold_kg": bulky_weight_threshold_kg,
+        "fragile_item_fee": fragile_item_fee,
+        "weight_threshold_kg": weight_threshold_kg,
+        "price_per_kg_over_threshold": price_per_kg_over_threshold,
+        "base_distance_km": base_distance_km,
+        "price_per_km": price_per_km,
+        "pack1_price": pack1_price,
+        "pack2_price": pack2_price,
+        "pack3_price": pack3_price,
+        "pack6_price": pack6_price,
+        "robe_carton_price": robe_carton_price,
+        "tape_price": tape_price,
+        "paper_price": paper_price,
+        "mattress_cover_price": mattress_cover_price,
+        "packing_labor_per_hour": packing_labor_per_hour,
+        "estimate_low_multiplier": estimate_low_multiplier,
+        "estimate_high_multiplier": estimate_high_multiplier,
+    }
+    overrides = {name: float(value) for name, value in overrides.items() if value is not None}
+
+    if any(v < 0 for v in overrides.values()):
+        return JSONResponse({"error": "All prices must be positive numbers"}, status_code=400)
+
+    current = quote_engine.PricingSnapshot.from_config(pricing)
+    proposed = dataclasses.replace(current, **overrides)
+
+    if proposed.estimate_low_multiplier >= proposed.estimate_high_multiplier:
+        return JSONResponse(
+            {"error": "Low estimate multiplier must be less than high estimate multiplier"},
+            status_code=400
+        )
+
+    return JSONResponse(requote.preview_pricing_change(company.id, current, proposed, db, limit=limit))
+
+
 # ============================================================================
 # ANALYTICS & REPORTING ENDPOINTS
 # ============================================================================
@@ -5376,7 +5157,7 @@ def analytics_dashboard(
     request: Request,
     company_slug: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Analytics dashboard with key metrics"""
     company = verify_company_access(company_slug, current_user)
@@ -5530,7 +5311,6 @@ async def track_user_interaction(
     screen_width: Optional[int] = Form(None),
     screen_height: Optional[int] = Form(None),
     metadata: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
 ):
     """
     Track user interaction for ML training and UX optimization
@@ -5549,22 +5329,6 @@ async def track_user_interaction(
         if not session_id:
             session_id = str(uuid.uuid4())
 
-        # Get company from request state if available
-        company_id = None
-        if hasattr(request.state, 'company'):
-            company_id = request.state.company.id
-
-        # Parse device type from user agent
-        user_agent = request.headers.get('user-agent', '')
-        device_type = 'desktop'
-        if 'mobile' in user_agent.lower():
-            device_type = 'mobile'
-        elif 'tablet' in user_agent.lower():
-            device_type = 'tablet'
-
-        # Extract browser
-        browser = user_agent.split()[0] if user_agent else 'unknown'
-
         # Parse metadata JSON if provided
         meta_dict = {}
         if metadata:
@@ -5573,29 +5337,19 @@ async def track_user_interaction(
             except (json.JSONDecodeError, TypeError):
                 pass
 
-        # Create interaction record
-        interaction = UserInteraction(
-            session_id=session_id,
-            job_token=job_token,
-            company_id=company_id,
-            event_type=event_type,
-            page_url=page_url,
-            element_id=element_id,
-            element_text=element_text[:200] if element_text else None,
-            time_spent_seconds=time_spent_seconds,
-            scroll_depth_percent=scroll_depth_percent,
-            device_type=device_type,
-            browser=browser[:100],
-            screen_width=screen_width,
-            screen_height=screen_height,
-            ip_address=request.client.host,
-            user_agent=user_agent[:500],
-            metadata=meta_dict,
-            recorded_at=datetime.utcnow()
-        )
-
-        db.add(interaction)
-        db.commit()
+        # Buffered and written in bulk by app.tracking (no database work per event)
+        tracking.buffer.add(tracking.interaction_row(request, {
+            "event_type": event_type,
+            "page_url": page_url,
+            "job_token": job_token,
+            "element_id": element_id,
+            "element_text": element_text,
+            "time_spent_seconds": time_spent_seconds,
+            "scroll_depth_percent": scroll_depth_percent,
+            "screen_width": screen_width,
+            "screen_height": screen_height,
+            "metadata": meta_dict,
+        }, session_id))
 
         return JSONResponse({
             "ok": True,
@@ -5608,6 +5362,35 @@ async def track_user_interaction(
         return JSONResponse({"ok": False}, status_code=200)
 
 
+@app.post("/api/track/batch")
+async def track_user_interactions_batch(request: Request):
+    """
+    Track a batch of interactions sent by tracker.js in one request
+
+    Body: JSON (optionally gzip-encoded) in the compact format described in
+    app.tracking.parse_batch. The whole batch is validated and queued at once;
+    malformed events are skipped and reported as rejected.
+    """
+    try:
+        session_id, events, rejected = tracking.parse_batch(
+            await tracking.read_batch_body(request), request.headers.get("content-encoding")
+        )
+    except tracking.BatchTooLarge as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+
+    session_id = session_id or str(uuid.uuid4())
+    tracking.buffer.extend([tracking.interaction_row(request, event, session_id) for event in events])
+
+    return JSONResponse({
+        "ok": True,
+        "session_id": session_id,
+        "accepted": len(events),
+        "rejected": rejected
+    })
+
+
 # ============================================================================
 # MARKETPLACE ENDPOINTS - "Uber for Removals"
 # ============================================================================
@@ -6100,7 +5883,7 @@ def admin_broadcast_job(
 # ----------------------------
 
 @app.get("/admin/marketplace/stats")
-def get_marketplace_stats_endpoint(db: Session = Depends(get_db)):
+def get_marketplace_stats_endpoint(db: Session = Depends(get_read_db)):
     """Get marketplace statistics for dev dashboard"""
     stats = marketplace.get_marketplace_stats(db)
     return JSONResponse(stats)
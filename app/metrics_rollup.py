@@ -0,0 +1,258 @@
+"""
+Platform metrics rollup for PrimeHaul OS
+The developer dashboard shows platform-wide counts (customers, trials, today's
+quotes and photos, marketplace stats). Rather than counting the live tables on
+every page load, web processes on PostgreSQL rebuild them every
+METRICS_REFRESH_SECONDS (elsewhere the dashboard counts live):
+
+- platform_metrics_daily: one row per UTC day (signups, jobs created /
+  submitted / approved, photos uploaded). The first refresh backfills history
+  BACKFILL_DAYS at a time; later refreshes recount only yesterday and today,
+  always by indexed date range.
+- platform_metrics: a single summary row (id=1) the dashboard reads.
+
+Only one process refreshes at a time (the summary row is locked with SKIP
+LOCKED), and each process caches the summary for METRICS_CACHE_SECONDS.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import marketplace
+from app.config import settings
+from app.database import estimated_row_counts
+from app.models import Company, Job, Photo, PlatformMetrics, PlatformMetricsDaily
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID = 1
+BACKFILL_DAYS = 31  # Days counted per query while backfilling history
+
+# Daily bucket column → timestamp it counts
+DAILY_COUNTS = (
+    ("signups", Company.created_at),
+    ("jobs_created", Job.created_at),
+    ("jobs_submitted", Job.submitted_at),
+    ("jobs_approved", Job.approved_at),
+    ("photos_uploaded", Photo.created_at),
+)
+
+_cached: Optional[Tuple[float, Dict[str, Any]]] = None
+_lock = threading.Lock()
+
+
+def _as_date(value) -> date:
+    """DATE() result as a date (SQLite returns 'YYYY-MM-DD' strings)"""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Timezone-aware UTC datetime (SQLite returns naive UTC values)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _json_safe(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Decimal sums as floats so the summary can be stored as JSON"""
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in stats.items()}
+
+
+def daily_counts(db: Session, since: Optional[date] = None, until: Optional[date] = None) -> Dict[date, Dict[str, int]]:
+    """
+    Count each daily metric per UTC day
+
+    With `since`, only days from `since` to `until` (default today) are counted,
+    every one of them present and zero-filled; without it, all history is.
+    """
+    buckets: Dict[date, Dict[str, int]] = {}
+    names = [name for name, _ in DAILY_COUNTS]
+    if since is not None:
+        until = until or datetime.utcnow().date()
+        day = since
+        while day <= until:
+            buckets[day] = dict.fromkeys(names, 0)
+            day += timedelta(days=1)
+
+    for name, column in DAILY_COUNTS:
+        day_of = func.date(column)
+        query = db.query(day_of, func.count()).filter(column.isnot(None))
+        if since is not None:
+            query = query.filter(
+                column >= datetime.combine(since, datetime.min.time()),
+                column < datetime.combine(until + timedelta(days=1), datetime.min.time()),
+            )
+        for day, count in query.group_by(day_of):
+            buckets.setdefault(_as_date(day), dict.fromkeys(names, 0))[name] = count
+    return buckets
+
+
+def _first_days(db: Session) -> List[date]:
+    """Earliest day of each daily metric that has any (indexed MIN lookups)"""
+    firsts = [db.query(func.min(column)).scalar() for _, column in DAILY_COUNTS]
+    return [_as_date(str(first)) for first in firsts if first is not None]
+
+
+def _summary(db: Session, now: datetime, today: Dict[str, int]) -> Dict[str, Any]:
+    """Dashboard summary from one pass over companies plus the activity counts"""
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+
+    companies = db.query(
+        func.count(),
+        func.count().filter(Company.subscription_status == 'active'),
+        func.count().filter(Company.subscription_status == 'trial', Company.trial_ends_at > now),
+        func.count().filter(Company.subscription_status == 'canceled', Company.subscription_canceled_at >= month_ago),
+        # Last 60 days for fair sample
+        func.count().filter(Company.subscription_status.in_(['active', 'canceled']), Company.created_at >= month_ago - timedelta(days=30)),
+        func.count().filter(Company.created_at >= today_start),
+        func.count().filter(Company.created_at >= week_ago),
+    ).one()
+
+    return {
+        "total_companies": companies[0],
+        "paying_customers": companies[1],
+        "active_trials": companies[2],
+        "churned_customers": companies[3],
+        "total_trials": companies[4],
+        "signups_today": companies[5],
+        "trial_signups_7d": companies[6],
+        # Live row count (estimated on PostgreSQL), so deleted jobs drop out
+        "total_jobs": estimated_row_counts(db, ["jobs"])["jobs"],
+        "quotes_today": today["jobs_created"],
+        "submitted_today": today["jobs_submitted"],
+        "approved_today": today["jobs_approved"],
+        "photos_today": today["photos_uploaded"],
+        "marketplace": _json_safe(marketplace.get_marketplace_stats(db)),
+    }
+
+
+def compute_metrics(db: Session, now: datetime = None) -> Dict[str, Any]:
+    """Build the dashboard summary straight from the live tables (read-only)"""
+    now = now or datetime.utcnow()
+    today = daily_counts(db, since=now.date())[now.date()]
+    return _summary(db, now, today)
+
+
+def refresh(db: Session, min_age_seconds: float = 0) -> Optional[Dict[str, Any]]:
+    """
+    Recount recent daily buckets and rebuild the summary row
+
+    Returns the new summary, or None if another process is refreshing or the
+    summary was rebuilt less than `min_age_seconds` ago.
+    """
+    now = datetime.utcnow()
+    snapshot = db.query(PlatformMetrics).filter(
+        PlatformMetrics.id == SNAPSHOT_ID
+    ).with_for_update(skip_locked=True).first()
+    if snapshot is None:
+        if db.query(PlatformMetrics.id).filter(PlatformMetrics.id == SNAPSHOT_ID).first() is not None:
+            db.rollback()  # Locked by another refresh
+            return None
+        snapshot = PlatformMetrics(id=SNAPSHOT_ID, metrics={})
+        db.add(snapshot)
+    elif min_age_seconds and snapshot.refreshed_at is not None and \
+            (datetime.now(timezone.utc) - _as_utc(snapshot.refreshed_at)).total_seconds() < min_age_seconds:
+        db.rollback()
+        return None
+
+    has_history = db.query(PlatformMetricsDaily.day).first() is not None
+    start = now.date() - timedelta(days=1)
+    if not has_history:
+        start = min([start] + _first_days(db))
+
+    buckets: Dict[date, Dict[str, int]] = {}
+    while start <= now.date():
+        until = min(start + timedelta(days=BACKFILL_DAYS - 1), now.date())
+        buckets.update(daily_counts(db, since=start, until=until))
+        start = until + timedelta(days=1)
+    for day, counts in buckets.items():
+        db.merge(PlatformMetricsDaily(day=day, updated_at=now, **counts))
+    db.flush()
+
+    today = buckets.get(now.date()) or dict.fromkeys([name for name, _ in DAILY_COUNTS], 0)
+    metrics = _summary(db, now, today)
+
+    snapshot.metrics = metrics
+    snapshot.refreshed_at = now
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # Another process created the summary row first
+        return None
+
+    _remember(metrics)
+    return metrics
+
+
+def _remember(metrics: Dict[str, Any]):
+    global _cached
+    if settings.METRICS_CACHE_SECONDS <= 0:
+        return
+    with _lock:
+        _cached = (time.monotonic() + settings.METRICS_CACHE_SECONDS, metrics)
+
+
+def invalidate():
+    """Drop this process's cached summary"""
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def get_dashboard_metrics(db: Session) -> Dict[str, Any]:
+    """
+    The dashboard summary: cached, else the summary row, else computed live
+
+    The live fallback only runs until the first refresh has stored a summary.
+    """
+    with _lock:
+        if _cached is not None and _cached[0] >= time.monotonic():
+            return dict(_cached[1])
+
+    snapshot = db.get(PlatformMetrics, SNAPSHOT_ID)
+    metrics = snapshot.metrics if snapshot is not None and snapshot.metrics else compute_metrics(db)
+    _remember(metrics)
+    return dict(metrics)
+
+
+def _refresh_once(min_age_seconds: float):
+    from app.database import ROUTE_STATEMENT_TIMEOUTS, STATEMENT_TIMEOUT_KEY, SessionLocal
+
+    db = SessionLocal()
+    db.info[STATEMENT_TIMEOUT_KEY] = ROUTE_STATEMENT_TIMEOUTS["report"]  # Counting queries, like dashboards
+    try:
+        refresh(db, min_age_seconds)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not refresh platform metrics: {e}")
+    finally:
+        db.close()
+
+
+def refresh_in_background() -> bool:
+    """Whether this process should run refresh_loop (web processes on PostgreSQL, refresh enabled)"""
+    from app import database
+
+    return (settings.METRICS_REFRESH_SECONDS > 0 and database.DB_PROCESS_TYPE == "web"
+            and database.engine.dialect.name == "postgresql")
+
+
+async def refresh_loop():
+    """Rebuild the rollup every METRICS_REFRESH_SECONDS (skipped if another process just did)"""
+    interval = settings.METRICS_REFRESH_SECONDS
+    while True:
+        await asyncio.to_thread(_refresh_once, interval / 2)
+        await asyncio.sleep(interval)
@@ -3,7 +3,7 @@ SQLAlchemy database models for PrimeHaul OS
 Multi-tenant B2B SaaS platform for moving quote management
 """
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, DECIMAL, Index
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, String, Text, DECIMAL, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -18,6 +18,9 @@ class Company(Base):
     Companies table - Each moving company using the platform
     """
     __tablename__ = "companies"
+    __table_args__ = (
+        Index('idx_companies_created_id', 'created_at', 'id'),  # Superadmin keyset pagination
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -180,6 +183,9 @@ class PricingConfig(Base):
     # Packing Service Labor Pricing
     packing_labor_per_hour = Column(DECIMAL(10, 2), nullable=False, default=40.00)  # £40/hour for packing service
 
+    # Bumped on every pricing update so cached job quotes are recomputed
+    revision = Column(Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     company = relationship("Company", back_populates="pricing_config")
 
@@ -339,6 +345,24 @@ class LearnedCorrection(Base):
     )
 
 
+class VisionResult(Base):
+    """
+    Cached AI vision results.
+    Keyed by the photos' content hashes plus model, prompt version and learned
+    guidance, so re-analysing the same photos costs nothing.
+    """
+    __tablename__ = "vision_results"
+
+    cache_key = Column(String(64), primary_key=True)  # SHA-256 of hashes + model + prompt inputs
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(Integer, nullable=False)
+    result = Column(JSONB, nullable=False)  # Raw {"items": [...], "summary": "..."} from the model
+
+    hit_count = Column(Integer, nullable=False, default=0, server_default='0')
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+    last_used_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+
 class Job(Base):
     """
     Jobs table - Customer removal quotes
@@ -351,7 +375,7 @@ class Job(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     company_id = Column(UUID(as_uuid=True), ForeignKey('companies.id', ondelete='CASCADE'), nullable=False, index=True)
     token = Column(String(50), nullable=False, unique=True, index=True)  # Customer-facing survey token
-    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     # Location Data (JSONB for flexibility)
@@ -380,7 +404,7 @@ class Job(Base):
     status = Column(String(50), nullable=False, default='in_progress', index=True)  # in_progress, awaiting_approval, approved, rejected
     survey_mode = Column(String(20), nullable=False, default='quote', server_default='quote')  # 'quote' or 'survey_only'
     submitted_at = Column(DateTime(timezone=True), index=True)
-    approved_at = Column(DateTime(timezone=True))
+    approved_at = Column(DateTime(timezone=True), index=True)
     rejected_at = Column(DateTime(timezone=True))
     rejection_reason = Column(Text)
     deposit_paid_at = Column(DateTime(timezone=True))
@@ -396,6 +420,11 @@ class Job(Base):
     # Final Quote Price (set by boss when approving - the actual quote sent to customer)
     final_quote_price = Column(Integer)  # The single fixed price, not a range
 
+    # Quote cache (see calculate_quote) - keyed on inventory + pricing revisions
+    inventory_revision = Column(Integer, nullable=False, default=0, server_default='0')  # Bumped when rooms/items change
+    quote_cache_key = Column(String(64))
+    quote_cache = Column(JSONB)
+
     # Relationships
     company = relationship("Company", back_populates="jobs")
     rooms = relationship("Room", back_populates="job", cascade="all, delete-orphan")
@@ -465,7 +494,7 @@ class Photo(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     room_id = Column(UUID(as_uuid=True), ForeignKey('rooms.id', ondelete='CASCADE'), nullable=False, index=True)
-    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
 
     # File Info
     filename = Column(String(255), nullable=False)
@@ -474,7 +503,8 @@ class Photo(Base):
     mime_type = Column(String(100))
 
     # Storage (company-specific paths)
-    storage_path = Column(Text, nullable=False)  # e.g., "uploads/{company_id}/{job_token}/{filename}"
+    storage_path = Column(Text, nullable=False)  # e.g., "uploads/{company_id}/blobs/{sha256}.jpg"
+    content_hash = Column(String(64), index=True)  # SHA-256 of the uploaded bytes
 
     # Relationships
     room = relationship("Room", back_populates="photos")
@@ -482,9 +512,22 @@ class Photo(Base):
     @property
     def url(self):
         """Return the URL to access this photo through protected endpoint"""
+        return self.url_for(None)
+
+    def url_for(self, job_token):
+        """
+        Protected URL for this photo, given its job's token
+
+        Content-addressed photos don't carry the token in their path; pass it
+        in when rendering many photos so it isn't lazy-loaded through
+        room.job for each one.
+        """
         # storage_path format: uploads/{company_id}/{token}/{filename}
+        # or uploads/{company_id}/blobs/{sha256}.{ext} for content-addressed photos
         # Convert to protected URL: /photo/{company_id}/{token}/{filename}
         parts = self.storage_path.split('/')
+        if len(parts) >= 4 and parts[2] == 'blobs':
+            return f"/photo/{parts[1]}/{job_token or self.room.job.token}/{self.filename}"
         if len(parts) >= 4:
             # parts: ['uploads', company_id, token, filename]
             return f"/photo/{parts[1]}/{parts[2]}/{parts[3]}"
@@ -492,6 +535,35 @@ class Photo(Base):
         return f"/photo/{self.storage_path.replace('uploads/', '')}"
 
 
+class PhotoAnalysis(Base):
+    """
+    Photo analysis queue - one row per batch of uploaded room photos.
+    Upload handlers enqueue a row and return; workers claim rows with
+    SELECT ... FOR UPDATE SKIP LOCKED, run AI vision and save the items.
+    """
+    __tablename__ = "photo_analyses"
+    __table_args__ = (
+        Index('idx_photo_analyses_status_created', 'status', 'created_at'),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    company_id = Column(UUID(as_uuid=True), ForeignKey('companies.id', ondelete='CASCADE'), nullable=False, index=True)
+    job_id = Column(UUID(as_uuid=True), ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False, index=True)
+    room_id = Column(UUID(as_uuid=True), ForeignKey('rooms.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    # Work
+    photo_ids = Column(JSONB, nullable=False)  # Photo UUIDs (as strings) to analyse together
+
+    # Progress
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    items_detected = Column(Integer)
+    error = Column(Text)
+
+
 class AdminNote(Base):
     """
     Admin notes table - Internal notes on jobs
@@ -537,6 +609,33 @@ class UsageAnalytics(Base):
     company = relationship("Company", back_populates="usage_analytics")
 
 
+class PlatformMetricsDaily(Base):
+    """
+    Platform-wide activity per UTC day for the developer dashboard.
+    Maintained by app.metrics_rollup; each refresh recomputes the last two days.
+    """
+    __tablename__ = "platform_metrics_daily"
+
+    day = Column(Date, primary_key=True)
+    signups = Column(Integer, nullable=False, default=0, server_default='0')
+    jobs_created = Column(Integer, nullable=False, default=0, server_default='0')
+    jobs_submitted = Column(Integer, nullable=False, default=0, server_default='0')
+    jobs_approved = Column(Integer, nullable=False, default=0, server_default='0')
+    photos_uploaded = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class PlatformMetrics(Base):
+    """
+    Latest developer dashboard summary - a single row (id=1) rebuilt by app.metrics_rollup
+    """
+    __tablename__ = "platform_metrics"
+
+    id = Column(Integer, primary_key=True)
+    metrics = Column(JSONB, nullable=False)  # {paying_customers, active_trials, signups_today, marketplace: {...}, ...}
+    refreshed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
 class StripeEvent(Base):
     """
     Stripe events table - Log all webhook events for audit trail
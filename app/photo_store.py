@@ -0,0 +1,151 @@
+"""
+Content-addressed photo storage for PrimeHaul OS
+Each distinct photo is stored once per company as uploads/{company_id}/blobs/{sha256}{ext},
+keyed by the SHA-256 of the uploaded bytes. Photo rows point at the blob, so
+re-uploads and retries reuse the existing file instead of writing a new copy.
+Alongside each blob sits a model-sized JPEG derivative in
+uploads/{company_id}/vision/{sha256}.jpg, made once at upload time and sent
+to the vision model in place of the original.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app import image_processing
+from app.uploads import IngestedUpload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path("uploads")  # Not in app/static - not publicly accessible
+BLOB_DIRNAME = "blobs"
+VISION_DIRNAME = "vision"
+
+
+def blob_dir(company_id) -> Path:
+    """Directory holding a company's photo blobs (created if missing)"""
+    directory = UPLOAD_DIR / str(company_id) / BLOB_DIRNAME
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def vision_path(company_id, sha256: str) -> Path:
+    """Path of the vision-model derivative for this content hash (may not exist yet)"""
+    directory = UPLOAD_DIR / str(company_id) / VISION_DIRNAME
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{sha256}.jpg"
+
+
+def find_blob(company_id, sha256: str) -> Optional[Path]:
+    """Return the stored blob for this content hash, if any"""
+    for path in blob_dir(company_id).glob(f"{sha256}.*"):
+        if path.suffix not in (".part", ".tmp"):
+            return path
+    return None
+
+
+def store_blob(company_id, upload: IngestedUpload, ext: str) -> Path:
+    """
+    Move a spooled upload into the blob store under its content hash
+
+    If another request stored the same content first, the spooled copy is
+    discarded and the existing blob is returned.
+    """
+    existing = find_blob(company_id, upload.sha256)
+    if existing:
+        upload.discard()
+        return existing
+    return upload.move_to(blob_dir(company_id) / f"{upload.sha256}{ext.lower()}")
+
+
+def storage_path(path: Path) -> str:
+    """Relative storage path as recorded on Photo rows (uploads/...)"""
+    return Path(path).as_posix()
+
+
+@dataclass
+class StoredPhoto:
+    """A photo that has been written to (or found in) the blob store"""
+    path: Path
+    sha256: str
+    size: int
+    original_filename: str
+    content_type: str
+    vision_path: Optional[Path] = None  # Model-sized JPEG, if one could be made
+
+    @property
+    def vision_input(self) -> Path:
+        """File to send to the vision model"""
+        return self.vision_path or self.path
+
+    @property
+    def filename(self) -> str:
+        return self.path.name
+
+    @property
+    def storage_path(self) -> str:
+        return storage_path(self.path)
+
+
+async def store_uploads(company_id, ingested: List[IngestedUpload]) -> List[StoredPhoto]:
+    """
+    Deduplicate, compress and store a batch of spooled uploads
+
+    Uploads with the same content as an earlier one in the batch are dropped,
+    and content that is already in the blob store is reused without being
+    compressed again. Only new content goes through the image pool, which
+    also makes any missing vision derivatives.
+
+    Args:
+        company_id: Owning company (blobs are never shared across companies)
+        ingested: Uploads spooled into blob_dir(company_id)
+
+    Returns:
+        One StoredPhoto per distinct content hash, in upload order
+    """
+    unique: Dict[str, IngestedUpload] = {}
+    for upload in ingested:
+        if upload.sha256 in unique:
+            upload.discard()
+            continue
+        unique[upload.sha256] = upload
+
+    new_uploads = [upload for upload in unique.values() if not find_blob(company_id, upload.sha256)]
+    compressed = await image_processing.compress_photo_files([str(upload.path) for upload in new_uploads])
+    was_compressed = {upload.sha256: flag for upload, flag in zip(new_uploads, compressed)}
+
+    stored = []
+    for sha256, upload in unique.items():
+        try:
+            if was_compressed.get(sha256):
+                ext = ".jpg"
+            else:
+                ext = os.path.splitext(upload.filename or "photo.jpg")[1] or ".jpg"
+            path = store_blob(company_id, upload, ext)
+            if sha256 not in was_compressed:
+                logger.info(f"Reusing stored photo {path.name} for {upload.filename}")
+            stored.append(StoredPhoto(
+                path=path,
+                sha256=sha256,
+                size=path.stat().st_size,
+                original_filename=upload.filename,
+                content_type=upload.content_type,
+            ))
+        except Exception as e:
+            logger.error(f"Error storing photo {upload.filename}: {e}")
+            upload.discard()
+
+    missing = []
+    for photo in stored:
+        derivative = vision_path(company_id, photo.sha256)
+        if derivative.exists():
+            photo.vision_path = derivative
+        else:
+            missing.append((photo, derivative))
+    made = await image_processing.make_vision_derivatives([(str(p.path), str(d)) for p, d in missing])
+    for (photo, derivative), ok in zip(missing, made):
+        if ok:
+            photo.vision_path = derivative
+    return stored
@@ -0,0 +1,510 @@
+"""
+Quote engine for PrimeHaul OS
+Pure pricing math with no database access. Takes an inventory in column form
+plus a frozen pricing snapshot and returns the quote breakdown, so the same
+code prices a live job or thousands of historical jobs for a what-if preview.
+"""
+
+import math
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from app.inventory import JobInventory
+
+
+# Bump when the pricing math changes so cached quotes are recomputed
+ENGINE_VERSION = 1
+
+# Packing requirement codes stored in the packing column
+PACK_NONE = 0
+PACK_SMALL_BOX = 1
+PACK_MEDIUM_BOX = 2
+PACK_LARGE_BOX = 3
+PACK_ROBE_CARTON = 4
+PACK_MATTRESS_COVER = 5
+
+PACKING_CODES = {
+    "none": PACK_NONE,
+    "small_box": PACK_SMALL_BOX,
+    "medium_box": PACK_MEDIUM_BOX,
+    "large_box": PACK_LARGE_BOX,
+    "robe_carton": PACK_ROBE_CARTON,
+    "wardrobe_box": PACK_ROBE_CARTON,
+    "mattress_cover": PACK_MATTRESS_COVER,
+}
+
+LOOSE_ITEM_CODES = (PACK_SMALL_BOX, PACK_MEDIUM_BOX, PACK_LARGE_BOX)
+
+
+@dataclass(frozen=True)
+class PricingSnapshot:
+    """Immutable copy of a company's PricingConfig as plain floats"""
+    callout_fee: float
+    price_per_cbm: float
+    bulky_item_fee: float
+    bulky_weight_threshold_kg: float
+    fragile_item_fee: float
+    weight_threshold_kg: float
+    price_per_kg_over_threshold: float
+    base_distance_km: float
+    price_per_km: float
+    estimate_low_multiplier: float
+    estimate_high_multiplier: float
+    price_per_floor: float
+    no_lift_surcharge: float
+    parking_street_fee: float
+    parking_permit_fee: float
+    parking_limited_fee: float
+    parking_distance_per_50m: float
+    narrow_access_fee: float
+    time_restriction_fee: float
+    booking_required_fee: float
+    outdoor_steps_per_5: float
+    outdoor_path_fee: float
+    pack1_price: float
+    pack2_price: float
+    pack3_price: float
+    pack6_price: float
+    robe_carton_price: float
+    tape_price: float
+    paper_price: float
+    mattress_cover_price: float
+    packing_labor_per_hour: float
+
+    @classmethod
+    def from_config(cls, pricing) -> "PricingSnapshot":
+        """Snapshot a PricingConfig row (or any object with the same attributes)"""
+        def num(name, default=0.0):
+            value = getattr(pricing, name, None)
+            return float(value) if value is not None else default
+
+        return cls(
+            callout_fee=num("callout_fee"),
+            price_per_cbm=num("price_per_cbm"),
+            bulky_item_fee=num("bulky_item_fee"),
+            bulky_weight_threshold_kg=float(pricing.bulky_weight_threshold_kg or 50),
+            fragile_item_fee=num("fragile_item_fee"),
+            weight_threshold_kg=num("weight_threshold_kg", 1000.0),
+            price_per_kg_over_threshold=num("price_per_kg_over_threshold"),
+            base_distance_km=float(pricing.base_distance_km or 0),
+            price_per_km=float(pricing.price_per_km or 2.00),
+            estimate_low_multiplier=num("estimate_low_multiplier", 0.90),
+            estimate_high_multiplier=num("estimate_high_multiplier", 1.20),
+            price_per_floor=num("price_per_floor"),
+            no_lift_surcharge=num("no_lift_surcharge"),
+            parking_street_fee=num("parking_street_fee"),
+            parking_permit_fee=num("parking_permit_fee"),
+            parking_limited_fee=num("parking_limited_fee"),
+            parking_distance_per_50m=num("parking_distance_per_50m"),
+            narrow_access_fee=num("narrow_access_fee"),
+            time_restriction_fee=num("time_restriction_fee"),
+            booking_required_fee=num("booking_required_fee"),
+            outdoor_steps_per_5=num("outdoor_steps_per_5"),
+            outdoor_path_fee=num("outdoor_path_fee"),
+            pack1_price=num("pack1_price"),
+            pack2_price=num("pack2_price"),
+            pack3_price=num("pack3_price"),
+            pack6_price=num("pack6_price"),
+            robe_carton_price=num("robe_carton_price"),
+            tape_price=num("tape_price"),
+            paper_price=num("paper_price"),
+            mattress_cover_price=num("mattress_cover_price"),
+            packing_labor_per_hour=num("packing_labor_per_hour"),
+        )
+
+
+@dataclass(frozen=True)
+class InventoryColumns:
+    """
+    Inventory stored as parallel column arrays (one entry per item)
+
+    Totals and counts are single reductions over these columns rather than
+    per-item attribute lookups on ORM rows.
+    """
+    qty: array = field(default_factory=lambda: array("l"))
+    cbm: array = field(default_factory=lambda: array("d"))
+    weight_kg: array = field(default_factory=lambda: array("d"))
+    bulky: array = field(default_factory=lambda: array("b"))
+    fragile: array = field(default_factory=lambda: array("b"))
+    packing: array = field(default_factory=lambda: array("b"))
+    room: array = field(default_factory=lambda: array("l"))
+    room_ids: Tuple[str, ...] = ()
+    room_names: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_inventory(cls, inventory: JobInventory) -> "InventoryColumns":
+        columns = cls(
+            room_ids=tuple(room.id for room in inventory.rooms),
+            room_names=tuple(room.name for room in inventory.rooms),
+        )
+        for room_index, room in enumerate(inventory.rooms):
+            for item in room.items:
+                columns.qty.append(item.qty)
+                columns.cbm.append(item.cbm)
+                columns.weight_kg.append(item.weight_kg)
+                columns.bulky.append(item.bulky)
+                columns.fragile.append(item.fragile)
+                columns.packing.append(PACKING_CODES.get(item.packing_requirement, PACK_NONE))
+                columns.room.append(room_index)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.qty)
+
+
+@dataclass(frozen=True)
+class QuoteInputs:
+    """The job fields that affect price"""
+    pickup: Optional[Dict[str, Any]] = None
+    dropoff: Optional[Dict[str, Any]] = None
+    pickup_access: Optional[Dict[str, Any]] = None
+    dropoff_access: Optional[Dict[str, Any]] = None
+    customer_provides_packing: bool = False
+    packing_service_rooms: Tuple[str, ...] = ()
+    custom_price_low: Optional[int] = None
+    custom_price_high: Optional[int] = None
+
+    @classmethod
+    def from_job(cls, job) -> "QuoteInputs":
+        return cls(
+            pickup=job.pickup,
+            dropoff=job.dropoff,
+            pickup_access=job.pickup_access,
+            dropoff_access=job.dropoff_access,
+            customer_provides_packing=bool(job.customer_provides_packing),
+            packing_service_rooms=tuple(job.packing_service_rooms or ()),
+            custom_price_low=job.custom_price_low,
+            custom_price_high=job.custom_price_high,
+        )
+
+
+def inventory_totals(columns: InventoryColumns, pricing: PricingSnapshot) -> Dict[str, Any]:
+    """Item count, volume, weight and bulky/fragile counts for an inventory"""
+    qty = columns.qty
+    return {
+        "total_items": sum(qty),
+        "total_cbm": sum(c * q for c, q in zip(columns.cbm, qty)),
+        "total_weight_kg": sum(w * q for w, q in zip(columns.weight_kg, qty)),
+        "bulky_items": sum(q for q, w in zip(qty, columns.weight_kg) if w > pricing.bulky_weight_threshold_kg),
+        "fragile_items": sum(q for q, f in zip(qty, columns.fragile) if f),
+    }
+
+
+def _boxes(columns: InventoryColumns, code: int, per_box: int) -> int:
+    return sum(max(1, (q or 1) // per_box) for q, c in zip(columns.qty, columns.packing) if c == code)
+
+
+def _units(columns: InventoryColumns, code: int) -> int:
+    return sum((q or 1) for q, c in zip(columns.qty, columns.packing) if c == code)
+
+
+def packing_materials(
+    columns: InventoryColumns,
+    pricing: PricingSnapshot,
+    total_cbm: float,
+    customer_provides_packing: bool = False,
+) -> dict:
+    """Calculate packing materials needed based on items"""
+    small_boxes = _boxes(columns, PACK_SMALL_BOX, 20)     # Pack 1: ~20 books per box
+    medium_boxes = _boxes(columns, PACK_MEDIUM_BOX, 15)   # Pack 2: ~15 items per box
+    large_boxes = _boxes(columns, PACK_LARGE_BOX, 10)     # Pack 3: ~10 items per box
+    extra_small = 0                                       # Pack 6
+    robe_cartons = _units(columns, PACK_ROBE_CARTON)      # qty is the number of wardrobe boxes
+    mattress_covers = _units(columns, PACK_MATTRESS_COVER)
+
+    total_boxes = small_boxes + medium_boxes + large_boxes + extra_small + robe_cartons
+
+    # Calculate costs
+    pack1_cost = small_boxes * pricing.pack1_price
+    pack2_cost = medium_boxes * pricing.pack2_price
+    pack3_cost = large_boxes * pricing.pack3_price
+    pack6_cost = extra_small * pricing.pack6_price
+    robe_cost = robe_cartons * pricing.robe_carton_price
+    mattress_cost = mattress_covers * pricing.mattress_cover_price
+
+    # Tape: 1 roll per 10 boxes
+    tape_rolls = max(1, (total_boxes // 10) + (1 if total_boxes % 10 > 0 else 0)) if total_boxes > 0 else 0
+    tape_cost = tape_rolls * pricing.tape_price
+
+    # Paper: 1.5 packs per 10 CBM
+    paper_packs = (total_cbm / 10) * 1.5 if total_cbm > 0 else 0
+    paper_cost = paper_packs * pricing.paper_price
+
+    # If customer is providing their own packing, cost is £0 but still show quantities
+    if customer_provides_packing:
+        total_packing_cost = 0
+        pack1_cost = pack2_cost = pack3_cost = pack6_cost = 0
+        robe_cost = mattress_cost = tape_cost = paper_cost = 0
+    else:
+        total_packing_cost = (pack1_cost + pack2_cost + pack3_cost + pack6_cost +
+                              robe_cost + mattress_cost + tape_cost + paper_cost)
+
+    return {
+        "total_cost": round(total_packing_cost, 2),
+        "breakdown": {
+            "small_boxes": {"qty": small_boxes, "cost": round(pack1_cost, 2)},
+            "medium_boxes": {"qty": medium_boxes, "cost": round(pack2_cost, 2)},
+            "large_boxes": {"qty": large_boxes, "cost": round(pack3_cost, 2)},
+            "extra_small_boxes": {"qty": extra_small, "cost": round(pack6_cost, 2)},
+            "robe_cartons": {"qty": robe_cartons, "cost": round(robe_cost, 2)},
+            "mattress_covers": {"qty": mattress_covers, "cost": round(mattress_cost, 2)},
+            "tape_rolls": {"qty": tape_rolls, "cost": round(tape_cost, 2)},
+            "paper_packs": {"qty": round(paper_packs, 1), "cost": round(paper_cost, 2)}
+        },
+        "total_boxes": total_boxes
+    }
+
+
+def packing_service(
+    columns: InventoryColumns,
+    pricing: PricingSnapshot,
+    selected_room_ids: Tuple[str, ...] = (),
+) -> dict:
+    """
+    Calculate packing service estimates per room
+    Returns: {
+        "rooms": [{"room_id": "...", "room_name": "Kitchen", "hours": 2.5, "cost": 100.00, "items_count": 45}],
+        "total_hours": 5.0,
+        "total_cost": 200.00
+    }
+    """
+    # Count items that need packing (loose items) per room
+    loose_per_room = [0] * len(columns.room_ids)
+    for q, c, r in zip(columns.qty, columns.packing, columns.room):
+        if c in LOOSE_ITEM_CODES:
+            loose_per_room[r] += (q or 1)
+
+    room_estimates = []
+    total_hours = 0
+
+    for room_id, room_name, items_needing_packing in zip(columns.room_ids, columns.room_names, loose_per_room):
+        # Skip rooms with no loose items
+        if items_needing_packing == 0:
+            continue
+
+        # Kitchens are slower (fragile, wrapping): 15 items/hour, other rooms 20 items/hour
+        packing_rate = 15 if 'kitchen' in room_name.lower() else 20
+
+        estimated_hours = max(0.5, items_needing_packing / packing_rate)  # Minimum 30min per room
+        estimated_cost = estimated_hours * pricing.packing_labor_per_hour
+
+        # Check if customer wants this room packed
+        is_selected = room_id in selected_room_ids
+
+        room_estimates.append({
+            "room_id": room_id,
+            "room_name": room_name,
+            "hours": round(estimated_hours, 1),
+            "cost": round(estimated_cost, 2),
+            "items_count": items_needing_packing,
+            "is_selected": is_selected
+        })
+
+        if is_selected:
+            total_hours += estimated_hours
+
+    total_cost = total_hours * pricing.packing_labor_per_hour
+
+    return {
+        "rooms": room_estimates,
+        "total_hours": round(total_hours, 1),
+        "total_cost": round(total_cost, 2)
+    }
+
+
+def distance_miles(pickup: Optional[dict], dropoff: Optional[dict]) -> float:
+    """Great-circle (haversine) distance in miles, or 0 if either point is missing"""
+    if not pickup or not dropoff:
+        return 0
+    pickup_lat = pickup.get('lat')
+    pickup_lng = pickup.get('lng')
+    dropoff_lat = dropoff.get('lat')
+    dropoff_lng = dropoff.get('lng')
+    if not all([pickup_lat, pickup_lng, dropoff_lat, dropoff_lng]):
+        return 0
+
+    R = 3959.0  # Earth's radius in miles
+    lat1_rad = math.radians(float(pickup_lat))
+    lat2_rad = math.radians(float(dropoff_lat))
+    dlat = math.radians(float(dropoff_lat) - float(pickup_lat))
+    dlng = math.radians(float(dropoff_lng) - float(pickup_lng))
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng / 2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    return R * c
+
+
+def location_access_fees(access_data: Optional[dict], pricing: PricingSnapshot) -> Tuple[float, dict]:
+    """Access difficulty fees for one location. Returns (total, {fee_name: amount})"""
+    if not access_data:
+        return 0, {}
+
+    location_fees = {}
+
+    # Floors pricing
+    floors = access_data.get('floors', 0)
+    if floors > 0:
+        location_fees['floors'] = floors * pricing.price_per_floor
+
+    # No lift surcharge (only if floors > 0 AND no lift)
+    if floors > 0 and not access_data.get('has_lift', False):
+        location_fees['no_lift'] = pricing.no_lift_surcharge
+
+    # Parking difficulty
+    parking_type = access_data.get('parking_type', 'driveway')
+    if parking_type == 'street':
+        location_fees['parking'] = pricing.parking_street_fee
+    elif parking_type == 'permit_zone':
+        location_fees['parking'] = pricing.parking_permit_fee
+    elif parking_type == 'limited':
+        location_fees['parking'] = pricing.parking_limited_fee
+
+    # Parking distance (if not driveway)
+    if parking_type != 'driveway':
+        distance_meters = access_data.get('parking_distance_meters', 0)
+        if distance_meters > 0:
+            distance_increments = (distance_meters // 50) + (1 if distance_meters % 50 > 0 else 0)
+            location_fees['parking_distance'] = distance_increments * pricing.parking_distance_per_50m
+
+    # Building restrictions
+    restrictions = access_data.get('building_restrictions', [])
+    if 'narrow_stairs' in restrictions or 'narrow_doorways' in restrictions or 'narrow_hallway' in restrictions:
+        location_fees['narrow_access'] = pricing.narrow_access_fee
+
+    if 'time_restrictions' in restrictions:
+        location_fees['time_restrictions'] = pricing.time_restriction_fee
+
+    if 'booking_required' in restrictions:
+        location_fees['booking_required'] = pricing.booking_required_fee
+
+    # Outdoor access
+    outdoor_access = access_data.get('outdoor_access', 'direct')
+    if outdoor_access in ('path', 'steps'):
+        location_fees['outdoor_path'] = pricing.outdoor_path_fee
+
+    if outdoor_access == 'steps':
+        # Outdoor steps pricing (per 5 steps)
+        outdoor_steps = access_data.get('outdoor_steps', 0)
+        if outdoor_steps > 0:
+            step_increments = (outdoor_steps // 5) + (1 if outdoor_steps % 5 > 0 else 0)
+            location_fees['outdoor_steps'] = step_increments * pricing.outdoor_steps_per_5
+
+    return sum(location_fees.values()), location_fees
+
+
+def quote(columns: InventoryColumns, pricing: PricingSnapshot, inputs: QuoteInputs) -> dict:
+    """
+    Price one job
+
+    Args:
+        columns: Job inventory in column form
+        pricing: Company pricing snapshot
+        inputs: Price-affecting job fields
+
+    Returns:
+        Quote dict (estimates, totals, breakdowns) as rendered by the quote templates
+    """
+    totals = inventory_totals(columns, pricing)
+    total_items = totals["total_items"]
+    total_cbm = totals["total_cbm"]
+    total_weight_kg = totals["total_weight_kg"]
+    bulky_items = totals["bulky_items"]
+    fragile_items = totals["fragile_items"]
+
+    # Professional pricing using company's custom rates
+    base_price = pricing.callout_fee
+    cbm_price = total_cbm * pricing.price_per_cbm
+    bulky_surcharge = bulky_items * pricing.bulky_item_fee
+    fragile_surcharge = fragile_items * pricing.fragile_item_fee
+
+    # Weight-based pricing
+    weight_price = 0
+    if total_weight_kg > pricing.weight_threshold_kg:
+        weight_price = (total_weight_kg - pricing.weight_threshold_kg) * pricing.price_per_kg_over_threshold
+
+    # Distance pricing: miles over base distance × price per mile
+    miles = distance_miles(inputs.pickup, inputs.dropoff)
+    distance_price = 0
+    if miles:
+        base_distance = pricing.base_distance_km * 0.621371  # Convert km to miles
+        price_per_mile = pricing.price_per_km * 1.60934  # Convert per-km to per-mile
+        if miles > base_distance:
+            distance_price = (miles - base_distance) * price_per_mile
+
+    # Access difficulty pricing
+    pickup_access_total, pickup_access_fees = location_access_fees(inputs.pickup_access, pricing)
+    dropoff_access_total, dropoff_access_fees = location_access_fees(inputs.dropoff_access, pricing)
+    access_price = pickup_access_total + dropoff_access_total
+    access_breakdown = {"pickup": pickup_access_fees, "dropoff": dropoff_access_fees}
+
+    # Packing materials and packing service labour
+    packing_data = packing_materials(columns, pricing, total_cbm, inputs.customer_provides_packing)
+    packing_price = packing_data['total_cost']
+    packing_service_data = packing_service(columns, pricing, inputs.packing_service_rooms)
+    packing_service_price = packing_service_data['total_cost']
+
+    total = base_price + cbm_price + bulky_surcharge + fragile_surcharge + weight_price + distance_price + access_price + packing_price + packing_service_price
+
+    # Apply company's estimate multipliers
+    estimate_low = int(total * pricing.estimate_low_multiplier)
+    estimate_high = int(total * pricing.estimate_high_multiplier)
+
+    # Determine confidence based on completeness
+    if total_items < 5 or total_cbm < 1:
+        confidence = "Low - Need more photos"
+    elif total_items < 20 or total_cbm < 5:
+        confidence = "Medium"
+    else:
+        confidence = "High"
+
+    return {
+        "estimate_low": inputs.custom_price_low or estimate_low,
+        "estimate_high": inputs.custom_price_high or estimate_high,
+        "ai_estimate_low": estimate_low,
+        "ai_estimate_high": estimate_high,
+        "has_custom_price": bool(inputs.custom_price_low),
+        "total_items": total_items,
+        "bulky_items": bulky_items,
+        "fragile_items": fragile_items,
+        "total_cbm": round(total_cbm, 2),
+        "total_weight_kg": round(total_weight_kg, 0),
+        "confidence": confidence,
+        "distance_miles": round(miles, 1),
+        "breakdown": {
+            "base": base_price,
+            "volume": round(cbm_price, 2),
+            "bulky": bulky_surcharge,
+            "fragile": fragile_surcharge,
+            "weight": round(weight_price, 2),
+            "distance": distance_price,
+            "access": round(access_price, 2),
+            "packing": round(packing_price, 2),
+            "packing_service": round(packing_service_price, 2)
+        },
+        "access_breakdown": access_breakdown,
+        "packing_breakdown": packing_data['breakdown'],
+        "packing_service_breakdown": packing_service_data
+    }
+
+
+def price_distribution(values) -> Dict[str, Any]:
+    """Summary statistics (count, min, quartiles, max, mean) for a list of prices"""
+    values = sorted(values)
+    if not values:
+        return {"count": 0, "min": 0, "p25": 0, "median": 0, "p75": 0, "max": 0, "mean": 0}
+
+    def percentile(p):
+        index = (len(values) - 1) * p
+        lower = int(index)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+    return {
+        "count": len(values),
+        "min": values[0],
+        "p25": round(percentile(0.25), 2),
+        "median": round(percentile(0.5), 2),
+        "p75": round(percentile(0.75), 2),
+        "max": values[-1],
+        "mean": round(sum(values) / len(values), 2),
+    }
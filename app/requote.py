@@ -0,0 +1,137 @@
+"""
+Batch re-quoting for PrimeHaul OS
+Re-prices a company's recent submitted jobs under proposed pricing so a boss
+can see the impact of a rate change before saving it. Jobs are streamed in
+fixed-size chunks, each loaded with a couple of set-based queries.
+"""
+
+import logging
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.inventory import load_job_inventories
+from app.models import Job
+from app import quote_engine
+
+logger = logging.getLogger(__name__)
+
+REQUOTE_CHUNK_SIZE = 100
+REQUOTE_MAX_JOBS = 2000
+
+
+def iter_recent_submitted_jobs(
+    company_id,
+    db: Session,
+    limit: int = 200,
+    chunk_size: int = REQUOTE_CHUNK_SIZE,
+) -> Iterator[List[Tuple[str, quote_engine.InventoryColumns, quote_engine.QuoteInputs]]]:
+    """
+    Yield the company's last `limit` submitted jobs in chunks
+
+    Each chunk is one query for the job fields plus one for all their rooms
+    and items, so memory is bounded by chunk_size rather than limit.
+
+    Yields:
+        Lists of (job_id, InventoryColumns, QuoteInputs)
+    """
+    job_ids = [
+        job_id for (job_id,) in db.query(Job.id)
+        .filter(Job.company_id == company_id, Job.submitted_at.isnot(None))
+        .order_by(Job.submitted_at.desc(), Job.id)
+        .limit(limit)
+    ]
+
+    for start in range(0, len(job_ids), chunk_size):
+        chunk = job_ids[start:start + chunk_size]
+        rows = db.query(
+            Job.id,
+            Job.pickup,
+            Job.dropoff,
+            Job.pickup_access,
+            Job.dropoff_access,
+            Job.customer_provides_packing,
+            Job.packing_service_rooms,
+            Job.custom_price_low,
+            Job.custom_price_high,
+        ).filter(Job.id.in_(chunk)).all()
+        inventories = load_job_inventories(chunk, db)
+
+        yield [
+            (
+                str(row.id),
+                quote_engine.InventoryColumns.from_inventory(inventories[str(row.id)]),
+                quote_engine.QuoteInputs.from_job(row),
+            )
+            for row in rows
+        ]
+
+
+def preview_pricing_change(
+    company_id,
+    current: quote_engine.PricingSnapshot,
+    proposed: quote_engine.PricingSnapshot,
+    db: Session,
+    limit: int = 200,
+    chunk_size: int = REQUOTE_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Re-quote recent submitted jobs under current and proposed pricing
+
+    Compares the engine's own estimates (ignoring admin custom prices) so the
+    result reflects the rate change alone.
+
+    Args:
+        company_id: Company UUID
+        current: Pricing in force today
+        proposed: Pricing being previewed
+        db: Database session
+        limit: Number of most recently submitted jobs to re-quote
+        chunk_size: Jobs loaded per round of queries
+
+    Returns:
+        Dict with job count, old/new estimate distributions and how many
+        jobs go up, down or stay the same
+    """
+    limit = max(1, min(limit, REQUOTE_MAX_JOBS))
+    old_low, old_high, new_low, new_high, change_pct = [], [], [], [], []
+    increased = decreased = unchanged = 0
+
+    for chunk in iter_recent_submitted_jobs(company_id, db, limit=limit, chunk_size=chunk_size):
+        for job_id, columns, inputs in chunk:
+            before = quote_engine.quote(columns, current, inputs)
+            after = quote_engine.quote(columns, proposed, inputs)
+
+            old_low.append(before["ai_estimate_low"])
+            old_high.append(before["ai_estimate_high"])
+            new_low.append(after["ai_estimate_low"])
+            new_high.append(after["ai_estimate_high"])
+
+            old_mid = (before["ai_estimate_low"] + before["ai_estimate_high"]) / 2
+            new_mid = (after["ai_estimate_low"] + after["ai_estimate_high"]) / 2
+            if new_mid > old_mid:
+                increased += 1
+            elif new_mid < old_mid:
+                decreased += 1
+            else:
+                unchanged += 1
+            if old_mid:
+                change_pct.append(round((new_mid - old_mid) / old_mid * 100, 2))
+
+    logger.info(f"Pricing preview re-quoted {len(old_low)} jobs for company {company_id}")
+
+    return {
+        "jobs": len(old_low),
+        "old": {
+            "estimate_low": quote_engine.price_distribution(old_low),
+            "estimate_high": quote_engine.price_distribution(old_high),
+        },
+        "new": {
+            "estimate_low": quote_engine.price_distribution(new_low),
+            "estimate_high": quote_engine.price_distribution(new_high),
+        },
+        "change_pct": quote_engine.price_distribution(change_pct),
+        "increased": increased,
+        "decreased": decreased,
+        "unchanged": unchanged,
+    }
@@ -4,6 +4,10 @@
  * Automatically tracks all user interactions for machine learning training.
  * Captures: page views, clicks, scrolls, form inputs, time on page, etc.
  *
+ * Events are queued and posted together to /api/track/batch: every
+ * flushIntervalMs, as soon as maxBatchEvents are waiting, and (with
+ * sendBeacon) when the page is hidden or closed.
+ *
  * Usage: Include this script on ALL customer-facing pages
  * <script src="/static/tracker.js"></script>
  */
@@ -13,9 +17,13 @@
 
     // Configuration
     const TRACKER_CONFIG = {
-        endpoint: '/api/track',
-        throttleMs: 1000,  // Don't send more than once per second
-        debug: false       // Set to true for console logging
+        endpoint: '/api/track/batch',
+        throttleMs: 1000,        // Scroll/input events at most once per second
+        flushIntervalMs: 5000,   // Send queued events at least this often
+        maxBatchEvents: 20,      // Send straight away once this many are queued
+        maxQueuedEvents: 200,    // Drop the oldest beyond this (e.g. while offline)
+        gzipMinBytes: 1024,      // Compress larger batches where the browser can
+        debug: false             // Set to true for console logging
     };
 
     // Session management
@@ -52,55 +60,113 @@
         return match ? match[1] : null;
     }
 
+    // Events waiting to be sent
+    let queue = [];
+    let flushTimer = null;
+    let pageExitTracked = false;
+
     /**
-     * Send tracking event to backend
+     * Queue tracking event (compact keys, see app/tracking.py parse_batch)
      */
     function sendEvent(data) {
         try {
-            const formData = new FormData();
-            formData.append('event_type', data.event_type);
-            formData.append('page_url', window.location.pathname);
-            formData.append('session_id', sessionId);
+            const event = { t: data.event_type, at: Date.now() };
+            if (data.element_id) event.id = String(data.element_id);
+            if (data.element_text) event.x = data.element_text;
+            if (data.time_spent_seconds !== undefined) event.d = data.time_spent_seconds;
+            if (data.scroll_depth_percent !== undefined) event.sd = data.scroll_depth_percent;
+            if (data.metadata) event.m = data.metadata;
+
+            queue.push(event);
+            if (queue.length > TRACKER_CONFIG.maxQueuedEvents) {
+                queue.splice(0, queue.length - TRACKER_CONFIG.maxQueuedEvents);
+            }
 
-            if (jobToken) {
-                formData.append('job_token', jobToken);
+            if (queue.length >= TRACKER_CONFIG.maxBatchEvents) {
+                flush(false);
+            } else if (!flushTimer) {
+                flushTimer = setTimeout(function() { flush(false); }, TRACKER_CONFIG.flushIntervalMs);
             }
 
-            // Optional fields
-            if (data.element_id) formData.append('element_id', data.element_id);
-            if (data.element_text) formData.append('element_text', data.element_text);
-            if (data.time_spent_seconds !== undefined) formData.append('time_spent_seconds', data.time_spent_seconds);
-            if (data.scroll_depth_percent !== undefined) formData.append('scroll_depth_percent', data.scroll_depth_percent);
+            if (TRACKER_CONFIG.debug) {
+                console.log('📊 Tracked:', data.event_type, data);
+            }
+        } catch (err) {
+            // Silently fail - don't break user experience
+            if (TRACKER_CONFIG.debug) {
+                console.error('Tracking error:', err);
+            }
+        }
+    }
+
+    /**
+     * Send queued events in one request
+     * Shared fields go in the envelope once; each event carries its age in ms.
+     */
+    function flush(unloading) {
+        if (flushTimer) {
+            clearTimeout(flushTimer);
+            flushTimer = null;
+        }
+        if (!queue.length) return;
 
-            // Screen dimensions
-            formData.append('screen_width', window.screen.width);
-            formData.append('screen_height', window.screen.height);
+        const now = Date.now();
+        const events = queue.map(function(event) {
+            const compact = Object.assign({}, event, { a: now - event.at });
+            delete compact.at;
+            return compact;
+        });
+        queue = [];
+
+        const batch = {
+            s: sessionId,
+            p: window.location.pathname,
+            w: window.screen.width,
+            h: window.screen.height,
+            e: events
+        };
+        if (jobToken) batch.j = jobToken;
+        const body = JSON.stringify(batch);
 
-            // Additional metadata
-            if (data.metadata) {
-                formData.append('metadata', JSON.stringify(data.metadata));
+        try {
+            // sendBeacon survives the page being closed
+            if (unloading && navigator.sendBeacon &&
+                navigator.sendBeacon(TRACKER_CONFIG.endpoint, new Blob([body], { type: 'application/json' }))) {
+                return;
             }
+            post(body, unloading);
+        } catch (err) {
+            if (TRACKER_CONFIG.debug) {
+                console.error('Tracking error:', err);
+            }
+        }
+    }
 
-            // Send asynchronously (don't wait for response)
-            fetch(TRACKER_CONFIG.endpoint, {
+    function post(body, unloading) {
+        const send = function(payload, headers) {
+            return fetch(TRACKER_CONFIG.endpoint, {
                 method: 'POST',
-                body: formData,
+                body: payload,
+                headers: headers,
                 keepalive: true  // Keep request alive even if user navigates away
-            }).catch(err => {
-                if (TRACKER_CONFIG.debug) {
-                    console.error('Tracking error:', err);
-                }
             });
+        };
+        const json = { 'Content-Type': 'application/json' };
 
-            if (TRACKER_CONFIG.debug) {
-                console.log('📊 Tracked:', data.event_type, data);
-            }
-        } catch (err) {
-            // Silently fail - don't break user experience
+        let request;
+        if (!unloading && body.length >= TRACKER_CONFIG.gzipMinBytes && 'CompressionStream' in window) {
+            const gzipped = new Blob([body]).stream().pipeThrough(new CompressionStream('gzip'));
+            request = new Response(gzipped).blob().then(function(blob) {
+                return send(blob, Object.assign({ 'Content-Encoding': 'gzip' }, json));
+            });
+        } else {
+            request = send(body, json);
+        }
+        request.catch(function(err) {
             if (TRACKER_CONFIG.debug) {
                 console.error('Tracking error:', err);
             }
-        }
+        });
     }
 
     /**
@@ -177,26 +243,18 @@
     }, TRACKER_CONFIG.throttleMs);
 
     /**
-     * Track page exit (time spent)
+     * Track page exit (time spent) and send everything still queued
      */
     function trackPageExit() {
-        const timeSpent = (Date.now() - pageLoadTime) / 1000;  // Convert to seconds
-
-        // Use sendBeacon for reliability on page unload
-        const data = new FormData();
-        data.append('event_type', 'page_exit');
-        data.append('page_url', window.location.pathname);
-        data.append('session_id', sessionId);
-        data.append('time_spent_seconds', timeSpent);
-        data.append('scroll_depth_percent', maxScrollDepth);
-        data.append('screen_width', window.screen.width);
-        data.append('screen_height', window.screen.height);
-
-        if (jobToken) {
-            data.append('job_token', jobToken);
+        if (!pageExitTracked) {
+            pageExitTracked = true;
+            sendEvent({
+                event_type: 'page_exit',
+                time_spent_seconds: (Date.now() - pageLoadTime) / 1000,  // Convert to seconds
+                scroll_depth_percent: maxScrollDepth
+            });
         }
-
-        navigator.sendBeacon(TRACKER_CONFIG.endpoint, data);
+        flush(true);
     }
 
     /**
@@ -280,13 +338,14 @@
     window.addEventListener('beforeunload', trackPageExit);
     window.addEventListener('pagehide', trackPageExit);  // Mobile Safari
 
-    // Track visibility changes (tab switching)
+    // Track visibility changes (tab switching); hidden pages may never come back, so send now
     document.addEventListener('visibilitychange', function() {
         if (document.hidden) {
             sendEvent({
                 event_type: 'tab_hidden',
                 time_spent_seconds: (Date.now() - pageLoadTime) / 1000
             });
+            flush(true);
         } else {
             sendEvent({
                 event_type: 'tab_visible'
@@ -309,6 +368,7 @@
     // Expose API for custom tracking
     window.PrimeHaulTracker = {
         track: sendEvent,
+        flush: function() { flush(false); },
         trackPhotoUpload: window.trackPhotoUpload,
         trackError: window.trackError,
         sessionId: sessionId,
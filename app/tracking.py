@@ -0,0 +1,451 @@
+"""
+Buffered interaction tracking for PrimeHaul OS
+tracker.js reports page views, clicks, scrolls and exits for every customer,
+so /api/track can see far more requests than the pages themselves. Instead of
+an INSERT and COMMIT per event, the endpoint appends a row to this process's
+ring buffer and returns; a background task writes buffered rows with one
+multi-row INSERT every TRACKING_FLUSH_MS, or sooner once TRACKING_FLUSH_EVENTS
+are waiting.
+
+The buffer holds at most TRACKING_BUFFER_SIZE rows. When it is full the oldest
+row is dropped and counted, so a slow database costs tracking data rather than
+memory. If the database is unreachable, a flush puts its rows back at the front
+of the buffer and the flusher backs off (up to MAX_RETRY_SECONDS) before trying
+again. Remaining rows are flushed on shutdown; rows still buffered if the
+process is killed are lost.
+
+tracker.js batches events client-side and posts them to /api/track/batch
+(see parse_batch for the wire format).
+"""
+
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import UserInteraction
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_EVENTS = 200
+MAX_BATCH_BYTES = 256 * 1024  # Both as sent and after gzip decoding
+MAX_EVENT_AGE_MS = 10 * 60 * 1000
+MAX_SCREEN_PIXELS = 100000
+MAX_TIME_SPENT_SECONDS = 7 * 24 * 3600
+MAX_RETRY_SECONDS = 30
+MAX_METADATA_DEPTH = 8
+MAX_METADATA_BYTES = 4096
+
+
+class BatchTooLarge(ValueError):
+    """Batch body over MAX_BATCH_BYTES"""
+
+
+class DatabaseUnavailable(Exception):
+    """A flush could not reach the database; `rows` were not written"""
+
+    def __init__(self, rows: List[Dict[str, Any]], error: Exception):
+        super().__init__(str(error))
+        self.rows = rows
+
+
+class InteractionBuffer:
+    """Bounded in-memory queue of user_interactions rows awaiting a bulk insert"""
+
+    def __init__(self, max_size: int):
+        self._rows = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.last_flush_ms = None
+
+    def add(self, row: Dict[str, Any]):
+        """Queue one row (never blocks, never touches the database)"""
+        self.extend([row])
+
+    def extend(self, rows: List[Dict[str, Any]]):
+        """Queue several rows, dropping the oldest if the buffer overflows"""
+        with self._lock:
+            overflow = len(self._rows) + len(rows) - self._rows.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._rows.extend(rows)
+            pending = len(self._rows)
+        if pending >= settings.TRACKING_FLUSH_EVENTS:
+            self._wake()
+
+    def _wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # Loop closed during shutdown
+
+    def take(self) -> List[Dict[str, Any]]:
+        """Remove and return every buffered row"""
+        with self._lock:
+            rows = list(self._rows)
+            self._rows.clear()
+        return rows
+
+    def requeue(self, rows: List[Dict[str, Any]]):
+        """Put unwritten rows back at the front, keeping the newest of them if they no longer fit"""
+        with self._lock:
+            room = self._rows.maxlen - len(self._rows)
+            keep = rows[len(rows) - room:] if room < len(rows) else rows
+            self.dropped += len(rows) - len(keep)
+            self._rows.extendleft(reversed(keep))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    async def flush(self, db: AsyncSession) -> int:
+        """
+        Write every buffered row in one multi-row INSERT; returns the number written
+
+        Raises:
+            DatabaseUnavailable: The database could not be reached (unwritten rows are requeued)
+        """
+        rows = self.take()
+        if not rows:
+            return 0
+        started = time.monotonic()
+        flushed = self.flushed
+        try:
+            await self._insert(db, rows)
+        except DatabaseUnavailable as e:
+            self.requeue(e.rows)
+            raise
+        finally:
+            self.last_flush_ms = round((time.monotonic() - started) * 1000, 1)
+        return self.flushed - flushed
+
+    async def _insert(self, db: AsyncSession, rows: List[Dict[str, Any]]):
+        """
+        Insert rows in one statement; if the database rejects the data, retry each half
+
+        A row the database rejects only loses itself (counted as failed), not
+        the rest of the batch. Any other error (connection, pool timeout)
+        raises DatabaseUnavailable with every row not yet written.
+        """
+        try:
+            await db.execute(insert(UserInteraction), rows)
+            await db.commit()
+            self.flushed += len(rows)
+            return
+        except (DataError, IntegrityError) as e:
+            await db.rollback()
+            if len(rows) == 1:
+                self.failed += 1
+                logger.error(f"Could not write tracked interaction: {e}")
+                return
+        except Exception as e:
+            try:
+                await db.rollback()
+            except Exception:
+                pass  # Connection already gone
+            raise DatabaseUnavailable(rows, e) from e
+
+        middle = len(rows) // 2
+        try:
+            await self._insert(db, rows[:middle])
+        except DatabaseUnavailable as e:
+            e.rows.extend(rows[middle:])
+            raise
+        await self._insert(db, rows[middle:])
+
+    async def _flush_new_session(self):
+        from app.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            await self.flush(db)
+
+    async def _run(self):
+        """Flush on each wakeup or interval until stop() (a flush in progress always completes)"""
+        retry_seconds = 0
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.TRACKING_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                await self._flush_new_session()
+                retry_seconds = 0
+            except Exception as e:
+                retry_seconds = min(max(retry_seconds * 2, 1), MAX_RETRY_SECONDS)
+                logger.error(f"Tracked interaction flush failed, retrying in {retry_seconds}s: {e}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=retry_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        """Start the background flusher on the running event loop"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background flusher and write whatever is still buffered
+
+        The flusher is asked to stop rather than cancelled, so rows it has
+        already taken from the buffer are written (or requeued) first.
+        """
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        self._loop = None
+        self._wakeup = None
+        self._stopping = None
+        try:
+            await self._flush_new_session()
+        except DatabaseUnavailable as e:
+            logger.error(f"Could not write {len(self)} tracked interactions on shutdown: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self),
+            "capacity": self._rows.maxlen,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+buffer = InteractionBuffer(settings.TRACKING_BUFFER_SIZE)
+
+
+def device_type(user_agent: str) -> str:
+    """mobile, tablet or desktop from a User-Agent header"""
+    lowered = user_agent.lower()
+    if 'mobile' in lowered:
+        return 'mobile'
+    if 'tablet' in lowered:
+        return 'tablet'
+    return 'desktop'
+
+
+INT_MAX = 2 ** 31 - 1  # PostgreSQL INTEGER
+
+
+def _clip(value: Optional[str], length: int) -> Optional[str]:
+    """String without NUL bytes (PostgreSQL rejects them), cut to the column length"""
+    return value.replace("\x00", "")[:length] if value else None
+
+
+def _int_or_none(value, low: int = 0, high: int = INT_MAX) -> Optional[int]:
+    """An integer column value, or None if missing or out of range"""
+    if value is None or isinstance(value, bool) or not low <= value <= high:
+        return None
+    return int(value)
+
+
+def _float_or_none(value) -> Optional[float]:
+    if value is None or isinstance(value, bool) or not math.isfinite(value):
+        return None
+    return float(value)
+
+
+def _is_metadata(value) -> bool:
+    """A metadata object no deeper than MAX_METADATA_DEPTH and at most MAX_METADATA_BYTES as JSON"""
+    if not isinstance(value, dict):
+        return False
+    pending = [(value, 1)]
+    while pending:
+        item, depth = pending.pop()
+        if depth > MAX_METADATA_DEPTH:
+            return False
+        if isinstance(item, dict):
+            pending.extend((child, depth + 1) for child in item.values())
+        elif isinstance(item, list):
+            pending.extend((child, depth + 1) for child in item)
+    return len(json.dumps(value)) <= MAX_METADATA_BYTES
+
+
+def _scrub(value):
+    """JSON metadata without NUL characters (not allowed in PostgreSQL JSONB text)"""
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, dict):
+        return {_scrub(key): _scrub(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_scrub(item) for item in value]
+    return value
+
+
+def interaction_row(request, event: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+    """
+    A user_interactions row for one tracked event
+
+    Device, browser, IP and company come from the request; recorded_at is the
+    time the event arrived (less its age_ms, for batched events), not when the
+    buffer is flushed. Strings lose NUL bytes and are cut to their column
+    lengths, out-of-range numbers become NULL and oversized or deeply nested
+    metadata is dropped, so the row always inserts.
+    """
+    user_agent = request.headers.get('user-agent', '')
+    company = getattr(request.state, 'company', None)
+    metadata = event.get("metadata")
+    return {
+        "id": uuid.uuid4(),
+        "session_id": _clip(session_id, 100) or str(uuid.uuid4()),
+        "job_token": _clip(event.get("job_token"), 50),
+        "company_id": company.id if company is not None else None,
+        "event_type": _clip(event["event_type"], 50) or "unknown",
+        "page_url": _clip(event["page_url"], 500) or "/",
+        "element_id": _clip(event.get("element_id"), 200),
+        "element_text": _clip(event.get("element_text"), 200),
+        "time_spent_seconds": _float_or_none(event.get("time_spent_seconds")),
+        "scroll_depth_percent": _int_or_none(event.get("scroll_depth_percent"), 0, 100),
+        "device_type": device_type(user_agent),
+        "browser": _clip(user_agent.split()[0] if user_agent else 'unknown', 100),
+        "screen_width": _int_or_none(event.get("screen_width")),
+        "screen_height": _int_or_none(event.get("screen_height")),
+        "ip_address": _clip(request.client.host if request.client else None, 45),
+        "user_agent": _clip(user_agent, 500),
+        "interaction_metadata": _scrub(metadata) if _is_metadata(metadata) else {},
+        "recorded_at": datetime.utcnow() - timedelta(milliseconds=event.get("age_ms") or 0),
+    }
+
+
+def _is_number(value) -> bool:
+    """A finite int or float (JSON allows 1e400, which parses as infinity)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_screen_size(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= MAX_SCREEN_PIXELS
+
+
+def _reject_constant(name: str):
+    raise ValueError(f"{name} is not allowed")
+
+
+def _is_text(value) -> bool:
+    return isinstance(value, str)
+
+
+def _optional(event: Dict[str, Any], key: str, check) -> Any:
+    value = event.get(key)
+    if value is not None and not check(value):
+        raise ValueError(f"invalid {key!r}")
+    return value
+
+
+def _batch_event(raw: Any, envelope: Dict[str, Any]) -> Dict[str, Any]:
+    """One compact batch event as interaction_row fields (ValueError if malformed)"""
+    if not isinstance(raw, dict):
+        raise ValueError("event is not an object")
+    event_type = raw.get("t")
+    if not isinstance(event_type, str) or not event_type:
+        raise ValueError("missing 't'")
+    scroll_depth = _optional(raw, "sd", _is_number)
+    age_ms = _optional(raw, "a", lambda value: _is_number(value) and value >= 0)
+    time_spent = _optional(raw, "d", lambda value: _is_number(value) and 0 <= value <= MAX_TIME_SPENT_SECONDS)
+    return {
+        "event_type": event_type,
+        "page_url": _optional(raw, "p", _is_text) or envelope["p"],
+        "job_token": envelope.get("j"),
+        "element_id": _optional(raw, "id", _is_text),
+        "element_text": _optional(raw, "x", _is_text),
+        "time_spent_seconds": time_spent,
+        "scroll_depth_percent": min(max(int(scroll_depth), 0), 100) if scroll_depth is not None else None,
+        "screen_width": envelope.get("w"),
+        "screen_height": envelope.get("h"),
+        "metadata": _optional(raw, "m", _is_metadata),
+        "age_ms": min(age_ms or 0, MAX_EVENT_AGE_MS),
+    }
+
+
+def parse_batch(body: bytes, content_encoding: str = None) -> Tuple[Optional[str], List[Dict[str, Any]], int]:
+    """
+    Decode a tracker.js batch into (session_id, events, rejected count)
+
+    The body is JSON, optionally gzip-encoded. Fields shared by every event
+    are sent once:
+
+        {"s": session_id, "j": job_token, "p": page_url, "w": screen_width,
+         "h": screen_height,
+         "e": [{"t": event_type, "a": age_ms, "id": element_id, "x": element_text,
+                "d": time_spent_seconds, "sd": scroll_depth_percent,
+                "m": {metadata}, "p": page_url override}, ...]}
+
+    A malformed envelope raises ValueError; malformed events (including
+    metadata nested deeper than MAX_METADATA_DEPTH or larger than
+    MAX_METADATA_BYTES) are skipped and counted as rejected.
+    """
+    if content_encoding and content_encoding.lower() == "gzip":
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decoder.decompress(body, MAX_BATCH_BYTES + 1)
+        except zlib.error:
+            raise ValueError("invalid gzip body")
+    if len(body) > MAX_BATCH_BYTES:
+        raise BatchTooLarge("batch too large")
+
+    try:
+        envelope = json.loads(body, parse_constant=_reject_constant)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("body is not JSON")
+    except RecursionError:
+        raise ValueError("body is nested too deeply")
+    if not isinstance(envelope, dict):
+        raise ValueError("batch is not an object")
+    raw_events = envelope.get("e")
+    if not isinstance(raw_events, list) or not raw_events:
+        raise ValueError("missing events")
+    if len(raw_events) > MAX_BATCH_EVENTS:
+        raise ValueError(f"more than {MAX_BATCH_EVENTS} events")
+    if not isinstance(envelope.get("p"), str) or not envelope["p"]:
+        raise ValueError("missing 'p'")
+    for key, check in (("s", _is_text), ("j", _is_text), ("w", _is_screen_size), ("h", _is_screen_size)):
+        _optional(envelope, key, check)
+
+    events = []
+    for raw in raw_events:
+        try:
+            events.append(_batch_event(raw, envelope))
+        except ValueError:
+            continue
+    return envelope.get("s"), events, len(raw_events) - len(events)
+
+
+async def read_batch_body(request) -> bytes:
+    """Request body, refusing (BatchTooLarge) anything over MAX_BATCH_BYTES before reading it all"""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_BATCH_BYTES:
+        raise BatchTooLarge("batch too large")
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_BATCH_BYTES:
+            raise BatchTooLarge("batch too large")
+    return bytes(body)
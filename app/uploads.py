@@ -0,0 +1,99 @@
+"""
+Upload ingestion for PrimeHaul OS
+Streams an UploadFile to disk in fixed-size chunks, hashing as it goes and
+aborting as soon as the size cap is passed, so peak memory per upload is a
+few chunks rather than the whole file.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+import aiofiles
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 256 * 1024  # 256KB
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds its size cap (the partial file is removed)"""
+
+
+@dataclass
+class IngestedUpload:
+    """An upload spooled to a temporary file next to its final location"""
+    path: Path
+    size: int
+    sha256: str
+    filename: str
+    content_type: str
+
+    def move_to(self, dest: Path) -> Path:
+        """Atomically move the spooled file to its final path"""
+        os.replace(self.path, dest)
+        self.path = Path(dest)
+        return self.path
+
+    def discard(self):
+        """Delete the spooled file if it is still around"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def ingest_upload(upload: UploadFile, directory: Path, max_bytes: int) -> IngestedUpload:
+    """
+    Stream an upload into a temporary file inside `directory`
+
+    The temp file lives in the destination directory so move_to() is a cheap
+    rename on the same filesystem.
+
+    Args:
+        upload: Incoming file
+        directory: Directory to spool into (created if missing)
+        max_bytes: Size cap; the upload is aborted once it is exceeded
+
+    Returns:
+        IngestedUpload with the temp path, byte size and SHA-256 hex digest
+
+    Raises:
+        UploadTooLarge: If the upload exceeds max_bytes
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".part")
+    os.close(fd)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_name, 'wb') as out_file:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{upload.filename} exceeds {max_bytes // (1024 * 1024)}MB")
+                digest.update(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return IngestedUpload(
+        path=Path(tmp_name),
+        size=size,
+        sha256=digest.hexdigest(),
+        filename=upload.filename or "",
+        content_type=upload.content_type or "",
+    )
@@ -0,0 +1,115 @@
+"""
+Authenticated user cache for PrimeHaul OS
+Admin pages (and the dashboard auto-refresh poll) authenticate on every
+request. This keeps, per process:
+
+- decoded access token → user column values for AUTH_USER_CACHE_SECONDS, so a
+  repeat request skips the JWT decode and the user lookup
+- when each user's last_login_at was last written, so "last seen" is stored
+  at most once every LAST_SEEN_UPDATE_MINUTES instead of on every request
+
+Deactivating or deleting a user drops their tokens from this process's
+cache as soon as it is flushed; other processes that already cached a token
+keep access for at most AUTH_USER_CACHE_SECONDS.
+"""
+
+import threading
+import time
+from copy import deepcopy
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.config import settings
+from app.models import User
+
+MAX_ENTRIES = 5000
+
+_entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_last_seen: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def get(token: str) -> Optional[User]:
+    """
+    Return a detached copy of the user a token was issued to, or None if not cached
+
+    Attach it to the request's session (Session.merge(user, load=False)) before
+    touching relationships.
+    """
+    with _lock:
+        entry = _entries.get(token)
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if expires_at < time.monotonic():
+            del _entries[token]
+            return None
+
+    user = User(**deepcopy(values))
+    make_transient_to_detached(user)
+    return user
+
+
+def put(token: str, user: User, token_exp: Optional[float] = None):
+    """Cache the active user a token resolved to (never beyond the token's exp)"""
+    ttl = settings.AUTH_USER_CACHE_SECONDS
+    if token_exp is not None:
+        ttl = min(ttl, token_exp - time.time())
+    if ttl <= 0:
+        return
+    values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+    now = time.monotonic()
+    with _lock:
+        if len(_entries) >= MAX_ENTRIES:
+            for key in [key for key, (expires_at, _) in _entries.items() if expires_at < now]:
+                del _entries[key]
+            if len(_entries) >= MAX_ENTRIES:
+                _entries.clear()
+        _entries[token] = (now + ttl, values)
+
+
+def invalidate(token: str = None):
+    """Drop one token (or, with no token, every cached user)"""
+    with _lock:
+        if token is None:
+            _entries.clear()
+            _last_seen.clear()
+        else:
+            _entries.pop(token, None)
+
+
+def invalidate_user(user_id):
+    """Drop every cached token of one user"""
+    with _lock:
+        for token in [token for token, (_, values) in _entries.items() if str(values["id"]) == str(user_id)]:
+            del _entries[token]
+        _last_seen.pop(str(user_id), None)
+
+
+@event.listens_for(User, "after_update")
+def _on_user_updated(mapper, connection, user):
+    if not user.is_active:
+        invalidate_user(user.id)
+
+
+@event.listens_for(User, "after_delete")
+def _on_user_deleted(mapper, connection, user):
+    invalidate_user(user.id)
+
+
+def last_seen_due(user_id) -> bool:
+    """
+    Whether this request should write the user's last_login_at
+
+    Returns True at most once per LAST_SEEN_UPDATE_MINUTES per user and process.
+    """
+    key = str(user_id)
+    now = time.monotonic()
+    with _lock:
+        last = _last_seen.get(key)
+        if last is not None and now - last < settings.LAST_SEEN_UPDATE_MINUTES * 60:
+            return False
+        _last_seen[key] = now
+        return True
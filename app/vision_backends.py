@@ -0,0 +1,220 @@
+"""
+Inventory vision backends for PrimeHaul OS
+The photo → inventory step is pluggable so the survey pipeline can run (and be
+load-tested) without the OpenAI API. Select a backend with VISION_BACKEND:
+
+- openai: GPT vision via ai_vision (production)
+- local: offline estimator built on models/furniture-detector-v1 category
+  profiles and FurnitureCatalog dimensions. That model has no image
+  classifier, so items are chosen from each photo's content hash rather than
+  recognised; use it to exercise the full pipeline with realistic data, not
+  for real quotes.
+- stub: deterministic canned items after VISION_STUB_LATENCY_MS, for
+  benchmarking our own overhead at hundreds of concurrent uploads.
+
+Every backend analyses one batch of photos (at most VISION_BATCH_SIZE) and
+returns the same {"items": [...], "summary": "..."} shape as the OpenAI call.
+"""
+
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app import ai_vision
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_backends: Dict[str, "VisionBackend"] = {}
+
+
+def _photo_seed(path: str) -> int:
+    """Stable per-photo number (photos are stored under their content hash, so this follows content)"""
+    return int(hashlib.sha256(Path(path).stem.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class VisionBackend(abc.ABC):
+    """Analyses one batch of photos into an inventory"""
+    name = "base"
+    cacheable = True  # Whether results go through the vision result cache
+
+    @property
+    def cache_model(self) -> str:
+        """Model identifier for the vision result cache key"""
+        return self.name
+
+    @abc.abstractmethod
+    async def analyze(self, image_paths: List[str], learned_guidance: str = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Inventory for one batch of photos ({"items": [...], "summary": "..."})"""
+
+
+class OpenAIBackend(VisionBackend):
+    """GPT vision on the shared AsyncOpenAI client"""
+    name = "openai"
+
+    @property
+    def cache_model(self) -> str:
+        return ai_vision.VISION_MODEL
+
+    async def analyze(self, image_paths: List[str], learned_guidance: str = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await ai_vision.extract_removal_inventory_async(
+            image_paths, learned_guidance=learned_guidance, timeout=timeout
+        )
+
+
+STUB_ITEMS = [
+    {"name": "3-seater fabric sofa", "length_cm": 200, "width_cm": 90, "height_cm": 85, "weight_kg": 30,
+     "item_category": "furniture", "packing_requirement": "none"},
+    {"name": "Double wardrobe", "length_cm": 120, "width_cm": 60, "height_cm": 190, "weight_kg": 80,
+     "item_category": "wardrobe", "packing_requirement": "none"},
+    {"name": "Dining table", "length_cm": 140, "width_cm": 90, "height_cm": 75, "weight_kg": 35,
+     "item_category": "furniture", "packing_requirement": "none"},
+    {"name": "Washing machine", "length_cm": 60, "width_cm": 60, "height_cm": 85, "weight_kg": 70,
+     "item_category": "furniture", "packing_requirement": "none"},
+    {"name": "TV (50 inch)", "length_cm": 115, "width_cm": 10, "height_cm": 70, "weight_kg": 15,
+     "item_category": "furniture", "packing_requirement": "none", "fragile": True},
+    {"name": "Kitchen crockery", "length_cm": 45, "width_cm": 45, "height_cm": 50, "weight_kg": 15,
+     "item_category": "loose_items", "packing_requirement": "medium_box", "fragile": True},
+    {"name": "Books", "length_cm": 45, "width_cm": 45, "height_cm": 25, "weight_kg": 15,
+     "item_category": "loose_items", "packing_requirement": "small_box"},
+    {"name": "Double bed", "length_cm": 140, "width_cm": 200, "height_cm": 50, "weight_kg": 40,
+     "item_category": "furniture", "packing_requirement": "none"},
+]
+
+
+def _finish_item(item: Dict[str, Any], qty: int) -> Dict[str, Any]:
+    """Fill in the derived fields the OpenAI prompt asks the model for"""
+    item = dict(item)
+    item["qty"] = qty
+    if "cbm" not in item:
+        item["cbm"] = round(item["length_cm"] * item["width_cm"] * item["height_cm"] / 1_000_000, 3)
+    item.setdefault("bulky", float(item.get("weight_kg") or 0) > 50)
+    item.setdefault("fragile", False)
+    item.setdefault("notes", "")
+    return item
+
+
+class StubBackend(VisionBackend):
+    """Deterministic canned inventory with configurable latency (no network, no database)"""
+    name = "stub"
+    cacheable = False  # Benchmarks should measure every call, and the cache would need the database
+
+    async def analyze(self, image_paths: List[str], learned_guidance: str = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        if settings.VISION_STUB_LATENCY_MS > 0:
+            await asyncio.sleep(settings.VISION_STUB_LATENCY_MS / 1000)
+
+        items: Dict[str, Dict[str, Any]] = {}
+        for path in image_paths:
+            seed = _photo_seed(path)
+            for offset in range(2):
+                template = STUB_ITEMS[(seed + offset) % len(STUB_ITEMS)]
+                items.setdefault(template["name"], _finish_item(template, 1 + (seed >> 8) % 2))
+        return {"items": list(items.values()), "summary": f"Stub analysis of {len(image_paths)} photos"}
+
+
+class LocalBackend(VisionBackend):
+    """Offline estimator from furniture-detector-v1 category profiles and FurnitureCatalog dimensions"""
+    name = "local"
+
+    def __init__(self):
+        self._profiles: Optional[Dict[str, Dict[str, Any]]] = None
+        self._catalog: Optional[Dict[str, Dict[str, float]]] = None
+
+    def _load(self):
+        """Read the model file and average catalog dimensions per category (once per process)"""
+        if self._profiles is None:
+            with open(settings.VISION_LOCAL_MODEL_PATH) as f:
+                model = json.load(f)
+            self._profiles = {
+                category: profile for category, profile in model.get("category_profiles", {}).items()
+                if category not in ("furniture", "other")
+            }
+            logger.info(f"Loaded local vision model {model.get('version')} ({len(self._profiles)} categories)")
+
+        if self._catalog is None:
+            self._catalog = {}
+            try:
+                from sqlalchemy import func
+                from app.database import SessionLocal
+                from app.models import FurnitureCatalog
+
+                db = SessionLocal()
+                try:
+                    rows = db.query(
+                        FurnitureCatalog.category,
+                        func.avg(FurnitureCatalog.length_cm),
+                        func.avg(FurnitureCatalog.width_cm),
+                        func.avg(FurnitureCatalog.height_cm),
+                        func.avg(FurnitureCatalog.weight_kg),
+                    ).group_by(FurnitureCatalog.category).all()
+                finally:
+                    db.close()
+                self._catalog = {
+                    category: {"length_cm": float(length), "width_cm": float(width),
+                               "height_cm": float(height), "weight_kg": float(weight)}
+                    for category, length, width, height, weight in rows
+                    if category and length and width and height and weight
+                }
+            except Exception as e:
+                logger.warning(f"Could not load furniture catalog for local vision backend: {e}")
+
+    def _estimate(self, image_paths: List[str]) -> Dict[str, Any]:
+        self._load()
+        categories = sorted(self._profiles)
+        if not categories:
+            return {"items": [], "summary": ""}
+
+        items: Dict[str, Dict[str, Any]] = {}
+        for path in image_paths:
+            category = categories[_photo_seed(path) % len(categories)]
+            if category in items:
+                continue
+            name = category.replace("_", " ").capitalize()
+            dims = self._catalog.get(category)
+            if dims:
+                items[category] = _finish_item({"name": name, **{k: round(v) for k, v in dims.items()},
+                                                "item_category": "furniture", "packing_requirement": "none"}, 1)
+            else:
+                profile = self._profiles[category]
+                items[category] = _finish_item({
+                    "name": name,
+                    "cbm": round(profile["avg_cbm"], 3),
+                    "weight_kg": round(profile["avg_weight"], 1),
+                    "item_category": "furniture",
+                    "packing_requirement": "none",
+                    "notes": "Estimated from category profile",
+                }, 1)
+        return {"items": list(items.values()), "summary": f"Local estimate from {len(image_paths)} photos"}
+
+    async def analyze(self, image_paths: List[str], learned_guidance: str = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._estimate, image_paths)
+
+
+BACKENDS = {
+    OpenAIBackend.name: OpenAIBackend,
+    LocalBackend.name: LocalBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def get_backend(name: str = None) -> VisionBackend:
+    """
+    The configured vision backend (one instance per process)
+
+    Raises:
+        ValueError: If VISION_BACKEND names an unknown backend
+    """
+    name = (name or settings.VISION_BACKEND).lower()
+    if name not in _backends:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown VISION_BACKEND '{name}' (expected one of: {', '.join(BACKENDS)})")
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
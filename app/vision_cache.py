@@ -0,0 +1,139 @@
+"""
+Vision result cache for PrimeHaul OS
+Stores raw AI vision results keyed by the analysed photos' content hashes, the
+model, the prompt version and the learned guidance, so retries, re-uploads and
+repeat bulk submissions are answered from the database instead of the API.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from copy import deepcopy
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import VisionResult
+
+logger = logging.getLogger(__name__)
+
+EVICT_INTERVAL_SECONDS = 300  # Per process; eviction counts the whole table
+
+_next_eviction = 0.0
+_eviction_lock = threading.Lock()
+
+
+def cache_key(image_hashes: Iterable[str], model: str, prompt_version: int, learned_guidance: Optional[str],
+              add_quantities: bool = False) -> str:
+    """
+    Build the cache key for an analysis
+
+    Image order does not matter (hashes are sorted); any change to the model,
+    prompt version, learned guidance or batch merge gives a new key.
+    """
+    guidance_hash = hashlib.sha256((learned_guidance or "").encode("utf-8")).hexdigest()
+    parts = [sorted(image_hashes), model, prompt_version, guidance_hash]
+    if add_quantities:
+        parts.append("add_quantities")
+    payload = json.dumps(parts)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _expiry_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(hours=settings.VISION_CACHE_TTL_HOURS)
+
+
+def get_cached_result(key: str, db: Session) -> Optional[Dict[str, Any]]:
+    """
+    Return a cached vision result, or None if missing or past its TTL
+
+    The returned dict is a copy, so callers may mutate it freely.
+    """
+    entry = db.query(VisionResult).filter(
+        VisionResult.cache_key == key,
+        VisionResult.created_at >= _expiry_cutoff()
+    ).first()
+    if entry is None:
+        return None
+
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_used_at = datetime.utcnow()
+    db.commit()
+    return deepcopy(entry.result)
+
+
+def store_result(key: str, result: Dict[str, Any], model: str, prompt_version: int, db: Session):
+    """
+    Cache a vision result, evicting expired or excess entries at most every
+    EVICT_INTERVAL_SECONDS
+
+    Empty or partial results are not cached so a failed or blank analysis
+    is retried. If another request cached the same key first, its entry is
+    kept (an expired entry for the key is replaced).
+    """
+    if not result or not result.get("items") or result.get("incomplete_batches"):
+        return
+
+    now = datetime.utcnow()
+    try:
+        with db.begin_nested():
+            db.query(VisionResult).filter(
+                VisionResult.cache_key == key,
+                VisionResult.created_at < _expiry_cutoff()
+            ).delete(synchronize_session=False)
+            db.add(VisionResult(
+                cache_key=key,
+                model=model,
+                prompt_version=prompt_version,
+                result=result,
+                created_at=now,
+                last_used_at=now,
+            ))
+    except IntegrityError:
+        logger.info("Vision result already cached by a concurrent request")
+    if _eviction_due():
+        evict(db)
+    db.commit()
+
+
+def _eviction_due() -> bool:
+    """Whether this process should evict now (claims the slot until the next interval)"""
+    global _next_eviction
+    with _eviction_lock:
+        now = time.monotonic()
+        if now < _next_eviction:
+            return False
+        _next_eviction = now + EVICT_INTERVAL_SECONDS
+        return True
+
+
+def evict(db: Session) -> int:
+    """
+    Delete expired entries, then the least recently used ones over the size cap
+
+    Returns:
+        Number of entries deleted
+    """
+    deleted = db.query(VisionResult).filter(
+        VisionResult.created_at < _expiry_cutoff()
+    ).delete(synchronize_session=False)
+
+    excess = db.query(VisionResult).count() - settings.VISION_CACHE_MAX_ENTRIES
+    if excess > 0:
+        oldest = [
+            key for (key,) in db.query(VisionResult.cache_key)
+            .order_by(VisionResult.last_used_at)
+            .limit(excess)
+        ]
+        deleted += db.query(VisionResult).filter(
+            VisionResult.cache_key.in_(oldest)
+        ).delete(synchronize_session=False)
+
+    if deleted:
+        logger.info(f"Evicted {deleted} cached vision results")
+    return deleted
@@ -11,7 +11,9 @@ import os
 import uuid
 
 # Set required env vars BEFORE any app imports
-os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+# In-memory, so sessions the app opens itself (outside the overridden
+# dependencies) never create a database file
+os.environ.setdefault("DATABASE_URL", "sqlite://")
 os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-not-for-production")
 os.environ.setdefault("SUPERADMIN_PASSWORD", "TestSuperAdmin123!")
 os.environ.setdefault("SALES_PASSWORD", "TestSalesPass123!")
@@ -34,16 +36,17 @@ def compile_jsonb_sqlite(type_, compiler, **kw):
 
 import pytest
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
 from app.models import Base
-from app.database import get_db
+from app.database import get_db, get_async_db, get_async_read_db, get_read_db
 from app.auth import hash_password, create_access_token
 
 
-# In-memory SQLite for tests
-TEST_DATABASE_URL = "sqlite://"
+# In-memory SQLite for tests, shared between the sync and async (aiosqlite) engines
+TEST_DATABASE_URL = "sqlite:///file:primehaul_test?mode=memory&cache=shared&uri=true"
 
 engine = create_engine(
     TEST_DATABASE_URL,
@@ -52,6 +55,11 @@ engine = create_engine(
 )
 TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The sync engine's connection keeps the shared database alive between async sessions
+async_engine = create_async_engine(TEST_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1),
+                                   poolclass=NullPool)
+TestAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(autouse=True)
 def setup_database():
@@ -71,9 +79,23 @@ def db():
         session.close()
 
 
+@pytest.fixture
+async def async_db():
+    """Provide an async (aiosqlite) session on its own in-memory database."""
+    async_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)()
+    try:
+        yield session
+    finally:
+        await session.close()
+        await async_engine.dispose()
+
+
 @pytest.fixture
 def app_client(db):
-    """Provide a TestClient with overridden DB dependency."""
+    """Provide a TestClient with overridden DB dependencies."""
     from app.main import app
     from starlette.testclient import TestClient
 
@@ -83,7 +105,14 @@ def app_client(db):
         finally:
             pass
 
+    async def override_get_async_db():
+        async with TestAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
     with TestClient(app, raise_server_exceptions=False) as client:
         yield client
     app.dependency_overrides.clear()
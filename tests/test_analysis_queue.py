@@ -0,0 +1,193 @@
+"""Tests for the background photo analysis queue."""
+
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def queued(db, test_company, tmp_path):
+    """A job with one room, one stored photo and a queued analysis for it."""
+    from app.analysis_queue import enqueue_analysis
+    from app.models import Job, Room, Photo
+
+    job = Job(id=uuid.uuid4(), company_id=test_company.id, token=uuid.uuid4().hex[:16])
+    db.add(job)
+    db.flush()
+    room = Room(id=uuid.uuid4(), job_id=job.id, name="Lounge")
+    db.add(room)
+    db.flush()
+
+    blob = tmp_path / "abc.jpg"
+    blob.write_bytes(b"jpeg")
+    photo = Photo(room_id=room.id, filename="abc.jpg", content_hash="abc", storage_path=str(blob))
+    db.add(photo)
+
+    analysis = enqueue_analysis(test_company.id, job.id, room.id, [photo], db)
+    db.commit()
+    return analysis
+
+
+def _fake_vision(monkeypatch, result=None, error=None):
+    from app import ai_vision
+
+    async def fake_extract(paths, learned_guidance=None, timeout=None):
+        if error:
+            raise Exception(error)
+        return result
+
+    monkeypatch.setattr(ai_vision, "extract_removal_inventory_async", fake_extract)
+
+
+class TestClaim:
+    def test_each_analysis_claimed_once(self, db, queued):
+        """Only one caller can claim a queued analysis."""
+        from app.analysis_queue import claim, claim_next
+
+        assert claim_next(db) == queued.id
+        assert claim(queued.id, db) is False
+        assert claim_next(db) is None
+
+    def test_stale_runs_are_reclaimed(self, db, queued):
+        """A run whose worker died is picked up again."""
+        from datetime import datetime, timedelta
+        from app.analysis_queue import claim_next
+
+        assert claim_next(db) == queued.id
+        queued.started_at = datetime.utcnow() - timedelta(hours=1)
+        db.commit()
+
+        assert claim_next(db) == queued.id
+        db.refresh(queued)
+        assert queued.attempts == 2
+
+
+class TestProcessAnalysis:
+    async def test_detected_items_are_saved(self, db, queued, monkeypatch):
+        """A processed analysis creates the room's items and finishes as done."""
+        from app.analysis_queue import claim, process_analysis
+        from app.models import Item, Job
+
+        _fake_vision(monkeypatch, {"items": [
+            {"name": "3-seater sofa", "qty": 1, "weight_kg": 30, "cbm": 1.5},
+            {"name": "Coffee table", "qty": 1},
+        ], "summary": "Lounge"})
+
+        assert claim(queued.id, db)
+        await process_analysis(queued.id, db)
+
+        db.refresh(queued)
+        assert queued.status == "done"
+        assert queued.items_detected == 2
+        assert db.query(Item).filter(Item.room_id == queued.room_id).count() == 2
+        assert db.query(Job).filter(Job.id == queued.job_id).first().inventory_revision == 1
+
+    async def test_training_rows_and_event_saved_with_items(self, db, queued, monkeypatch):
+        """Training rows reference their items and the analytics event records the count."""
+        from app.analysis_queue import claim, process_analysis
+        from app.models import Item, TrainingDataset, UsageAnalytics
+
+        _fake_vision(monkeypatch, {"items": [
+            {"name": "Wardrobe", "length_cm": 120, "width_cm": 60, "height_cm": 190, "weight_kg": 80},
+            {"name": "Lamp", "qty": 2},
+        ], "summary": "Bedroom"})
+
+        assert claim(queued.id, db)
+        await process_analysis(queued.id, db)
+
+        wardrobe = db.query(Item).filter(Item.name == "Wardrobe").one()
+        assert wardrobe.bulky is True
+        training = db.query(TrainingDataset).all()
+        assert [(row.item_name, row.source_id) for row in training] == [("Wardrobe", wardrobe.id)]
+
+        event = db.query(UsageAnalytics).filter(UsageAnalytics.event_type == "photo_analyzed").one()
+        assert event.event_metadata["items_detected"] == 2
+
+    async def test_failures_retry_then_fail(self, db, queued, monkeypatch):
+        """Errors requeue the analysis until it runs out of attempts."""
+        from app.analysis_queue import claim, process_analysis
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "ANALYSIS_MAX_ATTEMPTS", 2)
+        _fake_vision(monkeypatch, error="OpenAI API error: boom")
+
+        assert claim(queued.id, db)
+        await process_analysis(queued.id, db)
+        db.refresh(queued)
+        assert queued.status == "queued"
+
+        assert claim(queued.id, db)
+        await process_analysis(queued.id, db)
+        db.refresh(queued)
+        assert queued.status == "failed"
+        assert "boom" in queued.error
+
+    async def test_partial_result_is_retried_then_flagged(self, db, queued, monkeypatch):
+        """A failed photo batch requeues the analysis; on the last attempt the gap is recorded."""
+        from app import ai_vision
+        from app.analysis_queue import analysis_status, claim, process_analysis
+        from app.config import settings
+        from app.models import Item, Photo
+
+        monkeypatch.setattr(settings, "ANALYSIS_MAX_ATTEMPTS", 2)
+        monkeypatch.setattr(settings, "VISION_BATCH_SIZE", 1)
+        db.add(Photo(room_id=queued.room_id, filename="def.jpg", content_hash="def", storage_path="/tmp/def.jpg"))
+        db.flush()
+        queued.photo_ids = [str(p.id) for p in db.query(Photo).filter(Photo.room_id == queued.room_id)]
+        db.commit()
+
+        async def flaky(paths, learned_guidance=None, timeout=None):
+            if paths[0].endswith("def.jpg"):
+                raise Exception("OpenAI API error: timeout")
+            return {"items": [{"name": "Sofa", "qty": 1}], "summary": "Lounge"}
+
+        monkeypatch.setattr(ai_vision, "extract_removal_inventory_async", flaky)
+
+        assert claim(queued.id, db)
+        await process_analysis(queued.id, db)
+        db.refresh(queued)
+        assert queued.status == "queued"
+        assert db.query(Item).filter(Item.room_id == queued.room_id).count() == 0
+
+        assert claim(queued.id, db)
+        await process_analysis(queued.id, db)
+        db.refresh(queued)
+        assert queued.status == "done"
+        assert queued.items_detected == 1
+        assert "could not be analysed" in analysis_status(queued)["error"]
+
+    async def test_inline_run_uses_async_session(self, db, queued, monkeypatch):
+        """Inline mode claims and processes the analysis on the async engine."""
+        from app import analysis_queue, database
+        from tests.conftest import TestAsyncSessionLocal
+
+        monkeypatch.setattr(database, "AsyncSessionLocal", TestAsyncSessionLocal)
+        _fake_vision(monkeypatch, {"items": [{"name": "Armchair", "qty": 1}], "summary": "Lounge"})
+
+        await analysis_queue.run_inline(queued.id)
+
+        db.refresh(queued)
+        assert queued.status == "done"
+        assert queued.items_detected == 1
+
+
+class TestStatusEndpoint:
+    def test_status_reports_progress(self, db, test_company, queued):
+        """The status endpoint reports queue state for the job's own analyses only."""
+        import json
+        from types import SimpleNamespace
+        from app.main import room_analysis_status
+        from app.models import Job
+
+        job = db.query(Job).filter(Job.id == queued.job_id).first()
+        request = SimpleNamespace(state=SimpleNamespace(company=test_company))
+
+        def status(analysis_id):
+            return room_analysis_status(request, test_company.slug, job.token, str(queued.room_id),
+                                        str(analysis_id), db)
+
+        response = status(queued.id)
+        assert response.status_code == 200
+        assert json.loads(response.body)["status"] == "queued"
+
+        assert status(uuid.uuid4()).status_code == 404
@@ -0,0 +1,17 @@
+"""Tests for the async database session path."""
+
+
+class TestAsyncDatabaseUrl:
+    def test_postgres_uses_asyncpg_with_ssl(self):
+        """libpq's sslmode becomes asyncpg's ssl connect argument."""
+        from app.database import _async_database_url
+
+        url, connect_args = _async_database_url("postgresql://user:pw@db:5432/primehaul?sslmode=require")
+        assert url == "postgresql+asyncpg://user:pw@db:5432/primehaul"
+        assert connect_args == {"ssl": "require"}
+
+    def test_sqlite_uses_aiosqlite(self):
+        from app.database import _async_database_url
+
+        assert _async_database_url("sqlite:///./test.db") == ("sqlite+aiosqlite:///./test.db", {})
+
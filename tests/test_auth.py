@@ -1,5 +1,7 @@
 """Tests for authentication endpoints."""
 
+import pytest
+
 
 class TestLoginPage:
     def test_login_page_renders(self, app_client):
@@ -89,3 +91,89 @@ class TestSecurityHeaders:
         assert headers.get("Referrer-Policy") == "strict-origin-when-cross-origin"
         assert "camera" in headers.get("Permissions-Policy", "")
         assert "default-src" in headers.get("Content-Security-Policy", "")
+
+
+class TestCurrentUserCache:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        from app import user_cache
+
+        user_cache.invalidate()
+        yield
+        user_cache.invalidate()
+
+    def test_repeat_requests_skip_user_lookup(self, auth_token, test_user):
+        """A cached token resolves without querying the users table."""
+        from sqlalchemy import event
+        from app import user_cache
+        from app.dependencies import get_current_user
+        from tests.conftest import TestSessionLocal, engine
+
+        user_cache.put(auth_token, test_user)
+        user_cache.last_seen_due(test_user.id)  # Already recorded this interval
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            for _ in range(2):
+                session = TestSessionLocal()
+                try:
+                    user = get_current_user(auth_token, session)
+                    assert user.email == test_user.email
+                    assert user.company.slug == "test-removals"
+                finally:
+                    session.close()
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        user_selects = [s for s in statements if s.lstrip().startswith("SELECT") and "FROM users" in s]
+        assert user_selects == []
+
+    def test_last_seen_written_once_per_interval(self, db, auth_token, test_user):
+        """last_login_at is stored on the first request, not on every request."""
+        from app import user_cache
+        from app.dependencies import get_current_user
+        from app.models import User
+
+        user_cache.put(auth_token, test_user)
+        get_current_user(auth_token, db)
+        assert test_user.last_login_at is not None
+
+        db.query(User).filter(User.id == test_user.id).update({User.last_login_at: None})
+        db.commit()
+        get_current_user(auth_token, db)
+        db.refresh(test_user)
+        assert test_user.last_login_at is None
+
+    def test_deactivation_drops_cached_tokens(self, db, auth_token, test_user):
+        """Deactivating a user removes their tokens from the cache."""
+        from app import user_cache
+
+        user_cache.put(auth_token, test_user)
+        test_user.is_active = False
+        db.commit()
+        assert user_cache.get(auth_token) is None
+
+    def test_deleted_user_is_refused(self, db, auth_token, test_user):
+        """A cached token whose user row is gone gets a 401, not a server error."""
+        from fastapi import HTTPException
+        from app import user_cache
+        from app.dependencies import get_current_user
+        from app.models import User
+        from tests.conftest import TestSessionLocal
+
+        user_cache.put(auth_token, test_user)
+        db.query(User).filter(User.id == test_user.id).delete(synchronize_session=False)
+        db.commit()
+
+        session = TestSessionLocal()
+        try:
+            with pytest.raises(HTTPException) as error:
+                get_current_user(auth_token, session)
+        finally:
+            session.close()
+        assert error.value.status_code == 401
+        assert user_cache.get(auth_token) is None
@@ -0,0 +1,89 @@
+"""Tests for the customer survey company cache."""
+
+import uuid
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    from app import company_cache
+
+    company_cache.invalidate()
+    yield
+    company_cache.invalidate()
+
+
+class TestCompanyCache:
+    def test_each_lookup_gets_its_own_copy(self, test_company):
+        """Cached companies are detached copies, so requests never share one."""
+        from app import company_cache
+
+        company_cache.put(test_company)
+        first = company_cache.get(test_company.slug)
+        second = company_cache.get(test_company.slug)
+
+        assert first is not second
+        assert first.id == test_company.id
+        assert company_cache.branding(first)["company_name"] == "Test Removals Ltd"
+
+    def test_entries_expire(self, test_company, monkeypatch):
+        """Entries are dropped after COMPANY_CACHE_TTL_SECONDS."""
+        from app import company_cache
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "COMPANY_CACHE_TTL_SECONDS", 60)
+        company_cache.put(test_company)
+        assert company_cache.get(test_company.slug) is not None
+
+        now = company_cache.time.monotonic()
+        monkeypatch.setattr(company_cache.time, "monotonic", lambda: now + 61)
+        assert company_cache.get(test_company.slug) is None
+
+    def test_billing_changes_invalidate(self, db, test_company):
+        """Credit changes drop the cached company."""
+        from app import billing, company_cache
+
+        company_cache.put(test_company)
+        billing.add_credits_to_company(test_company, 5, db)
+        assert company_cache.get(test_company.slug) is None
+
+    def test_terms_toggle_invalidates(self, app_client, db, test_company, test_user, auth_token):
+        """Turning the T&Cs requirement on or off drops the cached company."""
+        from app import company_cache, user_cache
+
+        test_company.tcs_document_url = "/static/documents/tcs.pdf"
+        db.commit()
+        user_cache.put(auth_token, test_user)
+        app_client.cookies.set("access_token", auth_token)
+        company_cache.put(test_company)
+        try:
+            response = app_client.post(f"/{test_company.slug}/admin/terms/toggle", follow_redirects=False)
+        finally:
+            user_cache.invalidate()
+
+        assert response.status_code == 303
+        assert company_cache.get(test_company.slug) is None
+
+    def test_cached_company_serves_survey_without_lookup(self, app_client, test_company):
+        """A cache hit resolves the company without querying the companies table."""
+        from sqlalchemy import event
+        from app import company_cache, database
+        from tests.conftest import engine
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        company_cache.put(test_company)
+        for bind in (engine, database.engine):
+            event.listen(bind, "before_cursor_execute", record)
+        try:
+            response = app_client.get(f"/s/{test_company.slug}/{uuid.uuid4().hex[:16]}", follow_redirects=False)
+        finally:
+            for bind in (engine, database.engine):
+                event.remove(bind, "before_cursor_execute", record)
+
+        assert response.status_code in (200, 303)
+        assert not [s for s in statements if "FROM companies" in s]
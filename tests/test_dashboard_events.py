@@ -0,0 +1,103 @@
+"""Tests for live admin dashboard events and counters."""
+
+import asyncio
+import uuid
+
+import pytest
+
+
+class TestDashboardEvents:
+    async def test_changes_are_delivered_on_commit(self, db, test_company):
+        from app import dashboard_events
+
+        queue = dashboard_events.broadcaster.subscribe(test_company.id)
+        try:
+            dashboard_events.awaiting_changed(db, test_company.id, +1, "tok-1")
+            assert queue.empty()  # Nothing until the transaction commits
+            db.commit()
+
+            message = await asyncio.wait_for(queue.get(), timeout=1)
+            assert message["awaiting_delta"] == 1
+            assert message["token"] == "tok-1"
+        finally:
+            dashboard_events.broadcaster.unsubscribe(test_company.id, queue)
+        assert dashboard_events.broadcaster.subscriber_count(test_company.id) == 0
+
+    async def test_rolled_back_changes_are_dropped(self, db, test_company):
+        from app import dashboard_events
+
+        queue = dashboard_events.broadcaster.subscribe(test_company.id)
+        try:
+            dashboard_events.awaiting_changed(db, test_company.id, +1)
+            db.rollback()
+            db.commit()
+            await asyncio.sleep(0)
+            assert queue.empty()
+        finally:
+            dashboard_events.broadcaster.unsubscribe(test_company.id, queue)
+
+    async def test_only_the_company_subscribers_hear_it(self, db, test_company):
+        from app import dashboard_events
+
+        other_company_id = uuid.uuid4()
+        other = dashboard_events.broadcaster.subscribe(other_company_id)
+        try:
+            dashboard_events.awaiting_changed(db, test_company.id, -1)
+            db.commit()
+            await asyncio.sleep(0)
+            assert other.empty()
+        finally:
+            dashboard_events.broadcaster.unsubscribe(other_company_id, other)
+
+    def test_stream_requires_login(self, app_client, test_company):
+        response = app_client.get(f"/{test_company.slug}/admin/dashboard/events")
+        assert response.status_code == 401
+
+    def test_sse_format(self):
+        from app.dashboard_events import format_sse
+
+        assert format_sse({"awaiting": 2}, "awaiting") == 'event: awaiting\ndata: {"awaiting": 2}\n\n'
+
+
+class TestDashboardCounters:
+    @pytest.fixture
+    def owner_client(self, app_client, auth_token, test_user):
+        from app import user_cache
+
+        user_cache.put(auth_token, test_user)
+        app_client.cookies.set("access_token", auth_token)
+        yield app_client
+        user_cache.invalidate()
+
+    def test_counts_by_status(self, owner_client, db, test_company):
+        from app.main import dashboard_counters
+        from app.models import Job
+
+        for status in ("awaiting_approval", "awaiting_approval", "approved", "deposit_paid", "in_progress"):
+            db.add(Job(id=uuid.uuid4(), company_id=test_company.id, token=uuid.uuid4().hex[:16], status=status))
+        db.commit()
+
+        expected = {"awaiting": 2, "approved": 1, "rejected": 0, "deposit": 1}
+        assert dashboard_counters(test_company.id, db) == expected
+
+        response = owner_client.get(f"/{test_company.slug}/admin/dashboard/counters")
+        assert response.status_code == 200
+        assert response.json() == expected
+
+    def test_unchanged_counts_return_304(self, owner_client, test_company):
+        url = f"/{test_company.slug}/admin/dashboard/counters"
+        etag = owner_client.get(url).headers["etag"]
+
+        response = owner_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        response = owner_client.get(url, headers={"If-None-Match": '"stale"'})
+        assert response.status_code == 200
+
+    def test_polling_records_no_activity(self, owner_client, db, test_company):
+        from app.models import UsageAnalytics, UserInteraction
+
+        owner_client.get(f"/{test_company.slug}/admin/dashboard/counters")
+        assert db.query(UsageAnalytics).count() == 0
+        assert db.query(UserInteraction).count() == 0
@@ -0,0 +1,107 @@
+"""Tests for connection pool sizing and metrics."""
+
+
+class TestPoolMetrics:
+    def test_checkout_waits_are_recorded(self):
+        """The metered pool records each checkout and how long it waited."""
+        from sqlalchemy import create_engine, text
+        from app.database import MeteredQueuePool, PoolStats, _engine_stats
+
+        class Pool(MeteredQueuePool):
+            stats = PoolStats()
+
+        engine = create_engine("sqlite://", poolclass=Pool, pool_size=2, max_overflow=1)
+        try:
+            with engine.connect() as first, engine.connect() as second:
+                first.execute(text("SELECT 1"))
+                second.execute(text("SELECT 1"))
+                stats = _engine_stats(engine)
+                assert stats["checked_out"] == 2
+        finally:
+            engine.dispose()
+
+        stats = Pool.stats.snapshot()
+        assert stats["checkouts"] == 2
+        assert stats["timeouts"] == 0
+        assert stats["max_wait_ms"] >= stats["avg_wait_ms"] >= 0
+
+    def test_stats_endpoint_requires_superadmin(self, app_client):
+        response = app_client.get("/superadmin/db-stats")
+        assert response.status_code == 401
+
+    def test_stats_endpoint_reports_pools(self, app_client):
+        from app import database
+        from app.main import SUPERADMIN_SESSION_KEY
+
+        app_client.cookies.set("superadmin_token", SUPERADMIN_SESSION_KEY)
+        response = app_client.get("/superadmin/db-stats")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["process_type"] == "web"
+        assert set(data["engines"]) == {"sync", "async"}
+        assert set(data["totals"]) == {"primary"}
+        assert data["pool_budget"]["pool_size"] == database.DB_POOL_SIZE
+
+    def test_engines_share_one_budget(self):
+        """The sync and async engines together stay within DB_POOL_SIZE + DB_MAX_OVERFLOW."""
+        from sqlalchemy.pool import QueuePool
+        from app import database
+
+        url = "postgresql://user@localhost/primehaul_os"
+        shares = [database._pool_args(url, QueuePool, share) for share in (0, 1)]
+        assert sum(args["pool_size"] for args in shares) == database.DB_POOL_SIZE
+        assert sum(args["max_overflow"] for args in shares) == database.DB_MAX_OVERFLOW
+        assert database._split(5) == (3, 2)
+
+
+class TestReadReplica:
+    def test_reads_use_primary_without_replica(self):
+        """With no DATABASE_READ_URL, read sessions use the primary but stay read-only."""
+        from app import database
+
+        gen = database.get_read_db()
+        db = next(gen)
+        try:
+            assert db.get_bind() is database.engine
+            assert db.info[database.READ_ONLY_KEY] is True
+            assert db.info[database.STATEMENT_TIMEOUT_KEY] == database.ROUTE_STATEMENT_TIMEOUTS["report"]
+        finally:
+            gen.close()
+
+    def test_lagging_replica_is_skipped(self, monkeypatch):
+        """A replica further behind than DB_REPLICA_MAX_LAG_SECONDS is not used."""
+        from app import database
+
+        monkeypatch.setattr(database, "DB_REPLICA_MAX_LAG_SECONDS", 5)
+        monitor = database.ReplicaMonitor()
+        assert monitor.due()
+
+        monitor.record(2.0)
+        assert monitor.healthy and not monitor.due()
+
+        monitor.record(12.0)
+        assert not monitor.healthy
+
+        monitor.record(error=Exception("connection refused"))
+        assert not monitor.healthy
+        assert monitor.snapshot()["error"] == "connection refused"
+
+    def test_replica_engine_is_checked_and_used(self, monkeypatch, tmp_path):
+        """A healthy replica (here a second SQLite URL) serves read sessions."""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app import database
+
+        replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+        monkeypatch.setattr(database, "read_engine", replica)
+        monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=replica))
+        monkeypatch.setattr(database, "replica_monitor", database.ReplicaMonitor())
+
+        gen = database.get_read_db()
+        db = next(gen)
+        try:
+            assert db.get_bind() is replica
+            assert database.replica_monitor.snapshot()["lag_seconds"] == 0.0
+        finally:
+            gen.close()
+            replica.dispose()
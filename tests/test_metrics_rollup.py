@@ -0,0 +1,142 @@
+"""Tests for the developer dashboard metrics rollup."""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    from app import metrics_rollup
+
+    metrics_rollup.invalidate()
+    yield
+    metrics_rollup.invalidate()
+
+
+def add_job(db, company, created_at, **fields):
+    from app.models import Job
+
+    job = Job(id=uuid.uuid4(), company_id=company.id, token=uuid.uuid4().hex[:16], created_at=created_at, **fields)
+    db.add(job)
+    db.commit()
+    return job
+
+
+class TestMetricsRollup:
+    def test_refresh_builds_daily_buckets_and_summary(self, db, test_company):
+        """The first refresh backfills history and stores the dashboard summary row."""
+        from app import metrics_rollup
+        from app.models import PlatformMetrics, PlatformMetricsDaily
+
+        now = datetime.utcnow()
+        add_job(db, test_company, now - timedelta(days=10))
+        add_job(db, test_company, now, submitted_at=now)
+
+        metrics = metrics_rollup.refresh(db)
+
+        assert metrics["total_companies"] == 1
+        assert metrics["active_trials"] == 0  # No trial_ends_at
+        assert metrics["total_jobs"] == 2
+        assert metrics["quotes_today"] == 1
+        assert metrics["submitted_today"] == 1
+        assert metrics["marketplace"]["total_jobs"] == 0
+        assert db.get(PlatformMetrics, metrics_rollup.SNAPSHOT_ID).metrics == metrics
+        assert db.get(PlatformMetricsDaily, (now - timedelta(days=10)).date()).jobs_created == 1
+
+    def test_backfill_counts_history_in_date_ranges(self, db, test_company, monkeypatch):
+        """The first refresh walks from the earliest row to today, BACKFILL_DAYS at a time."""
+        from app import metrics_rollup
+        from app.models import PlatformMetricsDaily
+
+        monkeypatch.setattr(metrics_rollup, "BACKFILL_DAYS", 3)
+        ranges = []
+        daily_counts = metrics_rollup.daily_counts
+
+        def spy(db, since=None, until=None):
+            ranges.append((since, until))
+            return daily_counts(db, since=since, until=until)
+
+        monkeypatch.setattr(metrics_rollup, "daily_counts", spy)
+        now = datetime.utcnow()
+        add_job(db, test_company, now - timedelta(days=8))
+        add_job(db, test_company, now - timedelta(days=2))
+
+        metrics_rollup.refresh(db)
+
+        assert ranges[0][0] == (now - timedelta(days=8)).date()
+        assert ranges[-1][1] == now.date()
+        assert len(ranges) == 3 and all(since is not None for since, _ in ranges)
+        assert db.query(PlatformMetricsDaily).count() == 9
+        assert sum(row.jobs_created for row in db.query(PlatformMetricsDaily)) == 2
+
+    def test_later_refreshes_only_recount_recent_days(self, db, test_company):
+        """Old buckets are kept as they are; today's is recounted and total_jobs counts the table."""
+        from app import metrics_rollup
+        from app.models import PlatformMetricsDaily
+
+        now = datetime.utcnow()
+        old_day = (now - timedelta(days=10)).date()
+        db.add(PlatformMetricsDaily(day=old_day, jobs_created=7))
+        db.commit()
+        add_job(db, test_company, now)
+
+        metrics = metrics_rollup.refresh(db)
+
+        assert metrics["total_jobs"] == 1  # The stale bucket is not summed
+        assert metrics["quotes_today"] == 1
+        assert db.get(PlatformMetricsDaily, old_day).jobs_created == 7
+
+    def test_recent_refresh_is_skipped(self, db, test_company):
+        """A refresh within min_age_seconds of the last one does nothing."""
+        from app import metrics_rollup
+
+        assert metrics_rollup.refresh(db) is not None
+        assert metrics_rollup.refresh(db, min_age_seconds=60) is None
+
+    def test_dashboard_reads_cached_summary(self, db, test_company):
+        """The dashboard reads the stored summary and then serves it from memory."""
+        from app import metrics_rollup
+
+        metrics_rollup.refresh(db)
+        metrics_rollup.invalidate()
+        first = metrics_rollup.get_dashboard_metrics(db)
+
+        add_job(db, test_company, datetime.utcnow())
+        assert metrics_rollup.get_dashboard_metrics(db) == first
+        assert first["total_jobs"] == 0
+
+    def test_dashboard_computes_live_before_first_refresh(self, db, test_company):
+        """Without a stored summary the metrics are computed from the live tables."""
+        from app import metrics_rollup
+
+        add_job(db, test_company, datetime.utcnow())
+        metrics = metrics_rollup.get_dashboard_metrics(db)
+
+        assert metrics["total_jobs"] == 1
+        assert metrics["quotes_today"] == 1
+
+    def test_no_background_refresh_without_postgres(self, monkeypatch):
+        """The refresh loop only runs in web processes on PostgreSQL (not under the SQLite tests)."""
+        from app import database, metrics_rollup
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "METRICS_REFRESH_SECONDS", 60)
+        assert database.engine.dialect.name == "sqlite"
+        assert metrics_rollup.refresh_in_background() is False
+
+    def test_background_refresh_uses_report_timeout(self, monkeypatch):
+        """The refresh session opts into the longer "report" statement_timeout."""
+        from app import database, metrics_rollup
+
+        sessions = []
+
+        def refresh(db, min_age_seconds=0):
+            sessions.append(dict(db.info))
+
+        monkeypatch.setattr(metrics_rollup, "refresh", refresh)
+        metrics_rollup._refresh_once(30)
+
+        timeout = database.ROUTE_STATEMENT_TIMEOUTS["report"]
+        assert sessions == [{database.STATEMENT_TIMEOUT_KEY: timeout}]
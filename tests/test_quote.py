@@ -0,0 +1,233 @@
+"""Tests for job inventory loading and quote calculation."""
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def test_job(db, test_company):
+    """Create a submitted job with two rooms of items and an empty room."""
+    from app.models import Job, Room, Item, PricingConfig
+
+    db.add(PricingConfig(company_id=test_company.id))
+    job = Job(
+        id=uuid.uuid4(),
+        company_id=test_company.id,
+        token=uuid.uuid4().hex[:16],
+        status="awaiting_approval",
+    )
+    db.add(job)
+    db.flush()
+
+    kitchen = Room(id=uuid.uuid4(), job_id=job.id, name="Kitchen")
+    lounge = Room(id=uuid.uuid4(), job_id=job.id, name="Lounge")
+    hallway = Room(id=uuid.uuid4(), job_id=job.id, name="Hallway")
+    db.add_all([kitchen, lounge, hallway])
+    db.flush()
+
+    db.add_all([
+        Item(room_id=kitchen.id, name="Kitchen crockery", qty=3, cbm=0.1, weight_kg=10,
+             fragile=True, packing_requirement="medium_box"),
+        Item(room_id=kitchen.id, name="Washing machine", qty=1, cbm=0.3, weight_kg=70,
+             bulky=True, packing_requirement="none"),
+        Item(room_id=lounge.id, name="3-seater sofa", qty=1, cbm=1.5, weight_kg=30,
+             packing_requirement="none"),
+        Item(room_id=lounge.id, name="Books", qty=40, cbm=0.01, weight_kg=0.5,
+             packing_requirement="small_box"),
+    ])
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+class TestJobInventory:
+    def test_loads_rooms_and_items(self, db, test_job):
+        """All rooms (including empty ones) and their items are loaded."""
+        from app.inventory import load_job_inventory
+
+        inventory = load_job_inventory(test_job.id, db)
+
+        rooms = {room.name: room for room in inventory.rooms}
+        assert set(rooms) == {"Kitchen", "Lounge", "Hallway"}
+        assert len(rooms["Kitchen"].items) == 2
+        assert len(rooms["Lounge"].items) == 2
+        assert rooms["Hallway"].items == ()
+        assert len(inventory.items) == 4
+
+    def test_unknown_job_is_empty(self, db, test_company):
+        """A job with no rooms yields an empty inventory."""
+        from app.inventory import load_job_inventory
+
+        inventory = load_job_inventory(uuid.uuid4(), db)
+        assert inventory.rooms == ()
+        assert inventory.items == ()
+
+
+class TestCalculateQuote:
+    def test_totals(self, db, test_job):
+        """Quote totals match the inventory."""
+        from app.main import calculate_quote
+
+        quote = calculate_quote(test_job, db)
+
+        assert quote["total_items"] == 45
+        assert quote["bulky_items"] == 1
+        assert quote["fragile_items"] == 3
+        assert quote["total_cbm"] == pytest.approx(2.5)
+        assert quote["packing_breakdown"]["small_boxes"]["qty"] == 2
+        assert quote["packing_breakdown"]["medium_boxes"]["qty"] == 1
+        assert quote["estimate_low"] <= quote["estimate_high"]
+
+    def test_packing_service_rooms(self, db, test_job):
+        """Only rooms with loose items get a packing service estimate."""
+        from app.main import calculate_quote
+
+        quote = calculate_quote(test_job, db)
+
+        names = [room["room_name"] for room in quote["packing_service_breakdown"]["rooms"]]
+        assert sorted(names) == ["Kitchen", "Lounge"]
+
+
+class TestQuoteEngine:
+    def _columns(self):
+        from app.inventory import InventoryItem, InventoryRoom, JobInventory
+        from app.quote_engine import InventoryColumns
+
+        inventory = JobInventory(rooms=(
+            InventoryRoom(id="r1", name="Kitchen", items=(
+                InventoryItem(qty=30, cbm=0.05, weight_kg=1, bulky=False, fragile=True,
+                              packing_requirement="medium_box"),
+            )),
+            InventoryRoom(id="r2", name="Bedroom", items=(
+                InventoryItem(qty=2, cbm=0.2, weight_kg=5, bulky=False, fragile=False,
+                              packing_requirement="wardrobe_box"),
+                InventoryItem(qty=1, cbm=1.2, weight_kg=80, bulky=True, fragile=False,
+                              packing_requirement="none"),
+            )),
+        ))
+        return InventoryColumns.from_inventory(inventory)
+
+    def _pricing(self):
+        from app.models import PricingConfig
+        from app.quote_engine import PricingSnapshot
+
+        config = PricingConfig()
+        for column in PricingConfig.__table__.columns:
+            if getattr(config, column.name) is None and column.default is not None:
+                setattr(config, column.name, column.default.arg)
+        return PricingSnapshot.from_config(config)
+
+    def test_totals_from_columns(self):
+        """Column reductions give item, volume and surcharge counts."""
+        from app.quote_engine import inventory_totals
+
+        totals = inventory_totals(self._columns(), self._pricing())
+        assert totals["total_items"] == 33
+        assert totals["total_cbm"] == pytest.approx(3.1)
+        assert totals["bulky_items"] == 1
+        assert totals["fragile_items"] == 30
+
+    def test_customer_packing_is_free(self):
+        """Customer-provided packing zeroes costs but keeps quantities."""
+        from app.quote_engine import QuoteInputs, quote
+
+        result = quote(self._columns(), self._pricing(), QuoteInputs(customer_provides_packing=True))
+        assert result["breakdown"]["packing"] == 0
+        assert result["packing_breakdown"]["medium_boxes"]["qty"] == 2
+        assert result["packing_breakdown"]["robe_cartons"]["qty"] == 2
+
+    def test_access_and_selected_packing_rooms(self):
+        """Access fees and selected packing-service rooms are priced."""
+        from app.quote_engine import QuoteInputs, quote
+
+        inputs = QuoteInputs(
+            pickup_access={"floors": 2, "has_lift": False, "parking_type": "street"},
+            packing_service_rooms=("r1",),
+        )
+        result = quote(self._columns(), self._pricing(), inputs)
+        assert result["access_breakdown"]["pickup"] == {"floors": 30.0, "no_lift": 50.0, "parking": 25.0}
+        assert result["breakdown"]["access"] == 105.0
+        assert result["packing_service_breakdown"]["total_hours"] == 2.0
+        assert result["packing_service_breakdown"]["total_cost"] == 80.0
+
+
+class TestPricingPreview:
+    def test_preview_requires_auth(self, app_client, test_company):
+        """POST pricing preview without auth should be rejected."""
+        response = app_client.post(
+            f"/{test_company.slug}/admin/pricing/preview",
+            data={"price_per_cbm": 50},
+            follow_redirects=False,
+        )
+        assert response.status_code in (401, 403, 303)
+
+    def test_preview_reprices_submitted_jobs(self, db, test_company, test_job):
+        """Raising the CBM rate moves every submitted job's estimate up."""
+        from dataclasses import replace
+        from app.models import PricingConfig
+        from app.quote_engine import PricingSnapshot
+        from app.requote import preview_pricing_change
+
+        test_job.submitted_at = datetime.utcnow()
+        db.commit()
+
+        pricing = db.query(PricingConfig).filter(PricingConfig.company_id == test_company.id).first()
+        current = PricingSnapshot.from_config(pricing)
+        proposed = replace(current, price_per_cbm=100.0)
+
+        data = preview_pricing_change(test_company.id, current, proposed, db)
+        assert data["jobs"] == 1
+        assert data["increased"] == 1
+        assert data["new"]["estimate_low"]["median"] > data["old"]["estimate_low"]["median"]
+
+    def test_preview_streams_in_chunks(self, db, test_company, test_job):
+        """Chunked loading covers every job exactly once."""
+        from app.models import Job
+        from app.requote import iter_recent_submitted_jobs
+
+        for i in range(4):
+            db.add(Job(company_id=test_company.id, token=f"extra{i}", submitted_at=datetime.utcnow()))
+        test_job.submitted_at = datetime.utcnow()
+        db.commit()
+
+        chunks = list(iter_recent_submitted_jobs(test_company.id, db, limit=10, chunk_size=2))
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        assert len({job_id for chunk in chunks for job_id, _, _ in chunk}) == 5
+
+
+class TestQuoteCache:
+    def test_repeat_views_use_cache(self, db, test_job):
+        """A second calculate_quote reuses the cached result until the inventory revision changes."""
+        from app.main import calculate_quote, mark_inventory_changed
+        from app.models import Item, Room
+
+        first = calculate_quote(test_job, db)
+        assert test_job.quote_cache_key
+
+        room = db.query(Room).filter(Room.job_id == test_job.id, Room.name == "Lounge").first()
+        db.add(Item(room_id=room.id, name="Armchair", qty=1, cbm=0.5, weight_kg=20))
+        db.commit()
+
+        # Item added without bumping the revision: cached quote is served
+        assert calculate_quote(test_job, db)["total_items"] == first["total_items"]
+
+        mark_inventory_changed(test_job)
+        db.commit()
+        assert calculate_quote(test_job, db)["total_items"] == first["total_items"] + 1
+
+    def test_pricing_revision_invalidates(self, db, test_job):
+        """Bumping the pricing revision recomputes the quote."""
+        from app.main import calculate_quote
+        from app.models import PricingConfig
+
+        first = calculate_quote(test_job, db)
+
+        pricing = db.query(PricingConfig).filter(PricingConfig.company_id == test_job.company_id).first()
+        pricing.callout_fee = 1000
+        pricing.revision = (pricing.revision or 0) + 1
+        db.commit()
+
+        assert calculate_quote(test_job, db)["breakdown"]["base"] == 1000.0
+        assert first["breakdown"]["base"] != 1000.0
@@ -0,0 +1,66 @@
+"""Tests for the superadmin dashboard totals and company pagination."""
+
+import uuid
+from datetime import datetime, timedelta
+
+
+def add_companies(db, count, **fields):
+    from app.models import Company
+
+    start = datetime(2026, 1, 1)
+    companies = []
+    for i in range(count):
+        company = Company(id=uuid.uuid4(), company_name=f"Co {i}", slug=f"co-{i}", email=f"co{i}@x.co",
+                          created_at=start + timedelta(hours=i), **fields)
+        db.add(company)
+        companies.append(company)
+    db.commit()
+    return companies
+
+
+class TestSuperadminDashboard:
+    def test_totals_in_one_query(self, db):
+        """Revenue counts surveys beyond the free three, for non-partners only."""
+        from app.main import superadmin_totals
+        from app.models import Company, ItemFeedback
+
+        add_companies(db, 1, surveys_used=5)
+        db.add(Company(id=uuid.uuid4(), company_name="Partner", slug="partner", email="p@x.co",
+                       surveys_used=10, is_partner=True))
+        db.add(ItemFeedback(item_id=uuid.uuid4(), company_id=db.query(Company.id).first()[0], feedback_type="correction"))
+        db.commit()
+
+        totals = superadmin_totals(db)
+
+        assert totals["total_companies"] == 2
+        assert totals["total_surveys"] == 15
+        assert totals["paid_surveys"] == 2
+        assert totals["feedback"] == 1
+        assert totals["corrections"] == 1
+        assert totals["variant_changes"] == 0
+        assert totals["surveys_today"] == 0
+
+    def test_company_cursor_round_trip(self, db):
+        from app.main import _company_cursor, _parse_company_cursor
+
+        company = add_companies(db, 1)[0]
+        assert _parse_company_cursor(_company_cursor(company)) == (company.created_at, company.id)
+        assert _parse_company_cursor("not-a-cursor") is None
+
+    def test_companies_are_keyset_paginated(self, app_client, db, monkeypatch):
+        """Pages follow on from the last company shown, newest first."""
+        from app import main
+
+        monkeypatch.setattr(main, "SUPERADMIN_COMPANIES_PER_PAGE", 2)
+        companies = add_companies(db, 3)
+        app_client.cookies.set("superadmin_token", main.SUPERADMIN_SESSION_KEY)
+
+        first = app_client.get("/superadmin/dashboard")
+        assert first.status_code == 200
+        assert "Co 2" in first.text and "Co 1" in first.text and "Co 0" not in first.text
+        assert "Older" in first.text
+
+        second = app_client.get("/superadmin/dashboard", params={"before": main._company_cursor(companies[1])})
+        assert second.status_code == 200
+        assert "Co 0" in second.text and "Co 1" not in second.text
+        assert "Older" not in second.text
@@ -0,0 +1,257 @@
+"""Tests for buffered /api/track ingestion."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+
+def fake_request(user_agent="Mozilla/5.0 (iPhone) Mobile"):
+    return SimpleNamespace(
+        state=SimpleNamespace(),
+        headers={"user-agent": user_agent},
+        client=SimpleNamespace(host="127.0.0.1"),
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    from app import tracking
+
+    tracking.buffer.take()
+    yield
+    tracking.buffer.take()
+
+
+class TestInteractionBuffer:
+    async def test_track_buffers_then_flushes_in_bulk(self, async_db):
+        """/api/track only queues the event; a flush writes it."""
+        from sqlalchemy import select
+        from app import tracking
+        from app.main import track_user_interaction
+        from app.models import UserInteraction
+
+        response = await track_user_interaction(
+            fake_request(), event_type="click", page_url="/s/acme/abc/rooms", session_id="sess-1",
+            job_token=None, element_id="add-room", element_text="Add room", time_spent_seconds=None,
+            scroll_depth_percent=None, screen_width=390, screen_height=844, metadata='{"step": 3}',
+        )
+        assert json.loads(response.body) == {"ok": True, "session_id": "sess-1"}
+        assert len(tracking.buffer) == 1
+        assert (await async_db.scalars(select(UserInteraction))).all() == []
+
+        assert await tracking.buffer.flush(async_db) == 1
+        interaction = (await async_db.scalars(select(UserInteraction))).one()
+        assert interaction.device_type == "mobile"
+        assert interaction.interaction_metadata == {"step": 3}
+        assert len(tracking.buffer) == 0
+
+    def test_full_buffer_drops_oldest(self):
+        from app.tracking import InteractionBuffer
+
+        buffer = InteractionBuffer(max_size=3)
+        buffer.extend([{"n": i} for i in range(5)])
+
+        assert buffer.dropped == 2
+        assert [row["n"] for row in buffer.take()] == [2, 3, 4]
+
+    async def test_failed_flush_is_counted(self, async_db):
+        from app.tracking import InteractionBuffer
+
+        buffer = InteractionBuffer(max_size=10)
+        buffer.add({"session_id": "s"})  # Missing required columns
+        assert await buffer.flush(async_db) == 0
+        assert buffer.failed == 1
+        assert len(buffer) == 0
+
+    async def test_bad_row_only_loses_itself(self, async_db):
+        """A failed batch is retried in halves, so the good rows are still written."""
+        from sqlalchemy import func, select
+        from app.models import UserInteraction
+        from app.tracking import InteractionBuffer, interaction_row
+
+        buffer = InteractionBuffer(max_size=10)
+        good = [interaction_row(fake_request(), {"event_type": "click", "page_url": "/"}, "s") for _ in range(4)]
+        buffer.extend(good[:2] + [{"session_id": "s"}] + good[2:])  # Middle row is missing required columns
+
+        assert await buffer.flush(async_db) == 4
+        assert buffer.failed == 1
+        assert await async_db.scalar(select(func.count()).select_from(UserInteraction)) == 4
+
+    async def test_unreachable_database_keeps_rows(self):
+        """A connection failure requeues the rows (ahead of newer ones) instead of failing each one."""
+        from sqlalchemy.exc import OperationalError
+        from app.tracking import DatabaseUnavailable, InteractionBuffer
+
+        attempts = []
+
+        class Down:
+            async def execute(self, statement, rows):
+                attempts.append(len(rows))
+                raise OperationalError("INSERT", {}, Exception("connection refused"))
+
+            async def rollback(self):
+                pass
+
+        buffer = InteractionBuffer(max_size=4)
+        buffer.extend([{"n": i} for i in range(3)])
+        with pytest.raises(DatabaseUnavailable):
+            await buffer.flush(Down())
+
+        assert attempts == [3]
+        assert buffer.failed == 0
+        buffer.extend([{"n": 3}, {"n": 4}])  # Overflow drops the oldest requeued row
+        assert [row["n"] for row in buffer.take()] == [1, 2, 3, 4]
+        assert buffer.dropped == 1
+
+    async def test_stop_waits_for_flush_in_progress(self, monkeypatch):
+        """Shutdown lets a running flush finish instead of cancelling it mid-insert."""
+        import asyncio
+        from app.tracking import InteractionBuffer
+
+        written = []
+        started = asyncio.Event()
+
+        class SlowDb:
+            async def execute(self, statement, rows):
+                started.set()
+                await asyncio.sleep(0.05)
+                written.extend(rows)
+
+            async def commit(self):
+                pass
+
+        buffer = InteractionBuffer(max_size=10)
+
+        async def flush_new_session():
+            await buffer.flush(SlowDb())
+
+        monkeypatch.setattr(buffer, "_flush_new_session", flush_new_session)
+        buffer.start()
+        buffer.extend([{"n": i} for i in range(3)])
+        buffer._wake()
+        await asyncio.wait_for(started.wait(), timeout=1)
+
+        await buffer.stop()
+        assert [row["n"] for row in written] == [0, 1, 2]
+        assert buffer.flushed == 3
+
+    def test_rows_are_sanitized(self):
+        """NUL bytes are stripped and out-of-range numbers dropped."""
+        from app.tracking import interaction_row
+
+        row = interaction_row(fake_request(), {
+            "event_type": "cli\x00ck", "page_url": "/a\x00b", "screen_width": 99999999999,
+            "screen_height": -5, "scroll_depth_percent": 140, "time_spent_seconds": float("inf"),
+            "metadata": {"k\x00": ["v\x00"]},
+        }, "sess\x00")
+        assert row["event_type"] == "click"
+        assert row["page_url"] == "/ab"
+        assert row["session_id"] == "sess"
+        assert row["screen_width"] is None and row["screen_height"] is None
+        assert row["scroll_depth_percent"] is None
+        assert row["time_spent_seconds"] is None
+        assert row["interaction_metadata"] == {"k": ["v"]}
+
+    def test_rows_fit_their_columns(self):
+        from app.tracking import interaction_row
+
+        row = interaction_row(fake_request("Mozilla/5.0 (iPad) Tablet"), {
+            "event_type": "x" * 80, "page_url": "/" * 900, "element_text": "t" * 300,
+        }, "s" * 150)
+        assert len(row["event_type"]) == 50
+        assert len(row["page_url"]) == 500
+        assert len(row["element_text"]) == 200
+        assert len(row["session_id"]) == 100
+        assert row["device_type"] == "tablet"
+
+
+class TestBatchEndpoint:
+    def batch(self, **envelope):
+        return {
+            "s": "sess-9", "p": "/s/acme/tok123/rooms", "j": "tok123", "w": 390, "h": 844,
+            "e": [
+                {"t": "page_view", "a": 4000, "m": {"title": "Rooms"}},
+                {"t": "click", "a": 1200, "id": "add-room", "x": "Add room"},
+                {"t": "page_exit", "a": 0, "d": 12.5, "sd": 140},
+            ],
+            **envelope,
+        }
+
+    def test_batch_is_queued_in_one_go(self, app_client):
+        from app import tracking
+
+        response = app_client.post("/api/track/batch", json=self.batch())
+        assert response.status_code == 200
+        assert response.json() == {"ok": True, "session_id": "sess-9", "accepted": 3, "rejected": 0}
+
+        rows = tracking.buffer.take()
+        assert [row["event_type"] for row in rows] == ["page_view", "click", "page_exit"]
+        assert {row["job_token"] for row in rows} == {"tok123"}
+        assert rows[0]["recorded_at"] < rows[2]["recorded_at"]  # Backdated by each event's age
+        assert rows[1]["element_text"] == "Add room"
+        assert rows[2]["scroll_depth_percent"] == 100
+
+    def test_gzip_body(self, app_client):
+        import gzip
+        from app import tracking
+
+        body = gzip.compress(json.dumps(self.batch()).encode())
+        response = app_client.post("/api/track/batch", content=body, headers={
+            "Content-Type": "application/json", "Content-Encoding": "gzip",
+        })
+        assert response.json()["accepted"] == 3
+        assert len(tracking.buffer) == 3
+
+    def test_malformed_events_are_skipped(self, app_client):
+        from app import tracking
+
+        batch = self.batch(e=[{"t": "click"}, {"t": ""}, "nope", {"t": "scroll", "sd": "deep"}])
+        response = app_client.post("/api/track/batch", json=batch)
+        assert response.json()["accepted"] == 1
+        assert response.json()["rejected"] == 3
+        assert len(tracking.buffer) == 1
+
+    def test_malformed_batch_is_rejected(self, app_client):
+        from app import tracking
+
+        assert app_client.post("/api/track/batch", content=b"not json").status_code == 400
+        assert app_client.post("/api/track/batch", json=self.batch(e=[])).status_code == 400
+        too_many = self.batch(e=[{"t": "click"}] * (tracking.MAX_BATCH_EVENTS + 1))
+        assert app_client.post("/api/track/batch", json=too_many).status_code == 400
+        assert len(tracking.buffer) == 0
+
+    def test_non_finite_and_out_of_range_values_are_refused(self, app_client):
+        from app import tracking
+
+        infinity = b'{"p": "/x", "e": [{"t": "c", "sd": Infinity}]}'
+        assert app_client.post("/api/track/batch", content=infinity).status_code == 400
+        assert app_client.post("/api/track/batch", json=self.batch(w=99999999999)).status_code == 400
+
+        overflow = b'{"p": "/x", "e": [{"t": "c", "sd": 1e400}, {"t": "c", "d": -1}, {"t": "c"}]}'
+        response = app_client.post("/api/track/batch", content=overflow)
+        assert response.status_code == 200
+        assert response.json()["accepted"] == 1
+        assert len(tracking.buffer) == 1
+
+    def test_deeply_nested_json_is_refused(self, app_client):
+        from app import tracking
+
+        nested = b"[" * 100000
+        assert app_client.post("/api/track/batch", content=nested).status_code == 400
+
+        deep = {}
+        for _ in range(900):
+            deep = {"k": deep}
+        batch = self.batch(e=[{"t": "click", "m": deep}, {"t": "click", "m": {"k": "x" * 5000}}, {"t": "click"}])
+        response = app_client.post("/api/track/batch", content=json.dumps(batch).encode())
+        assert response.status_code == 200
+        assert response.json()["accepted"] == 1
+        assert response.json()["rejected"] == 2
+        assert len(tracking.buffer) == 1
+
+    def test_oversized_body_is_refused(self, app_client):
+        from app import tracking
+
+        body = b" " * (tracking.MAX_BATCH_BYTES + 1)
+        assert app_client.post("/api/track/batch", content=body).status_code == 413
@@ -0,0 +1,162 @@
+"""Tests for upload ingestion and off-loop photo compression."""
+
+from io import BytesIO
+
+import pytest
+
+
+def _jpeg(width, height):
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGB", (width, height), (120, 80, 40)).save(buf, format="JPEG", quality=100)
+    return buf.getvalue()
+
+
+class TestCompressPhoto:
+    def test_large_photo_is_resized(self):
+        """Photos over the max dimension are shrunk."""
+        from PIL import Image
+        from app.image_processing import compress_photo
+
+        result = compress_photo(_jpeg(4000, 3000))
+        assert max(Image.open(BytesIO(result)).size) == 2048
+
+    def test_invalid_bytes_returned_unchanged(self):
+        """Non-image content falls back to the original bytes."""
+        from app.image_processing import compress_photo
+
+        assert compress_photo(b"not an image") == b"not an image"
+
+
+class TestCompressPhotoFiles:
+    async def test_parallel_compression_in_place(self, tmp_path):
+        """Pool compression rewrites large photos in place and leaves others alone."""
+        from PIL import Image
+        from app import image_processing
+
+        big = tmp_path / "big.jpg"
+        big.write_bytes(_jpeg(3000, 1000))
+        junk = tmp_path / "junk.jpg"
+        junk.write_bytes(b"junk")
+
+        try:
+            results = await image_processing.compress_photo_files([str(big), str(junk)])
+        finally:
+            image_processing.shutdown()
+
+        assert results == [True, False]
+        assert Image.open(big).size == (2048, 683)
+        assert junk.read_bytes() == b"junk"
+
+
+class TestIngestUpload:
+    async def test_streams_and_hashes(self, tmp_path):
+        """Uploads are spooled to disk with size and SHA-256."""
+        import hashlib
+        from fastapi import UploadFile
+        from app.uploads import ingest_upload
+
+        data = b"x" * (600 * 1024)
+        upload = await ingest_upload(UploadFile(BytesIO(data), filename="a.jpg"), tmp_path, 1024 * 1024)
+
+        assert upload.size == len(data)
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        dest = upload.move_to(tmp_path / "a.jpg")
+        assert dest.read_bytes() == data
+
+    async def test_aborts_over_cap(self, tmp_path):
+        """Uploads over the cap raise and leave no partial file behind."""
+        from fastapi import UploadFile
+        from app.uploads import UploadTooLarge, ingest_upload
+
+        with pytest.raises(UploadTooLarge):
+            await ingest_upload(UploadFile(BytesIO(b"x" * 2048), filename="a.jpg"), tmp_path, 1024)
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestPhotoStore:
+    async def test_duplicate_content_stored_once(self, tmp_path, monkeypatch):
+        """Identical uploads share one blob, within a batch and across requests."""
+        import uuid
+        from fastapi import UploadFile
+        from app import photo_store
+        from app.uploads import ingest_upload
+
+        monkeypatch.setattr(photo_store, "UPLOAD_DIR", tmp_path)
+        company_id = uuid.uuid4()
+        data = _jpeg(100, 100)
+
+        async def upload_batch(*payloads):
+            blob_dir = photo_store.blob_dir(company_id)
+            ingested = [
+                await ingest_upload(UploadFile(BytesIO(payload), filename="p.jpg"), blob_dir, 1024 * 1024)
+                for payload in payloads
+            ]
+            return await photo_store.store_uploads(company_id, ingested)
+
+        first = await upload_batch(data, data, b"other photo")
+        second = await upload_batch(data)
+
+        assert len(first) == 2
+        assert second[0].path == first[0].path
+        assert sorted(p.name for p in photo_store.blob_dir(company_id).iterdir()) == sorted(
+            p.filename for p in first
+        )
+
+    async def test_vision_derivative_made_once(self, tmp_path, monkeypatch):
+        """Each stored photo gets a 1024px JPEG for the vision model, made on first upload only."""
+        import uuid
+        from PIL import Image
+        from fastapi import UploadFile
+        from app import image_processing, photo_store
+        from app.uploads import ingest_upload
+
+        monkeypatch.setattr(photo_store, "UPLOAD_DIR", tmp_path)
+        company_id = uuid.uuid4()
+        data = _jpeg(3000, 1500)
+        made = []
+        make_vision_derivatives = image_processing.make_vision_derivatives
+
+        async def counting(jobs):
+            made.extend(jobs)
+            return await make_vision_derivatives(jobs)
+
+        monkeypatch.setattr(image_processing, "make_vision_derivatives", counting)
+
+        async def upload_once():
+            upload = await ingest_upload(UploadFile(BytesIO(data), filename="p.jpg"),
+                                         photo_store.blob_dir(company_id), 10 * 1024 * 1024)
+            [stored] = await photo_store.store_uploads(company_id, [upload])
+            return stored
+
+        first = await upload_once()
+        assert first.vision_input == photo_store.vision_path(company_id, first.sha256)
+        assert Image.open(first.vision_input).size == (1024, 512)
+        modified = first.vision_input.stat().st_mtime_ns
+
+        second = await upload_once()
+        assert second.vision_input == first.vision_input
+        assert len(made) == 1
+        assert second.vision_input.stat().st_mtime_ns == modified
+
+    def test_blob_url_uses_job_token(self, db, test_company):
+        """Content-addressed photos are served through the job's protected URL."""
+        import uuid
+        from app.models import Job, Room, Photo
+
+        job = Job(company_id=test_company.id, token="tok123")
+        db.add(job)
+        db.flush()
+        room = Room(job_id=job.id, name="Kitchen")
+        db.add(room)
+        db.flush()
+        photo = Photo(room_id=room.id, filename="abc.jpg", content_hash="abc",
+                      storage_path=f"uploads/{test_company.id}/blobs/abc.jpg")
+        db.add(photo)
+        db.commit()
+
+        assert photo.url == f"/photo/{test_company.id}/tok123/abc.jpg"
+
+        detached = Photo(filename="abc.jpg", storage_path=f"uploads/{test_company.id}/blobs/abc.jpg")
+        assert detached.url_for("tok123") == photo.url  # No room/job lookup needed
@@ -0,0 +1,257 @@
+"""Tests for AI vision orchestration and result caching."""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+RESULT = {"items": [{"name": "3-seater sofa", "qty": 1}], "summary": "A lounge"}
+
+
+def _stored(sha256):
+    from app.photo_store import StoredPhoto
+
+    return StoredPhoto(path=Path(f"/tmp/{sha256}.jpg"), sha256=sha256, size=1,
+                       original_filename="p.jpg", content_type="image/jpeg")
+
+
+class TestVisionCache:
+    def test_key_ignores_order_but_not_guidance(self):
+        """Photo order doesn't change the key; learned guidance does."""
+        from app.vision_cache import cache_key
+
+        assert cache_key(["a", "b"], "m", 1, None) == cache_key(["b", "a"], "m", 1, None)
+        assert cache_key(["a"], "m", 1, None) != cache_key(["a"], "m", 1, "sofa -> settee")
+        assert cache_key(["a"], "m", 1, None) != cache_key(["a"], "m", 2, None)
+        assert cache_key(["a"], "m", 1, None) != cache_key(["a"], "m", 1, None, add_quantities=True)
+
+    def test_round_trip_and_ttl(self, db):
+        """Stored results are returned until they pass the TTL."""
+        from app.models import VisionResult
+        from app.vision_cache import get_cached_result, store_result
+
+        store_result("k1", RESULT, "m", 1, db)
+        assert get_cached_result("k1", db) == RESULT
+
+        entry = db.query(VisionResult).filter(VisionResult.cache_key == "k1").first()
+        assert entry.hit_count == 1
+        entry.created_at = datetime.utcnow() - timedelta(days=365)
+        db.commit()
+        assert get_cached_result("k1", db) is None
+
+    def test_empty_results_not_cached(self, db):
+        """A blank analysis is retried rather than cached."""
+        from app.vision_cache import get_cached_result, store_result
+
+        store_result("k1", {"items": [], "summary": ""}, "m", 1, db)
+        assert get_cached_result("k1", db) is None
+
+    def test_concurrent_entry_is_kept(self, db):
+        """Storing a key that is already cached keeps the first result."""
+        from app.vision_cache import get_cached_result, store_result
+
+        store_result("k1", RESULT, "m", 1, db)
+        store_result("k1", {"items": [{"name": "Bed", "qty": 1}], "summary": ""}, "m", 1, db)
+        assert get_cached_result("k1", db) == RESULT
+
+    def test_evicts_least_recently_used(self, db, monkeypatch):
+        """Entries over the size cap are evicted oldest-use first."""
+        from app import vision_cache
+        from app.config import settings
+        from app.models import VisionResult
+        from app.vision_cache import store_result
+
+        monkeypatch.setattr(settings, "VISION_CACHE_MAX_ENTRIES", 2)
+        monkeypatch.setattr(vision_cache, "EVICT_INTERVAL_SECONDS", 0)
+        monkeypatch.setattr(vision_cache, "_next_eviction", 0.0)
+        for i, key in enumerate(["k1", "k2"]):
+            store_result(key, RESULT, "m", 1, db)
+            db.query(VisionResult).filter(VisionResult.cache_key == key).update(
+                {"last_used_at": datetime.utcnow() - timedelta(hours=10 - i)})
+            db.commit()
+        store_result("k3", RESULT, "m", 1, db)
+
+        keys = {key for (key,) in db.query(VisionResult.cache_key)}
+        assert keys == {"k2", "k3"}
+
+
+class TestAnalyzePhotos:
+    async def test_repeat_analysis_uses_cache(self, db, monkeypatch):
+        """The second analysis of the same photos skips the vision call."""
+        from app import ai_vision, analysis_queue
+
+        calls = []
+
+        async def fake_extract(paths, learned_guidance=None, timeout=None):
+            calls.append(paths)
+            return {"items": [{"name": "Bed", "qty": 1}], "summary": "Bedroom"}
+
+        monkeypatch.setattr(ai_vision, "extract_removal_inventory_async", fake_extract)
+
+        first = await analysis_queue.analyze_photos([_stored("a"), _stored("b")], None, db)
+        second = await analysis_queue.analyze_photos([_stored("b"), _stored("a")], None, db)
+
+        assert len(calls) == 1
+        assert first == second
+
+
+class TestBatchedExtraction:
+    async def test_every_photo_analysed_with_bounded_concurrency(self, monkeypatch):
+        """Photos beyond one batch are analysed concurrently, never more than the limit at once."""
+        import asyncio
+        from app import ai_vision
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "VISION_BATCH_SIZE", 6)
+        monkeypatch.setattr(settings, "VISION_MAX_CONCURRENCY", 2)
+        seen, running, peak = [], [0], [0]
+
+        async def fake_extract(paths, learned_guidance=None, timeout=None):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.05)
+            running[0] -= 1
+            seen.extend(paths)
+            return {"items": [{"name": "Sofa", "qty": 1}, {"name": f"Box {len(paths)}", "qty": 1}],
+                    "summary": "Lounge"}
+
+        monkeypatch.setattr(ai_vision, "extract_removal_inventory_async", fake_extract)
+        paths = [f"p{i}.jpg" for i in range(14)]
+
+        result = await ai_vision.extract_removal_inventory_batched(paths)
+
+        assert sorted(seen) == sorted(paths)
+        assert peak[0] == 2
+        assert sorted(item["name"] for item in result["items"]) == ["Box 2", "Box 6", "Sofa"]
+        assert next(item["qty"] for item in result["items"] if item["name"] == "Sofa") == 1
+        assert result["summary"] == "Lounge"
+
+    async def test_failed_batch_marks_result_incomplete(self, monkeypatch):
+        """A failing batch doesn't lose the others, and the partial result is flagged."""
+        from app import ai_vision
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "VISION_BATCH_SIZE", 1)
+
+        async def fake_extract(paths, learned_guidance=None, timeout=None):
+            if paths == ["bad.jpg"]:
+                raise Exception("OpenAI API error: timeout")
+            return {"items": [{"name": "Bed", "qty": 1}], "summary": ""}
+
+        monkeypatch.setattr(ai_vision, "extract_removal_inventory_async", fake_extract)
+
+        result = await ai_vision.extract_removal_inventory_batched(["good.jpg", "bad.jpg"])
+        assert result["items"] == [{"name": "Bed", "qty": 1}]
+        assert result["incomplete_batches"] == 1
+
+    def test_merge_keeps_highest_quantity(self):
+        """In one room the same item from two batches is counted once, at its highest quantity."""
+        from app.ai_vision import merge_inventories
+
+        merged = merge_inventories([
+            {"items": [{"name": "Dining chair", "qty": 4}], "summary": "Kitchen"},
+            {"items": [{"name": "dining  Chair", "qty": 6}, {"name": "Fridge", "qty": 1}], "summary": "Kitchen"},
+        ])
+        assert [(i["name"], i["qty"]) for i in merged["items"]] == [("Dining chair", 6), ("Fridge", 1)]
+        assert merged["summary"] == "Kitchen"
+
+    def test_merge_adds_quantities_for_whole_property(self):
+        """Across a whole property the same item in two batches is counted in both."""
+        from app.ai_vision import merge_inventories
+
+        merged = merge_inventories([
+            {"items": [{"name": "Double bed", "qty": 1}], "summary": "Bedroom"},
+            {"items": [{"name": "double bed", "qty": 1}], "summary": "Guest room"},
+        ], add_quantities=True)
+        assert [(i["name"], i["qty"]) for i in merged["items"]] == [("Double bed", 2)]
+
+
+class TestAsyncClient:
+    async def test_calls_capped_per_worker(self, tmp_path, monkeypatch):
+        """The shared async client never has more than VISION_MAX_IN_FLIGHT calls outstanding."""
+        import asyncio
+        from types import SimpleNamespace
+        from app import ai_vision
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "VISION_MAX_IN_FLIGHT", 3)
+        monkeypatch.setattr(ai_vision, "_call_slots", None)
+        photo = tmp_path / "p.jpg"
+        photo.write_bytes(b"jpeg")
+        running, peak = [0], [0]
+
+        async def create(**kwargs):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.02)
+            running[0] -= 1
+            message = SimpleNamespace(content='{"items": [{"name": "Lamp", "qty": 1}], "summary": ""}')
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(ai_vision, "get_async_client", lambda: fake_client)
+
+        results = await asyncio.gather(*(
+            ai_vision.extract_removal_inventory_async([str(photo)]) for _ in range(8)
+        ))
+
+        assert peak[0] == 3
+        assert all(r["items"][0]["name"] == "Lamp" for r in results)
+
+
+class TestVisionBackends:
+    async def test_stub_is_deterministic(self, monkeypatch):
+        """The stub returns the same items for the same photos, after the configured latency."""
+        import time
+        from app.config import settings
+        from app.vision_backends import get_backend
+
+        monkeypatch.setattr(settings, "VISION_STUB_LATENCY_MS", 50)
+        backend = get_backend("stub")
+
+        started = time.monotonic()
+        first = await backend.analyze(["uploads/c/vision/aaa.jpg", "uploads/c/vision/bbb.jpg"])
+        assert time.monotonic() - started >= 0.05
+        assert first == await backend.analyze(["uploads/c/vision/aaa.jpg", "uploads/c/vision/bbb.jpg"])
+        assert first["items"] and all(item["cbm"] > 0 for item in first["items"])
+
+    async def test_local_uses_model_profiles(self, monkeypatch):
+        """The local backend sizes items from the furniture-detector-v1 profiles offline."""
+        from app.vision_backends import LocalBackend
+
+        backend = LocalBackend()
+        backend._catalog = {}
+        result = await backend.analyze(["uploads/c/vision/aaa.jpg"])
+
+        assert len(result["items"]) == 1
+        assert result["items"][0]["cbm"] > 0
+
+    def test_unknown_backend_rejected(self):
+        """A typo in VISION_BACKEND fails loudly."""
+        import pytest
+        from app.vision_backends import get_backend
+
+        with pytest.raises(ValueError):
+            get_backend("gpt5-local")
+
+    def test_backend_must_implement_analyze(self):
+        """VisionBackend is abstract, so a backend without analyze() can't be built."""
+        import pytest
+        from app.vision_backends import VisionBackend
+
+        class Incomplete(VisionBackend):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    async def test_stub_results_not_cached(self, db, monkeypatch):
+        """Analyses with the stub backend skip the vision result cache entirely."""
+        from app import analysis_queue
+        from app.config import settings
+        from app.models import VisionResult
+
+        monkeypatch.setattr(settings, "VISION_BACKEND", "stub")
+        inventory = await analysis_queue.analyze_photos([_stored("a")], None, db)
+
+        assert inventory["items"]
+        assert db.query(VisionResult).count() == 0